@@ -1,21 +1,24 @@
 from absl import flags
 from absl import logging
 import asyncio
+import contextlib
 import discord
+import functools
 import re
 import shlex
 import time
 
 from advice_bot.commands.common import Command, CommandResult, CommandStatus
 from advice_bot.commands import admin, diceroll, monthly_giveaway
-from advice_bot import params
+from advice_bot import params, permission_index, sharding
+from advice_bot.database import command_log, journal, message_claims, storage
 from advice_bot.proto import params_pb2
-from advice_bot.util import discord_util
+from advice_bot.util import discord_util, metrics, response_dispatcher
 
 FLAGS = flags.FLAGS
 
 _COMMAND_PREFIX = "!"
-_COMMAND_REGEX = re.compile(_COMMAND_PREFIX + r'(\w+)\b.*')
+_COMMAND_REGEX = re.compile(_COMMAND_PREFIX + r'(\w+)')
 _COMMAND_ALIASES = {
     "admin": params_pb2.Command.ADMIN_COMMAND,
     "help": params_pb2.Command.HELP_COMMAND,
@@ -49,28 +52,10 @@ def _InitializeRegistry():
 def _IsCommandEnabled(command_enum: params_pb2.Command,
                       message: discord.Message):
     """Check if the command was enabled for the given channel."""
-
-    # !help is special.
-    if command_enum == params_pb2.Command.HELP_COMMAND:
-        return _IsChannelWatched(message)
-
     if message.guild is None:
         return False
-    guild_id = message.guild.id
-    server_config_map = params.ServerConfigMap()
-    if guild_id not in server_config_map:
-        return False
-    for command_config in server_config_map[guild_id].commands:
-        # Expect low N so direct iteration should be faster + simpler than
-        # making a set.
-        if command_config.command != command_enum:
-            continue
-        if command_config.channels.all_channels:
-            return True
-        for channel_id in command_config.channels.specific_channels:
-            if channel_id == message.channel.id:
-                return True
-    return False
+    return params.Permissions().IsCommandEnabled(command_enum, message.guild.id,
+                                                 message.channel.id)
 
 
 def _IsChannelWatched(message: discord.Message):
@@ -83,45 +68,51 @@ def _IsChannelWatched(message: discord.Message):
     """
     if message.guild is None:
         return False
-    guild_id = message.guild.id
-    server_config_map = params.ServerConfigMap()
-    if guild_id not in server_config_map:
-        return False
-    for command_config in server_config_map[guild_id].commands:
-        if command_config.channels.all_channels:
-            return True
-        for channel_id in command_config.channels.specific_channels:
-            if channel_id == message.channel.id:
-                return True
-    return False
+    return params.Permissions().IsChannelWatched(message.guild.id,
+                                                 message.channel.id)
 
 
 class HelpCommand(Command):
 
-    def Execute(self, message: discord.Message, timestamp_micros: int,
-                argv: list[str]) -> CommandResult:
+    async def Execute(self, message: discord.Message, timestamp_micros: int,
+                      argv: list[str]) -> CommandResult:
         help_msg = self.GetHelpMsg(message)
         return CommandResult(CommandStatus.OK, help_msg)
 
     def GetHelpMsg(self, message: discord.Message):
-        help_msg = "Available commands:"
-        show_help_msg = False
-
-        # List the commands available in the current channel.
-        if _IsCommandEnabled(params_pb2.Command.ADMIN_COMMAND, message):
-            help_msg += "\n* `!admin`: Manage bot instance(s)."
-            show_help_msg = True
-        if _IsCommandEnabled(params_pb2.Command.HELP_COMMAND, message):
-            help_msg += "\n* `!help`: List available commands."
-            show_help_msg = True
-        if _IsCommandEnabled(params_pb2.Command.MONTHLY_GIVEAWAY_COMMAND,
-                             message):
-            help_msg += "\n* `!roll`, `!participate`, or `!giveaway`: Participate in the monthly giveaway. See pin for details: https://discord.com/channels/480809905138171924/1302165779336396860/1302165889931546644."
-            show_help_msg = True
-
-        if not show_help_msg:
+        if message.guild is None:
             return ""
-        return help_msg
+        enabled_commands = params.Permissions().EnabledCommands(
+            message.guild.id, message.channel.id)
+        return _RenderHelpMsg(enabled_commands)
+
+
+@functools.cache
+def _RenderHelpMsg(enabled_commands: int) -> str:
+    """Returns the help message for a set of enabled commands.
+
+    Cached, since there are only a handful of distinct sets in practice.
+    """
+    help_msg = "Available commands:"
+    show_help_msg = False
+
+    # List the commands available in the current channel.
+    if permission_index.IsEnabled(enabled_commands,
+                                  params_pb2.Command.ADMIN_COMMAND):
+        help_msg += "\n* `!admin`: Manage bot instance(s)."
+        show_help_msg = True
+    if permission_index.IsEnabled(enabled_commands,
+                                  params_pb2.Command.HELP_COMMAND):
+        help_msg += "\n* `!help`: List available commands."
+        show_help_msg = True
+    if permission_index.IsEnabled(enabled_commands,
+                                  params_pb2.Command.MONTHLY_GIVEAWAY_COMMAND):
+        help_msg += "\n* `!roll`, `!participate`, or `!giveaway`: Participate in the monthly giveaway. See pin for details: https://discord.com/channels/480809905138171924/1302165779336396860/1302165889931546644."
+        show_help_msg = True
+
+    if not show_help_msg:
+        return ""
+    return help_msg
 
 
 _g_rickroll_state = 0
@@ -174,6 +165,39 @@ _RICKROLL_LINES = [
     "Never gonna tell a lie and hurt you",
 ]
 
+# Commands that MaybeHandleEasterEgg() may respond to outside of watched
+# channels. Keep in sync.
+_EASTER_EGG_COMMANDS = frozenset(["make", "sudo", "ban", "reroll"])
+_EASTER_EGG_COMMAND_PREFIX = "rickroll"
+
+
+def ParseCommand(message: discord.Message) -> str | None:
+    """Cheaply decides whether a message might be for us.
+
+    Returns the lowercased command name, or None if the message should be
+    ignored. Most messages starting with the prefix are for other bots, so this
+    only looks at the first token and the channel index; the full message is
+    tokenized later, and only if we're going to execute it.
+    """
+    content = message.content
+    if not content.startswith(_COMMAND_PREFIX):
+        return None
+    match = _COMMAND_REGEX.match(content)
+    if match is None:
+        return None
+    # Multi-line messages are never commands.
+    if "\n" in content:
+        return None
+
+    command = match.group(1).lower()
+    if _IsChannelWatched(message):
+        return command
+    # Easter eggs work everywhere.
+    if (command in _EASTER_EGG_COMMANDS or
+            command.startswith(_EASTER_EGG_COMMAND_PREFIX)):
+        return command
+    return None
+
 
 def MaybeHandleEasterEgg(message: discord.Message):
 
@@ -218,6 +242,15 @@ def MaybeHandleEasterEgg(message: discord.Message):
 
 class AdviceBot(discord.Client):
 
+    # Started by setup_hook().
+    _surge_task: asyncio.Task | None = None
+    _params_watch_task: asyncio.Task | None = None
+    _heartbeat_task: asyncio.Task | None = None
+    _claim_cleanup_task: asyncio.Task | None = None
+    _journal_replay_task: asyncio.Task | None = None
+    _pool_maintenance_task: asyncio.Task | None = None
+    _metrics_server: asyncio.Server | None = None
+
     @classmethod
     def CreateInstance(cls):
         intents = discord.Intents.default()
@@ -225,10 +258,66 @@ class AdviceBot(discord.Client):
 
         application_id = params.Params().discord_params.discord_application_id
 
+        if sharding.Enabled():
+            return cls(application_id=application_id,
+                       intents=intents,
+                       shard_id=FLAGS.shard_id,
+                       shard_count=FLAGS.shard_count)
         return cls(application_id=application_id, intents=intents)
 
     async def on_ready(self):
-        logging.info("Logged on as {}".format(self.user))
+        logging.info("Logged on as %s", self.user)
+
+    async def setup_hook(self):
+        # Each shard serves its metrics on its own port.
+        self._metrics_server = await metrics.MaybeStartServer(
+            port_offset=FLAGS.shard_id or 0)
+        self._pool_maintenance_task = asyncio.create_task(
+            storage.RunMaintenance(), name="pool_maintenance")
+        journal.Start()
+        self._journal_replay_task = asyncio.create_task(journal.RunReplayer(),
+                                                        name="journal_replay")
+        command_log.Start()
+        response_dispatcher.Start()
+        self._surge_task = asyncio.create_task(
+            monthly_giveaway.RunSurgeSchedule(), name="surge_schedule")
+        if FLAGS.params_reload_interval_s > 0:
+            self._params_watch_task = asyncio.create_task(
+                params.WatchForChanges(FLAGS.params_reload_interval_s),
+                name="params_watch")
+        self._claim_cleanup_task = asyncio.create_task(
+            message_claims.RunCleanup(), name="message_claim_cleanup")
+        if sharding.Enabled():
+            self._heartbeat_task = asyncio.create_task(sharding.RunHeartbeat(
+                self, admin.InstanceId()),
+                                                       name="shard_heartbeat")
+        try:
+            await monthly_giveaway.PrewarmCache(time.time_ns() // 1000)
+        except Exception:
+            # Not fatal, the cache will fill up as users participate.
+            logging.exception("Failed to prewarm participation cache.")
+
+    async def close(self):
+        # Needs the connection to Discord, so before closing it.
+        await response_dispatcher.Stop()
+        await super().close()
+        tasks = [
+            task for task in [
+                self._surge_task, self._params_watch_task, self._heartbeat_task,
+                self._claim_cleanup_task, self._journal_replay_task,
+                self._pool_maintenance_task
+            ] if task is not None
+        ]
+        for task in tasks:
+            task.cancel()
+        # So that none of them runs into what is stopped below.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+        await command_log.Stop()
+        # Anything journaled is replayed on the next start.
+        journal.Stop()
+        await asyncio.to_thread(storage.Shutdown)
 
     async def on_message(self, message: discord.Message):
         timestamp_micros: int = time.time_ns() // 1000
@@ -236,76 +325,147 @@ class AdviceBot(discord.Client):
         if message.author.id == self.user.id:
             return
 
-        match = _COMMAND_REGEX.fullmatch(message.content)
-        if match is None:
+        parse_start = time.perf_counter()
+        command = ParseCommand(message)
+        if command is None:
             return
+        await self.ProcessCommand(command, message, timestamp_micros,
+                                  time.perf_counter() - parse_start)
 
-        command = match.group(1).lower()
-        argv: list[str] = shlex.split(message.content)
-        await self.ProcessCommand(command, message, timestamp_micros, argv)
-
-    async def SendResponse(self, message: discord.Message, response: str):
+    def SendResponse(self, message: discord.Message, response: str):
+        """Queues a response, see response_dispatcher."""
         if not response:
             return
         if FLAGS.env != "prod":
             response = f"[{FLAGS.env}]\n{response}"
-        await message.channel.send(response, suppress_embeds=True)
+        response_dispatcher.Send(message.channel, response)
 
-    async def ProcessCommand(self, command: str, message: discord.Message,
-                             timestamp_micros: int, argv: list[str]):
+    async def ProcessCommand(self,
+                             command: str,
+                             message: discord.Message,
+                             timestamp_micros: int,
+                             parse_seconds: float = 0.0):
         """Handles a parsed command.
 
         Possible outcomes:
         - PROCESSED: responded to command.
         - REJECTED: responded to command with a rejection message.
         - IGNORED: silently ignore command.
-        """
 
+        Records the time spent in each stage and the outcome, labelled with
+        the command.
+        """
+        command_enum = _COMMAND_ALIASES.get(command,
+                                            params_pb2.Command.UNKNOWN_COMMAND)
+        stages = _CommandStages(params_pb2.Command.Name(command_enum),
+                                message.id)
+        stages.Record("parse", parse_seconds)
+        try:
+            await self._ProcessCommand(command, message, timestamp_micros,
+                                       stages)
+        finally:
+            stages.Finish()
+
+    def _SendResponse(self, stages: "_CommandStages", message: discord.Message,
+                      response: str):
+        with stages.Time("send_response"):
+            self.SendResponse(message, response)
+
+    async def _Claim(self, message: discord.Message, timestamp_micros: int,
+                     stages: "_CommandStages") -> bool:
+        """Returns True if this instance should respond to the message.
+
+        Must be called before responding. See message_claims.
+        """
+        with stages.Time("claim"):
+            claimed = await message_claims.Claim(message.id, admin.InstanceId(),
+                                                 timestamp_micros)
+        if not claimed:
+            logging.info("IGNORING message %d: claimed by another instance.",
+                         message.id,
+                         extra=stages.LogFields())
+        return claimed
+
+    async def _ProcessCommand(self, command: str, message: discord.Message,
+                              timestamp_micros: int, stages: "_CommandStages"):
         logging.info(
-            f"PROCESSING command {command}:" + f"\nmessage_id: {message.id}" +
-            f"\nauthor: {message.author.name} ({message.author.id})" +
-            (f"\nserver: {message.guild.name} ({message.guild.id})" if message.
-             guild is not None else "") +
-            f"\nchannel: {message.channel.name} ({message.channel.id})" +
-            f"\ncontent: {message.content}")
+            "PROCESSING command %s: author %s (%d), server %s (%s), "
+            "channel %s (%d), content %r",
+            command,
+            message.author.name,
+            message.author.id,
+            message.guild.name if message.guild is not None else None,
+            message.guild.id if message.guild is not None else None,
+            message.channel.name,
+            message.channel.id,
+            message.content,
+            extra=stages.LogFields())
 
         easter_egg = MaybeHandleEasterEgg(message)
         if easter_egg is not None:
-            logging.info(f"PROCESSED message {message.id} as easter egg.")
-            await self.SendResponse(message, easter_egg)
+            if not await self._Claim(message, timestamp_micros, stages):
+                return
+            logging.info("PROCESSED message %d as easter egg.",
+                         message.id,
+                         extra=stages.LogFields())
+            stages.outcome = "PROCESSED"
+            self._SendResponse(stages, message, easter_egg)
             return
 
-        is_watched_channel = _IsChannelWatched(message)
+        with stages.Time("permission_check"):
+            is_watched_channel = _IsChannelWatched(message)
         if not is_watched_channel:
-            logging.info("IGNORING message {message.id}: unexpected channel.")
+            logging.info("IGNORING message %d: unexpected channel.",
+                         message.id,
+                         extra=stages.LogFields())
             return
 
         if command not in _COMMAND_ALIASES:
-            logging.info(
-                f"REJECTING message {message.id}: unrecognized command")
-            await self.SendResponse(
-                message, f"Unrecognized command: {_COMMAND_PREFIX}{command}")
+            if not await self._Claim(message, timestamp_micros, stages):
+                return
+            logging.info("REJECTING message %d: unrecognized command",
+                         message.id,
+                         extra=stages.LogFields())
+            stages.outcome = "REJECTED"
+            self._SendResponse(
+                stages, message,
+                f"Unrecognized command: {_COMMAND_PREFIX}{command}")
             return
 
         command_enum = _COMMAND_ALIASES[command]
-        # Dirty hack (since they use the same name) that we'll probably never clean up, oh well.
-        if command == "roll" and _IsCommandEnabled(
-                params_pb2.Command.DICEROLL_COMMAND, message):
-            command_enum = params_pb2.Command.DICEROLL_COMMAND
-
-        if not _IsCommandEnabled(command_enum, message):
-            logging.info(f"REJECTING message {message.id}: not enabled")
-            await self.SendResponse(
-                message,
+        with stages.Time("permission_check"):
+            # Dirty hack (since they use the same name) that we'll probably never clean up, oh well.
+            if command == "roll" and _IsCommandEnabled(
+                    params_pb2.Command.DICEROLL_COMMAND, message):
+                command_enum = params_pb2.Command.DICEROLL_COMMAND
+            is_enabled = _IsCommandEnabled(command_enum, message)
+        stages.command = params_pb2.Command.Name(command_enum)
+
+        if not is_enabled:
+            if not await self._Claim(message, timestamp_micros, stages):
+                return
+            logging.info("REJECTING message %d: not enabled",
+                         message.id,
+                         extra=stages.LogFields())
+            stages.outcome = "REJECTED"
+            self._SendResponse(
+                stages, message,
                 f"You cannot use {_COMMAND_PREFIX}{command} in this channel.")
             return
 
         if len(message.content) > _MAX_MESSAGE_LENGTH:
-            logging.info(f"REJECTING message {message.id}: too long")
-            await self.SendResponse(
-                message, "Message rejected: too long (max 255 chars)")
+            if not await self._Claim(message, timestamp_micros, stages):
+                return
+            logging.info("REJECTING message %d: too long",
+                         message.id,
+                         extra=stages.LogFields())
+            stages.outcome = "REJECTED"
+            self._SendResponse(stages, message,
+                               "Message rejected: too long (max 255 chars)")
             return
 
+        argv: list[str] = shlex.split(message.content)
+
         # If --env=<env> is passed, only instances for that env should respond.
         for arg in argv:
             match = _ENV_FLAG_REGEX.fullmatch(arg)
@@ -313,18 +473,92 @@ class AdviceBot(discord.Client):
                 continue
             requested_env = match.group(1)
             if FLAGS.env != requested_env:
-                logging.info("IGNORING message {message.id}: wrong env")
+                logging.info("IGNORING message %d: wrong env",
+                             message.id,
+                             extra=stages.LogFields())
                 return
             argv.remove(arg)
             # Must stop iteration.
             break
 
-        result: CommandResult = _COMMAND_REGISTRY[command_enum].Execute(
-            message, timestamp_micros, argv)
-
-        discord_util.LogCommand(message, timestamp_micros, result)
-        logging.info(f"PROCESSED message {message.id}: {result.response}")
-        await self.SendResponse(message, result.response)
+        # Admin commands act on the instance that runs them (e.g. !admin kill),
+        # so every instance runs them.
+        if (command_enum != params_pb2.Command.ADMIN_COMMAND and
+                not await self._Claim(message, timestamp_micros, stages)):
+            return
+        token = metrics.CURRENT_COMMAND.set(stages.command)
+        try:
+            with stages.Time("execute"):
+                result: CommandResult = await _COMMAND_REGISTRY[
+                    command_enum].Execute(message, timestamp_micros, argv)
+            stages.status = CommandStatus(result.status).name
+            metrics.Increment("advice_bot_command_status_total",
+                              command=stages.command,
+                              status=stages.status)
+
+            with stages.Time("log_command"):
+                await discord_util.LogCommand(message, timestamp_micros, result)
+        finally:
+            metrics.CURRENT_COMMAND.reset(token)
+        logging.info("PROCESSED message %d: %r",
+                     message.id,
+                     result.response,
+                     extra=stages.LogFields())
+        stages.outcome = "PROCESSED"
+        self._SendResponse(stages, message, result.response)
+
+
+class _CommandStages():
+    """Times the stages of processing a command, for metrics and logs."""
+
+    def __init__(self, command: str, message_id: int):
+        self.command = command
+        self.message_id = message_id
+        self.outcome = "IGNORED"
+        # The CommandStatus of the result, if the command was executed.
+        self.status: str | None = None
+        self._start = time.perf_counter()
+        self._seconds: dict[str, float] = {}
+
+    def Record(self, stage: str, seconds: float):
+        self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def Time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.Record(stage, time.perf_counter() - start)
+
+    def LogFields(self) -> dict:
+        """Returns the structured fields for log records about the command."""
+        return {
+            "message_id": self.message_id,
+            "command": self.command,
+            "status": self.status,
+        }
+
+    def Finish(self):
+        """Records the stage timings and the outcome, and logs the latter."""
+        # Parsing happened before we started.
+        self.Record(
+            "total",
+            time.perf_counter() - self._start + self._seconds.get("parse", 0.0))
+        for stage, seconds in self._seconds.items():
+            metrics.Observe("advice_bot_command_stage_seconds",
+                            seconds,
+                            command=self.command,
+                            stage=stage)
+        metrics.Increment("advice_bot_command_outcomes_total",
+                          command=self.command,
+                          outcome=self.outcome)
+        fields = self.LogFields()
+        fields["latency_ms"] = round(self._seconds["total"] * 1000, 3)
+        logging.info("FINISHED message %d: %s",
+                     self.message_id,
+                     self.outcome,
+                     extra=fields)
 
 
 _InitializeRegistry()
@@ -0,0 +1,79 @@
+import asyncio
+import discord
+import pytest
+import types
+
+from advice_bot import advice_bot, params
+from advice_bot.benchmarks import fakes
+from advice_bot.commands.common import CommandResult, CommandStatus
+from advice_bot.permission_index import PermissionIndex
+from advice_bot.proto import params_pb2
+from advice_bot.util import discord_util
+
+_GUILD_ID = 1
+_CHANNEL_ID = 2
+
+
+class _FakeCommand():
+
+    def __init__(self):
+        self.executed = 0
+
+    async def Execute(self, message, timestamp_micros: int,
+                      argv: list[str]) -> CommandResult:
+        self.executed += 1
+        return CommandResult(CommandStatus.OK, "done")
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    config = params_pb2.Config()
+    server = config.servers.add(guild_id=_GUILD_ID)
+    for command in [
+            params_pb2.Command.ADMIN_COMMAND, params_pb2.Command.HELP_COMMAND
+    ]:
+        server.commands.add(
+            command=command).channels.specific_channels.append(_CHANNEL_ID)
+    monkeypatch.setattr(params, "_PERMISSIONS", PermissionIndex(config))
+    monkeypatch.setattr(advice_bot, "FLAGS", types.SimpleNamespace(env="dev"))
+    monkeypatch.setattr(
+        advice_bot, "_COMMAND_REGISTRY", {
+            params_pb2.Command.ADMIN_COMMAND: _FakeCommand(),
+            params_pb2.Command.HELP_COMMAND: _FakeCommand(),
+        })
+
+    async def LogCommand(message, timestamp_micros, result):
+        pass
+
+    monkeypatch.setattr(discord_util, "LogCommand", LogCommand)
+
+    # Another instance claimed every message.
+    async def Claim(message_id, instance_id, timestamp_micros):
+        return False
+
+    monkeypatch.setattr(advice_bot.message_claims, "Claim", Claim)
+
+    result = advice_bot.AdviceBot(intents=discord.Intents.default())
+    result.responses = []
+    monkeypatch.setattr(
+        result, "SendResponse",
+        lambda message, response: result.responses.append(response))
+    return result
+
+
+def _Process(bot: advice_bot.AdviceBot, command: str, content: str):
+    message = fakes.Message(1, content, fakes.User(3), _GUILD_ID, _CHANNEL_ID)
+    asyncio.run(bot.ProcessCommand(command, message, 0))
+
+
+def test_admin_commands_run_on_every_instance(bot):
+    _Process(bot, "admin", "!admin status")
+
+    registry = advice_bot._COMMAND_REGISTRY
+    assert registry[params_pb2.Command.ADMIN_COMMAND].executed == 1
+    assert bot.responses == ["done"]
+
+    # Other commands only run on the instance that claimed the message.
+    _Process(bot, "help", "!help")
+    assert registry[params_pb2.Command.HELP_COMMAND].executed == 0
+    assert bot.responses == ["done"]
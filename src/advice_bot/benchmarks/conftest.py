@@ -0,0 +1,75 @@
+"""Regression checks for the benchmarks.
+
+Each benchmark's fastest round is compared with baselines.json. Timings are
+stored as multiples of a fixed calibration workload, timed on the same machine
+right after the benchmark, so that baselines carry over between machines and
+load on the machine mostly cancels out. A benchmark fails if it is more than
+_THRESHOLD times slower than its baseline, which is meant to catch algorithmic
+regressions rather than small slowdowns.
+
+To record new baselines after an intentional change, run:
+
+    UPDATE_BENCHMARK_BASELINES=1 py.test src/advice_bot/benchmarks
+"""
+
+import gc
+import json
+import os
+import pathlib
+import pytest
+import timeit
+
+_BASELINES_PATH = pathlib.Path(__file__).parent / "baselines.json"
+_THRESHOLD = 2.0
+_UPDATE = os.environ.get("UPDATE_BENCHMARK_BASELINES") == "1"
+
+
+def _CalibrationWorkload(data=tuple(range(2000))):
+    # A mix of the things the hot paths do: string formatting, dict lookups and
+    # sorting.
+    strings = {i: f"{i:05d}" for i in data}
+    return sorted(strings[i] for i in reversed(data))
+
+
+def _Calibrate() -> float:
+    """Returns the fastest time of the calibration workload, in seconds."""
+    gc.collect()
+    # timeit disables GC while timing, as the benchmarks do.
+    return min(timeit.repeat(_CalibrationWorkload, number=10, repeat=7)) / 10
+
+
+class _Baselines():
+
+    def __init__(self):
+        self._baselines = {}
+        if _BASELINES_PATH.exists():
+            self._baselines = json.loads(_BASELINES_PATH.read_text())
+
+    def Check(self, benchmark):
+        """Fails the current test if benchmark regressed from its baseline."""
+        if benchmark.stats is None:
+            # Benchmarks are disabled, e.g. --benchmark-disable.
+            return
+        name = benchmark.name
+        relative = benchmark.stats.stats.min / _Calibrate()
+        if _UPDATE:
+            self._baselines[name] = round(relative, 4)
+            return
+        if name not in self._baselines:
+            pytest.fail(f"No baseline for {name}, see {__file__}.")
+        baseline = self._baselines[name]
+        if relative > baseline * _THRESHOLD:
+            pytest.fail(f"{name} regressed: {relative:.3f} calibration units "
+                        f"vs. a baseline of {baseline:.3f}.")
+
+    def Save(self):
+        _BASELINES_PATH.write_text(
+            json.dumps(self._baselines, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.fixture(scope="session")
+def baselines():
+    result = _Baselines()
+    yield result
+    if _UPDATE:
+        result.Save()
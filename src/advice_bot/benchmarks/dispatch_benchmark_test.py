@@ -0,0 +1,170 @@
+"""Benchmarks for deciding whether, and how, to handle a message."""
+
+import pytest
+import random
+import re
+import shlex
+
+from advice_bot import advice_bot, params
+from advice_bot.benchmarks import fakes
+from advice_bot.permission_index import PermissionIndex
+from advice_bot.proto import params_pb2
+
+pytestmark = pytest.mark.benchmark(group="dispatch",
+                                   max_time=0.2,
+                                   disable_gc=True)
+
+_LEGACY_COMMAND_REGEX = re.compile(r"!(\w+)\b.*")
+
+# A large deployment: many servers, each listing many channels.
+_NUM_GUILDS = 200
+_CHANNELS_PER_GUILD = 50
+_NUM_MESSAGES = 1000
+
+
+def _LargeConfig() -> params_pb2.Config:
+    config = params_pb2.Config()
+    for guild_id in range(1, _NUM_GUILDS + 1):
+        server = config.servers.add(guild_id=guild_id)
+        for command in [
+                params_pb2.Command.MONTHLY_GIVEAWAY_COMMAND,
+                params_pb2.Command.DICEROLL_COMMAND,
+                params_pb2.Command.ADMIN_COMMAND,
+        ]:
+            command_config = server.commands.add(command=command)
+            command_config.channels.specific_channels.extend(
+                guild_id * 1000 + channel
+                for channel in range(_CHANNELS_PER_GUILD))
+    return config
+
+
+@pytest.fixture(autouse=True)
+def large_config():
+    saved = params._PERMISSIONS
+    params._PERMISSIONS = PermissionIndex(_LargeConfig())
+    yield
+    params._PERMISSIONS = saved
+
+
+@pytest.fixture
+def messages() -> list:
+    """Messages in watched and unwatched channels, mostly for other bots."""
+    rng = random.Random(0)
+    contents = [
+        "!roll",
+        "!roll good luck everyone",
+        "!play never gonna give you up",
+        "!price \"twisted bow\"",
+        "!sudo make me a sandwich",
+        "!rickroll",
+        "!help",
+        "hello there",
+        "!" + "a" * 300,
+    ]
+    result = []
+    for i in range(_NUM_MESSAGES):
+        guild_id = rng.randint(1, _NUM_GUILDS * 2)
+        channel_id = guild_id * 1000 + rng.randint(0, _CHANNELS_PER_GUILD * 2)
+        result.append(
+            fakes.Message(i, rng.choice(contents), fakes.User(i), guild_id,
+                          channel_id))
+    return result
+
+
+def test_parse_command(benchmark, baselines, messages):
+
+    def ParseAll():
+        return [advice_bot.ParseCommand(message) for message in messages]
+
+    commands = benchmark(ParseAll)
+
+    assert "roll" in commands
+    assert None in commands
+    baselines.Check(benchmark)
+
+
+def test_permission_checks(benchmark, baselines, messages):
+
+    def CheckAll():
+        enabled = 0
+        for message in messages:
+            enabled += advice_bot._IsCommandEnabled(
+                params_pb2.Command.MONTHLY_GIVEAWAY_COMMAND, message)
+            enabled += advice_bot._IsChannelWatched(message)
+        return enabled
+
+    assert benchmark(CheckAll) > 0
+    baselines.Check(benchmark)
+
+
+def test_maybe_handle_easter_egg(benchmark, baselines, messages):
+
+    def HandleAll():
+        return [
+            advice_bot.MaybeHandleEasterEgg(message) for message in messages
+        ]
+
+    responses = benchmark(HandleAll)
+
+    assert "Okay." in responses
+    baselines.Check(benchmark)
+
+
+def _ProcessingLogLine(command: str, message) -> str:
+    """The log line ProcessCommand formats for every command it handles."""
+    return (f"PROCESSING command {command}:" + f"\nmessage_id: {message.id}" +
+            f"\nauthor: {message.author.name} ({message.author.id})" +
+            (f"\nserver: {message.guild.name} ({message.guild.id})"
+             if message.guild is not None else "") +
+            f"\nchannel: {message.channel.name} ({message.channel.id})" +
+            f"\ncontent: {message.content}")
+
+
+def _LegacyDispatch(message) -> str | None:
+    """The old on_message, which matched and tokenized every message starting
+    with "!", up to where ProcessCommand ignored it or was about to execute
+    it."""
+    match = _LEGACY_COMMAND_REGEX.fullmatch(message.content)
+    if match is None:
+        return None
+    command = match.group(1).lower()
+    shlex.split(message.content)
+    _ProcessingLogLine(command, message)
+    if advice_bot.MaybeHandleEasterEgg(message) is not None:
+        return command
+    if not advice_bot._IsChannelWatched(message):
+        return None
+    return command
+
+
+def _StagedDispatch(message) -> str | None:
+    """on_message, up to the same point."""
+    command = advice_bot.ParseCommand(message)
+    if command is None:
+        return None
+    _ProcessingLogLine(command, message)
+    if advice_bot.MaybeHandleEasterEgg(message) is not None:
+        return command
+    # Messages we will execute still get tokenized.
+    if len(message.content) <= advice_bot._MAX_MESSAGE_LENGTH:
+        shlex.split(message.content)
+    return command
+
+
+# Compare these two to see what staged dispatch saves.
+def test_legacy_dispatch(benchmark, baselines, messages):
+
+    def DispatchAll():
+        return [_LegacyDispatch(message) for message in messages]
+
+    assert "roll" in benchmark(DispatchAll)
+    baselines.Check(benchmark)
+
+
+def test_staged_dispatch(benchmark, baselines, messages):
+
+    def DispatchAll():
+        return [_StagedDispatch(message) for message in messages]
+
+    assert "roll" in benchmark(DispatchAll)
+    baselines.Check(benchmark)
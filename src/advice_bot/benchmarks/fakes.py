@@ -0,0 +1,90 @@
+"""Stand-ins for Discord and MySQL objects, for the benchmarks and the load
+tester."""
+
+from advice_bot.database import storage
+
+
+class Obj():
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def User(user_id: int, roles: list[str] = ()):
+    return Obj(id=user_id,
+               name=f"user{user_id}",
+               mention=f"<@{user_id}>",
+               roles=[Obj(name=role) for role in roles])
+
+
+def Message(message_id: int, content: str, author, guild_id: int | None,
+            channel_id: int):
+    guild = Obj(id=guild_id, name="guild") if guild_id is not None else None
+    return Obj(id=message_id,
+               content=content,
+               author=author,
+               guild=guild,
+               channel=Obj(id=channel_id, name="channel"))
+
+
+class CountingCursor():
+    """Accepts any query, and counts each one as a database round trip."""
+
+    def __init__(self, counter: "RoundTripCounter"):
+        self._counter = counter
+
+    def execute(self, query: str, params=None):
+        self._counter.round_trips += 1
+
+    def fetchall(self) -> list:
+        return []
+
+    def __iter__(self):
+        return iter([])
+
+    def close(self):
+        pass
+
+
+class RoundTripCounter():
+
+    def __init__(self):
+        self.round_trips = 0
+
+
+class _CountingConnection():
+
+    def __init__(self, counter: RoundTripCounter):
+        self._counter = counter
+
+    def start_transaction(self):
+        self._counter.round_trips += 1
+
+    def commit(self):
+        self._counter.round_trips += 1
+
+    def rollback(self):
+        self._counter.round_trips += 1
+
+    def cursor(self, named_tuple: bool = False) -> CountingCursor:
+        return CountingCursor(self._counter)
+
+    def close(self):
+        pass
+
+
+class CountingBackend(storage._Backend):
+    """A storage backend whose connections only count round trips."""
+
+    def __init__(self, pool_size: int):
+        super().__init__(pool_size)
+        self.counter = RoundTripCounter()
+
+    def Connect(self) -> _CountingConnection:
+        return _CountingConnection(self.counter)
+
+    def Open(self):
+        pass
+
+    def Shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,156 @@
+"""Benchmarks for the giveaway and command logging."""
+
+import asyncio
+import pytest
+import random
+
+from advice_bot.benchmarks import fakes
+from advice_bot.commands import monthly_giveaway
+from advice_bot.commands.common import CommandResult, CommandStatus
+from advice_bot.commands.monthly_giveaway import Prize
+from advice_bot.database import command_log, connection_pool, storage
+from advice_bot.util import discord_util
+from advice_bot.util.drop_table import DropTable
+
+pytestmark = pytest.mark.benchmark(group="giveaway",
+                                   max_time=0.2,
+                                   disable_gc=True)
+
+_TIMESTAMP_MICROS = 1772323200000000  # 2026-03-01
+_NUM_CALLS = 1000
+
+
+@pytest.fixture
+def counting_backend():
+    saved_backend, saved_factory = storage._BACKEND, storage._BACKEND_FACTORY
+    storage._BACKEND_FACTORY = lambda extra_connections: fakes.CountingBackend(
+        connection_pool.DEFAULT_MAX_SIZE + extra_connections)
+    storage._BACKEND = None
+    yield storage._GetBackend()
+    storage.Shutdown()
+    storage._BACKEND, storage._BACKEND_FACTORY = saved_backend, saved_factory
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_roll_prize_table(benchmark, baselines):
+    prize_table = monthly_giveaway._GetPrizeTable(_TIMESTAMP_MICROS)
+
+    def RollAll():
+        return [prize_table.Roll() for _ in range(_NUM_CALLS)]
+
+    prizes = benchmark(RollAll)
+
+    assert Prize.NO_PRIZE in prizes
+    baselines.Check(benchmark)
+
+
+def test_roll_nested_table_sequential(benchmark, baselines):
+    # Three levels deep, walked one level at a time.
+    drop_table = DropTable([
+        (0.5, "a"),
+        (0.5,
+         DropTable([
+             (0.5, "b"),
+             (0.5, DropTable([
+                 (0.5, "c"),
+                 (0.5, "d"),
+             ])),
+         ])),
+    ])
+    rng = random.Random(0)
+
+    def RollAll():
+        return [drop_table.Roll(rng) for _ in range(_NUM_CALLS)]
+
+    assert set(benchmark(RollAll)) == {"a", "b", "c", "d"}
+    baselines.Check(benchmark)
+
+
+def test_get_prize_descriptions(benchmark, baselines):
+    rng = random.Random(0)
+    all_prizes = [[
+        rng.choice(list(Prize)) for _ in range(monthly_giveaway._ROLLS)
+    ] for _ in range(_NUM_CALLS)]
+
+    def DescribeAll():
+        return [
+            monthly_giveaway._GetPrizeDescriptions(prizes)
+            for prizes in all_prizes
+        ]
+
+    assert all(benchmark(DescribeAll))
+    baselines.Check(benchmark)
+
+
+def test_get_already_participated_response(benchmark, baselines, loop,
+                                           counting_backend):
+    user = fakes.User(42)
+    # Cached, like the participation we are responding to.
+    monthly_giveaway._PARTICIPATION_CACHE.Put(
+        user.id, monthly_giveaway._GiveawayMonth(_TIMESTAMP_MICROS),
+        _TIMESTAMP_MICROS)
+    choices = [
+        i % monthly_giveaway._NUM_ALREADY_PARTICIPATED_RESPONSES + 1
+        for i in range(_NUM_CALLS)
+    ]
+
+    async def RespondAll():
+        return [
+            await monthly_giveaway._GetAlreadyParticipatedResponse(
+                user, _TIMESTAMP_MICROS, choice) for choice in choices
+        ]
+
+    responses = benchmark(lambda: loop.run_until_complete(RespondAll()))
+
+    assert all(user.mention in response for response in responses)
+    assert counting_backend.counter.round_trips == 0
+    monthly_giveaway._PARTICIPATION_CACHE.Clear()
+    baselines.Check(benchmark)
+
+
+def test_log_command(benchmark, baselines, loop, counting_backend):
+    messages = [
+        fakes.Message(i, "!roll", fakes.User(i % 100), 1, 1)
+        for i in range(_NUM_CALLS)
+    ]
+    result = CommandResult(CommandStatus.OK, "")
+
+    async def LogAll():
+        command_log.Start()
+        for message in messages:
+            await discord_util.LogCommand(message, _TIMESTAMP_MICROS, result)
+        await command_log.Stop()
+
+    # Each batch of up to _MAX_BATCH_ROWS rows is one transaction: begin, two
+    # inserts and commit.
+    loop.run_until_complete(LogAll())
+    batches = -(-_NUM_CALLS // command_log._MAX_BATCH_ROWS)
+    assert counting_backend.counter.round_trips == batches * 4
+
+    benchmark(lambda: loop.run_until_complete(LogAll()))
+    baselines.Check(benchmark)
+
+
+def test_record_giveaway_outcome(benchmark, baselines):
+    counter = fakes.RoundTripCounter()
+    cursor = fakes.CountingCursor(counter)
+    users = [fakes.User(i) for i in range(_NUM_CALLS)]
+    prizes = [Prize.NO_PRIZE, Prize.GP_2M, Prize.NO_PRIZE, Prize.GOODYBAG]
+
+    def RecordAll():
+        for user in users:
+            monthly_giveaway._RecordGiveawayOutcome(user, _TIMESTAMP_MICROS,
+                                                    prizes, False, cursor)
+
+    # A single statement per participation.
+    RecordAll()
+    assert counter.round_trips == _NUM_CALLS
+
+    benchmark(RecordAll)
+    baselines.Check(benchmark)
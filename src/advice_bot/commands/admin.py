@@ -8,12 +8,15 @@ import uuid
 from zoneinfo import ZoneInfo
 
 from advice_bot.commands.common import Command, CommandResult, CommandStatus
-from advice_bot import params
+from advice_bot.commands import monthly_giveaway
+from advice_bot import params, sharding
 from advice_bot.proto import params_pb2
-from advice_bot.util import discord_util
+from advice_bot.util import discord_util, metrics
 
 FLAGS = flags.FLAGS
 
+_MAX_STATS_LENGTH = 1800
+
 # Initialized at import time.
 _HOSTNAME: str = None
 _INSTANCE_ID: str = None
@@ -32,6 +35,10 @@ def _Initialize():
         datetime.UTC).isoformat(sep=" ")
 
 
+def InstanceId() -> str:
+    return _INSTANCE_ID
+
+
 class AdminCommand(Command):
 
     def Usage(self) -> CommandResult:
@@ -39,11 +46,14 @@ class AdminCommand(Command):
             CommandStatus.OK, """
 Usage:
   `!admin status`
+  `!admin cache`
+  `!admin stats`
+  `!admin reload`
   `!admin kill <instance_id>`
 """)
 
-    def Execute(self, message: discord.Message, timestamp_micros: int,
-                argv: list[str]) -> CommandResult:
+    async def Execute(self, message: discord.Message, timestamp_micros: int,
+                      argv: list[str]) -> CommandResult:
         if not discord_util.IsAdmin(message.author):
             return CommandResult(
                 CommandStatus.PERMISSION_DENIED,
@@ -82,8 +92,46 @@ Start time (UTC): {start_time_utc}
 Start time ({local_tz_name}): {start_time_pt}
 Uptime: {uptime_days} day(s) {uptime_hours} hour(s) {uptime_minutes} min(s) {uptime_seconds} sec(s)
 ```
+"""
+            if sharding.Enabled():
+                # Only the shard with this guild sees the command, so it
+                # reports for all of them.
+                response += f"""Shards (this is shard {FLAGS.shard_id}):
+```
+{sharding.StatusReport(sharding.StatusDir(), FLAGS.shard_count)}
+```
 """
             return CommandResult(CommandStatus.OK, response)
+        elif argv[1] == "cache":
+            response = f"""Participation cache ({_INSTANCE_ID}):
+```
+{monthly_giveaway.CacheStats()}
+```
+"""
+            return CommandResult(CommandStatus.OK, response)
+        elif argv[1] == "stats":
+            stats = metrics.Summary()
+            # Stay within Discord's message length limit.
+            if len(stats) > _MAX_STATS_LENGTH:
+                stats = stats[:_MAX_STATS_LENGTH] + "\n..."
+            response = f"""Metrics ({_INSTANCE_ID}):
+```
+{stats}
+```
+"""
+            return CommandResult(CommandStatus.OK, response)
+        elif argv[1] == "reload":
+            try:
+                config = await params.Reload()
+            except Exception as e:
+                logging.exception("Failed to reload params.")
+                return CommandResult(
+                    CommandStatus.INVALID_ARGUMENT,
+                    f"Failed to reload config ({_INSTANCE_ID}): {e}")
+            return CommandResult(
+                CommandStatus.OK,
+                f"Reloaded config for {len(config.servers)} server(s) "
+                f"({_INSTANCE_ID}).")
         elif argv[1] == "kill":
             if len(argv) != 3:
                 return self.Usage()
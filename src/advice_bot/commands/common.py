@@ -9,6 +9,7 @@ class CommandStatus(enum.IntEnum):
     NOT_FOUND = 5
     PERMISSION_DENIED = 7
     INTERNAL = 13
+    UNAVAILABLE = 14
 
 
 class CommandResult():
@@ -20,6 +21,6 @@ class CommandResult():
 
 class Command():
 
-    def Execute(self, message: discord.Message, timestamp_micros: int,
-                argv: list[str]) -> CommandResult:
+    async def Execute(self, message: discord.Message, timestamp_micros: int,
+                      argv: list[str]) -> CommandResult:
         raise NotImplementedError
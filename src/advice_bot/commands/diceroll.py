@@ -1,9 +1,9 @@
 import discord
-import random
 import re
 
 from advice_bot.commands.common import Command, CommandResult, CommandStatus
 from advice_bot.proto import params_pb2
+from advice_bot.util import entropy
 
 _BOUNDS_RE = re.compile("(\d+)-(\d+)")
 _USAGE = "Usage: `!roll` or `!roll MIN-MAX`."
@@ -11,8 +11,8 @@ _USAGE = "Usage: `!roll` or `!roll MIN-MAX`."
 
 class DiceRollCommand(Command):
 
-    def Execute(self, message: discord.Message, timestamp_micros: int,
-                argv: list[str]) -> CommandResult:
+    async def Execute(self, message: discord.Message, timestamp_micros: int,
+                      argv: list[str]) -> CommandResult:
         return CommandResult(CommandStatus.OK, self.DiceRoll(argv, message))
 
     def DiceRoll(self, argv: list[str], message: discord.Message):
@@ -32,7 +32,7 @@ class DiceRollCommand(Command):
         if roll_min > roll_max:
             return "You've gotta ask yourself one question: \"Do I feel lucky?\". Well do ya, punk?"
 
-        roll = random.SystemRandom().randint(roll_min, roll_max)
+        roll = entropy.Rng().randint(roll_min, roll_max)
         return f"{message.author.mention} is rolling [{roll_min}-{roll_max}] and gets: **{roll}**"
 
     def SkillingCompetitionDiceRoll(self, message):
@@ -90,6 +90,6 @@ class DiceRollCommand(Command):
             24: "a",
         }
 
-        roll = random.SystemRandom().randint(1, 24)
+        roll = entropy.Rng().randint(1, 24)
         chosen_task = TASKS[roll]
         return f"{message.author.mention} rolls {article[roll]} **{roll}**. Your task is: {chosen_task}.\n\nPlease check the [spreadsheet](https://docs.google.com/spreadsheets/d/1h0O_IUxgzPokzMMu5UwHQQyd_be0zTFI-97-izvJsek/edit?gid=1727437871#gid=1727437871) for detailed task and screenshot requirements."
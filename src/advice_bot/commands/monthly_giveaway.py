@@ -1,13 +1,22 @@
 from absl import flags
 from absl import logging
+import asyncio
 import datetime
 import discord
 import enum
-import random
+import functools
+import mysql.connector
+from mysql.connector import errorcode
+from mysql.connector.cursor import MySQLCursor
+import time
+import typing
 
 from advice_bot.commands.common import Command, CommandResult, CommandStatus
-from advice_bot.database import storage
+from advice_bot.commands.participation_cache import ParticipationCache
+from advice_bot.database import journal, statements, storage
 from advice_bot.util import discord_util
+from advice_bot.util import entropy
+from advice_bot.util.admission_queue import AdmissionQueue
 from advice_bot.util.drop_table import DropTable
 
 FLAGS = flags.FLAGS
@@ -98,84 +107,237 @@ class Emojis(enum.StrEnum):
     RED_LIGHT = "<a:red_light:760254836016676894>"
 
 
-_LAST_PARTICIPATION_CACHE = {}
-
+_PARTICIPATION_CACHE_CAPACITY = 10000
+_JOURNAL_KIND = "giveaway_rolls"
+_PARTICIPATION_CACHE = ParticipationCache(_PARTICIPATION_CACHE_CAPACITY)
+
+
+async def _GetLastParticipationMicros(discord_user_id: int,
+                                      timestamp_micros: int) -> int | None:
+    """Returns when the user participated in the giveaway for the month of
+    timestamp_micros, or None if they haven't."""
+    giveaway_month = _GiveawayMonth(timestamp_micros)
+    hit, last_participation_micros = _PARTICIPATION_CACHE.Get(
+        discord_user_id, giveaway_month)
+    if hit:
+        return last_participation_micros
+
+    select_fn = functools.partial(_SelectParticipationMicros, discord_user_id,
+                                  giveaway_month)
+    last_participation_micros = await storage.RunQuery(select_fn,
+                                                       named_tuple=True)
+    _PARTICIPATION_CACHE.Put(discord_user_id, giveaway_month,
+                             last_participation_micros)
+    return last_participation_micros
+
+
+# Primary key lookup, so the cost doesn't grow with the user's history.
+_SELECT_PARTICIPATION_MICROS = statements.Declare("select_participation_micros",
+                                                  sql="""
+    SELECT timestamp_micros
+    FROM monthly_giveaway_participation
+    WHERE discord_user_id = %(discord_user_id)s
+        AND giveaway_month = %(giveaway_month)s
+""")
+
+
+def _SelectParticipationMicros(discord_user_id: int, giveaway_month: int,
+                               cursor: MySQLCursor) -> int | None:
+    statements.Execute(cursor, _SELECT_PARTICIPATION_MICROS, {
+        "discord_user_id": discord_user_id,
+        "giveaway_month": giveaway_month,
+    })
+    results = cursor.fetchall()
+    if len(results) == 0:
+        return None
+    return results[0].timestamp_micros
+
+
+async def PrewarmCache(timestamp_micros: int):
+    """Loads the participants for the month of timestamp_micros into the
+    participation cache."""
+    giveaway_month = _GiveawayMonth(timestamp_micros)
+    select_fn = functools.partial(_SelectParticipants, giveaway_month)
+    participants = await storage.RunQuery(select_fn, named_tuple=True)
+    _PARTICIPATION_CACHE.Prewarm(giveaway_month, participants)
+    logging.info(f"Prewarmed participation cache for {giveaway_month} with "
+                 f"{len(participants)} participant(s).")
+
+
+_SELECT_PARTICIPANTS = statements.Declare("select_participants",
+                                          sql="""
+    SELECT discord_user_id, timestamp_micros
+    FROM monthly_giveaway_participation
+    WHERE giveaway_month = %(giveaway_month)s
+""")
+
+
+def _SelectParticipants(giveaway_month: int,
+                        cursor: MySQLCursor) -> dict[int, int]:
+    statements.Execute(cursor, _SELECT_PARTICIPANTS, {
+        "giveaway_month": giveaway_month,
+    })
+    return {row.discord_user_id: row.timestamp_micros for row in cursor}
+
+
+def CacheStats() -> str:
+    """Returns a human-readable summary of the participation cache."""
+    return _PARTICIPATION_CACHE.Stats()
+
+
+async def _ClaimParticipation(discord_user: discord.Member | discord.abc.User,
+                              timestamp_micros: int,
+                              force: bool = False) -> list[Prize] | None:
+    """Rolls for the user and records the outcome, if they have not already
+    participated this month.
+
+    Returns the prizes, or None if the user already participated. This is the
+    authoritative eligibility check: it is safe against concurrent requests
+    from the same user, even across bot instances.
+
+    If the database is unavailable, but the participation cache knows the user
+    hasn't participated, the rolls are journaled instead. The check is then
+    only as good as the cache: a participation recorded meanwhile by another
+    instance wins, and the journaled rolls are dropped on replay.
+    """
+    prizes = _Participate(timestamp_micros)
+    record_fn = functools.partial(_RecordGiveawayOutcome, discord_user,
+                                  timestamp_micros, prizes, force)
+    try:
+        recorded = await journal.Write(record_fn)
+    except Exception as e:
+        if (force or not journal.Enabled() or not journal.IsUnavailable(e) or
+                not _KnownNotParticipated(discord_user.id, timestamp_micros)):
+            raise
+        logging.warning(f"Journaling giveaway rolls for {discord_user.id}: "
+                        f"{e!r}")
+        await journal.Append(
+            _JOURNAL_KIND, {
+                "discord_user_id": discord_user.id,
+                "discord_username": discord_user.name,
+                "timestamp_micros": timestamp_micros,
+                "prizes": prizes,
+            })
+        recorded = True
+    giveaway_month = _GiveawayMonth(timestamp_micros)
+    if not recorded:
+        # Our cache was stale, e.g. another instance recorded the
+        # participation. Replace the entry with the recorded participation,
+        # which keeps what the cache knows about everyone else.
+        select_fn = functools.partial(_SelectParticipationMicros,
+                                      discord_user.id, giveaway_month)
+        last_participation_micros = await storage.RunQuery(select_fn,
+                                                           named_tuple=True)
+        _PARTICIPATION_CACHE.Put(discord_user.id, giveaway_month,
+                                 last_participation_micros)
+        return None
+    _PARTICIPATION_CACHE.Put(discord_user.id, giveaway_month, timestamp_micros)
+    return prizes
 
-def _GetLastParticipationMicros(discord_user_id: int) -> int | None:
-    global _LAST_PARTICIPATION_CACHE
-    if discord_user_id in _LAST_PARTICIPATION_CACHE:
-        return _LAST_PARTICIPATION_CACHE[discord_user_id]
 
-    cnx = storage.Connect()
-    cursor = cnx.cursor(named_tuple=True)
-    try:
-        query = """
-            SELECT last_participation_micros
-            FROM monthly_giveaway
-            WHERE discord_user_id = %(discord_user_id)s
-        """
-        cursor.execute(query, {
-            "discord_user_id": discord_user_id,
-        })
-        results = cursor.fetchall()
-        if len(results) == 0:
-            return None
-        row = results[0]
-        _LAST_PARTICIPATION_CACHE[
-            discord_user_id] = row.last_participation_micros
-        return _LAST_PARTICIPATION_CACHE[discord_user_id]
-    finally:
-        cursor.close()
-        cnx.close()
+_DELETE_PARTICIPATION = statements.Declare("delete_participation",
+                                           sql="""
+    DELETE FROM monthly_giveaway_participation
+    WHERE discord_user_id = %(discord_user_id)s
+        AND giveaway_month = %(giveaway_month)s
+""")
+_DELETE_ROLLS = statements.Declare("delete_rolls",
+                                   sql="""
+    DELETE FROM monthly_giveaway_rolls
+    WHERE discord_user_id = %(discord_user_id)s
+        AND giveaway_month = %(giveaway_month)s
+""")
+_INSERT_ROLLS = statements.Declare("insert_rolls",
+                                   row="(%s, %s, %s, %s, %s)",
+                                   prepared_rows=(_ROLLS,),
+                                   sql="""
+    INSERT INTO monthly_giveaway_rolls
+        (
+            discord_user_id,
+            giveaway_month,
+            timestamp_micros,
+            sequence_index,
+            prize
+        )
+    VALUES
+        {rows}
+""")
 
 
 def _RecordGiveawayOutcome(discord_user: discord.Member | discord.abc.User,
-                           timestamp_micros: int, prizes: list[Prize]):
-    global _LAST_PARTICIPATION_CACHE
-    # Invalidate cache.
-    try:
-        del _LAST_PARTICIPATION_CACHE[discord_user.id]
-    except KeyError:
-        pass
+                           timestamp_micros: int, prizes: list[Prize],
+                           force: bool, cursor: MySQLCursor) -> bool:
+    """Inserts all rolls for a participation as a single statement.
 
-    cnx = storage.Connect()
-    cnx.start_transaction()
-    cursor = cnx.cursor()
-    try:
-        discord_util.UpdateDiscordUserInTransaction(discord_user, cursor)
-        for i in range(len(prizes)):
-            query = """
-                INSERT INTO monthly_giveaway_rolls
-                    (
-                        discord_user_id,
-                        timestamp_micros,
-                        sequence_index,
-                        prize
-                    )
-                VALUES
-                    (
-                        %(discord_user_id)s,
-                        %(timestamp_micros)s,
-                        %(sequence_index)s,
-                        %(prize)s
-                    )
-                ON DUPLICATE KEY UPDATE
-                    prize = %(prize)s
-            """
-            cursor.execute(
-                query, {
+    The unique key on (discord_user_id, giveaway_month, sequence_index) makes
+    the insert fail as a whole if the user already has rolls for the month, so
+    there is no separate check. A trigger on monthly_giveaway_rolls adds the
+    monthly_giveaway_participation row as part of the same statement. Normally
+    a single round trip.
+
+    Returns False if the user already participated this month.
+    """
+    giveaway_month = _GiveawayMonth(timestamp_micros)
+    if force:
+        # Dev only: forget the existing participation so it can be replaced.
+        for statement in [_DELETE_PARTICIPATION, _DELETE_ROLLS]:
+            statements.Execute(
+                cursor, statement, {
                     "discord_user_id": discord_user.id,
-                    "timestamp_micros": timestamp_micros,
-                    "sequence_index": i,
-                    "prize": prizes[i],
+                    "giveaway_month": giveaway_month,
                 })
-        cnx.commit()
-    except Exception:
-        cnx.rollback()
-        raise
-    finally:
-        cursor.close()
-        cnx.close()
+
+    values = []
+    for i in range(len(prizes)):
+        values += [
+            discord_user.id, giveaway_month, timestamp_micros, i, prizes[i]
+        ]
+
+    try:
+        statements.Execute(cursor, _INSERT_ROLLS, values, rows=len(prizes))
+    except mysql.connector.IntegrityError as e:
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return False
+        if e.errno != errorcode.ER_NO_REFERENCED_ROW_2:
+            raise
+        # First participation by a user we have never seen before. Rare
+        # enough that it's cheaper to retry than to always upsert first.
+        discord_util.UpdateDiscordUserInTransaction(discord_user, cursor)
+        try:
+            statements.Execute(cursor, _INSERT_ROLLS, values, rows=len(prizes))
+        except mysql.connector.IntegrityError as e:
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                return False
+            raise
+    return True
+
+
+def _KnownNotParticipated(discord_user_id: int, timestamp_micros: int) -> bool:
+    hit, last_participation_micros = _PARTICIPATION_CACHE.Get(
+        discord_user_id, _GiveawayMonth(timestamp_micros))
+    return hit and last_participation_micros is None
+
+
+class _JournaledUser(typing.NamedTuple):
+    """Stands in for the discord.User whose rolls were journaled."""
+    id: int
+    name: str
+
+
+def _ReplayRolls(record: dict, cursor: MySQLCursor):
+    discord_user = _JournaledUser(record["discord_user_id"],
+                                  record["discord_username"])
+    prizes = [Prize(prize) for prize in record["prizes"]]
+    if not _RecordGiveawayOutcome(discord_user, record["timestamp_micros"],
+                                  prizes, False, cursor):
+        # Usually because the rolls were already replayed, or because the
+        # journaled write went through after timing out.
+        logging.warning(f"Journaled giveaway rolls for {discord_user.id} at "
+                        f"{record['timestamp_micros']} were not recorded, the "
+                        "user already participated.")
+
+
+journal.RegisterReplayer(_JOURNAL_KIND, _ReplayRolls)
 
 
 def _DateFromMicros(timestamp_micros: int):
@@ -183,34 +345,35 @@ def _DateFromMicros(timestamp_micros: int):
     return datetime.datetime.fromtimestamp(timestamp_s, datetime.UTC).date()
 
 
-def _IsEligible(discord_user: discord.Member | discord.abc.User,
-                timestamp_micros: int,
-                force: bool = False) -> bool:
+def _GiveawayMonth(timestamp_micros: int) -> int:
+    """Returns the UTC month of the timestamp as YYYYMM."""
+    date = _DateFromMicros(timestamp_micros)
+    return date.year * 100 + date.month
+
+
+async def _IsEligible(discord_user: discord.Member | discord.abc.User,
+                      timestamp_micros: int,
+                      force: bool = False) -> bool:
     # For ease of testing.
     if force:
         return True
 
-    last_participation_micros = _GetLastParticipationMicros(discord_user.id)
-    if last_participation_micros is None:
-        return True
-
-    last_date = _DateFromMicros(last_participation_micros)
-    now_date = _DateFromMicros(timestamp_micros)
-    start_of_month = now_date.replace(day=1)
-    return last_date < start_of_month
+    last_participation_micros = await _GetLastParticipationMicros(
+        discord_user.id, timestamp_micros)
+    return last_participation_micros is None
 
 
 _NUM_ALREADY_PARTICIPATED_RESPONSES = 13
 
 
-def _GetAlreadyParticipatedResponse(discord_user: discord.Member |
-                                    discord.abc.User,
-                                    timestamp_micros: int,
-                                    choice=None):
+async def _GetAlreadyParticipatedResponse(discord_user: discord.Member |
+                                          discord.abc.User,
+                                          timestamp_micros: int,
+                                          choice=None):
     suffix = "You have already participated in this month's giveaway"
 
     if choice is None:
-        choice = random.randint(1, _NUM_ALREADY_PARTICIPATED_RESPONSES)
+        choice = entropy.Rng().randint(1, _NUM_ALREADY_PARTICIPATED_RESPONSES)
 
     if choice == 1:
         # 2001
@@ -229,7 +392,8 @@ def _GetAlreadyParticipatedResponse(discord_user: discord.Member |
         return f"A strange game. The only winning move is not to play.\n\n({suffix} {discord_user.mention})"
     elif choice == 6:
         # Titanic
-        last_participation_micros = _GetLastParticipationMicros(discord_user.id)
+        last_participation_micros = await _GetLastParticipationMicros(
+            discord_user.id, timestamp_micros)
         if last_participation_micros is None:
             logging.error(
                 "Last participation should be set if producing an error message."
@@ -279,7 +443,7 @@ def _GetPrizeDescriptions(prizes: list[Prize]):
         if prize == Prize.NO_PRIZE:
             text += f"Sorry, better luck next time."
             if i == len(prizes) - 1 and num_prizes == 0:
-                text += " " + random.choice([
+                text += " " + entropy.Rng().choice([
                     Emojis.NOOT_LIKE_THIS,
                     Emojis.NOT_LIKE_DUCK,
                 ])
@@ -303,16 +467,186 @@ def _GetPrizeDescriptions(prizes: list[Prize]):
 
 
 def _Participate(timestamp_micros: int):
+    prize_table = _GetPrizeTable(timestamp_micros)
     prizes = []
     for i in range(_ROLLS):
-        prizes.append(_GetPrizeTable(timestamp_micros).Roll())
+        prizes.append(prize_table.Roll())
     return prizes
 
 
+class _PrizeCount(typing.NamedTuple):
+    prize: Prize
+    num_rolls: int
+    payout_m: int
+
+
+class _MonthlyStats(typing.NamedTuple):
+    giveaway_month: int
+    num_participants: int
+    prize_counts: list[_PrizeCount]
+
+
+_SELECT_PARTICIPANT_COUNT = statements.Declare("select_participant_count",
+                                               sql="""
+    SELECT num_participants
+    FROM monthly_giveaway_participant_counts
+    WHERE giveaway_month = %(giveaway_month)s
+""")
+_SELECT_PRIZE_COUNTS = statements.Declare("select_prize_counts",
+                                          sql="""
+    SELECT prize, num_rolls, num_rolls * prize_value_m AS payout_m
+    FROM monthly_giveaway_prize_counts
+        NATURAL JOIN prizes
+    WHERE giveaway_month = %(giveaway_month)s
+        AND prize != 0
+        AND num_rolls > 0
+    ORDER BY prize
+""")
+
+
+def _SelectMonthlyStats(giveaway_month: int,
+                        cursor: MySQLCursor) -> _MonthlyStats:
+    """Reads the month's rollups, which are a few rows however many people
+    participated."""
+    values = {"giveaway_month": giveaway_month}
+    statements.Execute(cursor, _SELECT_PARTICIPANT_COUNT, values)
+    results = cursor.fetchall()
+    num_participants = results[0].num_participants if results else 0
+
+    statements.Execute(cursor, _SELECT_PRIZE_COUNTS, values)
+    prize_counts = [
+        _PrizeCount(Prize(row.prize), row.num_rolls, row.payout_m)
+        for row in cursor
+    ]
+    return _MonthlyStats(giveaway_month, num_participants, prize_counts)
+
+
+_STATS_CACHE_TTL_S = 60.0
+# giveaway_month -> (expiry, stats), by time.monotonic().
+_STATS_CACHE: dict[int, tuple[float, _MonthlyStats]] = {}
+
+
+async def _GetMonthlyStats(giveaway_month: int) -> _MonthlyStats:
+    cached = _STATS_CACHE.get(giveaway_month)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    select_fn = functools.partial(_SelectMonthlyStats, giveaway_month)
+    stats = await storage.RunQuery(select_fn, named_tuple=True)
+    _STATS_CACHE[giveaway_month] = (time.monotonic() + _STATS_CACHE_TTL_S,
+                                    stats)
+    return stats
+
+
+def _ParseGiveawayMonth(text: str) -> int | None:
+    """Parses YYYY-MM into a giveaway month, or returns None if invalid."""
+    try:
+        date = datetime.datetime.strptime(text, "%Y-%m")
+    except ValueError:
+        return None
+    return date.year * 100 + date.month
+
+
+def _FormatStats(stats: _MonthlyStats) -> str:
+    month = datetime.date(stats.giveaway_month // 100,
+                          stats.giveaway_month % 100, 1)
+    text = f"Giveaway stats for {month.strftime('%B %Y')}:\n"
+    text += f"Participants: {stats.num_participants}\n"
+    for prize_count in stats.prize_counts:
+        text += f"{prize_count.prize.name}: {prize_count.num_rolls}"
+        if prize_count.payout_m:
+            text += f" ({prize_count.payout_m}M)"
+        text += "\n"
+    total_payout_m = sum(
+        prize_count.payout_m for prize_count in stats.prize_counts)
+    text += f"Total payout: {total_payout_m}M"
+    return f"\n```\n{text}\n```"
+
+
+# Surge mode: most of the community participates in the first hours of the
+# month. Ahead of the month boundary we get ready for the rush, and for the
+# duration of the surge, participation goes through an admission queue so that
+# at most one request per database connection is in flight.
+_SURGE_LEAD_TIME = datetime.timedelta(minutes=15)
+_SURGE_DURATION = datetime.timedelta(hours=6)
+_SURGE_EXTRA_CONNECTIONS = 10
+_SURGE_MAX_WAITING = 1000
+
+# Set while surge mode is active.
+_SURGE_ADMISSION: AdmissionQueue | None = None
+
+
+async def RunSurgeSchedule():
+    """Enters surge mode around every month boundary. Runs forever."""
+    last_boundary = None
+    while True:
+        now = datetime.datetime.now(datetime.UTC)
+        month_start = now.replace(day=1,
+                                  hour=0,
+                                  minute=0,
+                                  second=0,
+                                  microsecond=0)
+        if now < month_start + _SURGE_DURATION and month_start != last_boundary:
+            # Started up in the middle of a surge.
+            boundary = month_start
+        elif now.month == 12:
+            boundary = month_start.replace(year=now.year + 1, month=1)
+        else:
+            boundary = month_start.replace(month=now.month + 1)
+        last_boundary = boundary
+
+        await _SleepUntil(boundary - _SURGE_LEAD_TIME)
+        try:
+            await _RunSurge(boundary)
+        except Exception:
+            logging.exception("Surge mode failed.")
+            # Don't retry the same surge.
+            await _SleepUntil(boundary + _SURGE_DURATION)
+
+
+async def _RunSurge(boundary: datetime.datetime):
+    global _SURGE_ADMISSION
+    boundary_micros = int(boundary.timestamp() * 1e6)
+    logging.info(f"ENTERING surge mode for {_GiveawayMonth(boundary_micros)}")
+
+    prize_table = _GetPrizeTable(boundary_micros)
+    prize_table.Compile()
+    logging.info(f"Prize table for {_GiveawayMonth(boundary_micros)}:\n"
+                 f"{prize_table}")
+
+    await storage.Resize(_SURGE_EXTRA_CONNECTIONS)
+    _SURGE_ADMISSION = AdmissionQueue(max_running=storage.PoolSize(),
+                                      max_waiting=_SURGE_MAX_WAITING)
+    try:
+        await _SleepUntil(boundary)
+        # Nobody has participated in the new month yet, so this is nearly
+        # free and makes every eligibility check a cache hit.
+        try:
+            await PrewarmCache(boundary_micros)
+        except Exception:
+            logging.exception("Failed to prewarm participation cache.")
+        await _SleepUntil(boundary + _SURGE_DURATION)
+    finally:
+        admission = _SURGE_ADMISSION
+        _SURGE_ADMISSION = None
+        logging.info(f"EXITING surge mode: admitted {admission.admitted}, "
+                     f"rejected {admission.rejected}")
+        # Unless shutting down, in which case storage.Shutdown() closes the
+        # pool.
+        if not asyncio.current_task().cancelling():
+            await storage.Resize()
+
+
+async def _SleepUntil(when: datetime.datetime):
+    delay = (when - datetime.datetime.now(datetime.UTC)).total_seconds()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
 class MonthlyGiveawayCommand(Command):
 
-    def Execute(self, message: discord.Message, timestamp_micros: int,
-                argv: list[str]) -> CommandResult:
+    async def Execute(self, message: discord.Message, timestamp_micros: int,
+                      argv: list[str]) -> CommandResult:
         # Handle flags for testing.
         if "--print_responses" in argv:
             if not discord_util.IsAdmin(message.author):
@@ -323,9 +657,8 @@ class MonthlyGiveawayCommand(Command):
             # Print all possible rejection responses.
             full_response = "All possible responses:"
             for i in range(1, _NUM_ALREADY_PARTICIPATED_RESPONSES + 1):
-                response = _GetAlreadyParticipatedResponse(message.author,
-                                                           timestamp_micros,
-                                                           choice=i)
+                response = await _GetAlreadyParticipatedResponse(
+                    message.author, timestamp_micros, choice=i)
                 full_response += f"\n\n{i}: {response}"
             return CommandResult(CommandStatus.OK, full_response)
         elif "--print_table" in argv:
@@ -363,6 +696,23 @@ class MonthlyGiveawayCommand(Command):
             ]
             return CommandResult(CommandStatus.OK,
                                  _GetPrizeDescriptions(prizes))
+        elif "--stats" in argv:
+            if not discord_util.IsAdmin(message.author):
+                return CommandResult(
+                    CommandStatus.PERMISSION_DENIED,
+                    f"I'm sorry {message.author.mention}, I'm afraid I can't do that.\n\n(You are not authorized to use that flag.)"
+                )
+            # Print participation and prizes for a month, by default this one.
+            args = argv[argv.index("--stats") + 1:]
+            giveaway_month = _GiveawayMonth(timestamp_micros)
+            if args:
+                giveaway_month = _ParseGiveawayMonth(args[0])
+                if giveaway_month is None:
+                    return CommandResult(
+                        CommandStatus.INVALID_ARGUMENT,
+                        f"Expected a month as YYYY-MM, got: {args[0]}")
+            stats = await _GetMonthlyStats(giveaway_month)
+            return CommandResult(CommandStatus.OK, _FormatStats(stats))
 
         # If users want to post good luck messages, that's fine. But catch any
         # flags in case it's me making a typo testing something.
@@ -389,20 +739,37 @@ class MonthlyGiveawayCommand(Command):
             return CommandResult(CommandStatus.PERMISSION_DENIED,
                                  "Nothing interesting happens.")
 
-        if not _IsEligible(message.author, timestamp_micros, force):
+        admission = _SURGE_ADMISSION
+        if admission is None:
+            return await self.Participate(message, timestamp_micros, force)
+        try:
+            async with admission.Admit():
+                return await self.Participate(message, timestamp_micros, force)
+        except asyncio.QueueFull:
             return CommandResult(
-                CommandStatus.PERMISSION_DENIED,
-                _GetAlreadyParticipatedResponse(message.author,
-                                                timestamp_micros))
+                CommandStatus.UNAVAILABLE,
+                f"The giveaway is very busy right now, please try again in a few minutes {message.author.mention}."
+            )
 
-        prizes = _Participate(timestamp_micros)
+    async def Participate(self, message: discord.Message, timestamp_micros: int,
+                          force: bool) -> CommandResult:
+        if not await _IsEligible(message.author, timestamp_micros, force):
+            response = await _GetAlreadyParticipatedResponse(
+                message.author, timestamp_micros)
+            return CommandResult(CommandStatus.PERMISSION_DENIED, response)
+
+        prizes = await _ClaimParticipation(message.author, timestamp_micros,
+                                           force)
+        if prizes is None:
+            # Lost a race with another request from the same user.
+            response = await _GetAlreadyParticipatedResponse(
+                message.author, timestamp_micros)
+            return CommandResult(CommandStatus.PERMISSION_DENIED, response)
         logging.info(prizes)
 
         today_str = _DateFromMicros(timestamp_micros).strftime("%B %Y")
         result_message = f"{message.author.mention} is participating in the giveaway for {today_str}!\n\n"
         result_message += _GetPrizeDescriptions(prizes)
-
-        _RecordGiveawayOutcome(message.author, timestamp_micros, prizes)
         return CommandResult(CommandStatus.OK, result_message)
 
 
@@ -415,6 +782,23 @@ def IsMod(user: discord.Member):
     return False
 
 
+# Keys into the responses in FunnyModResponse(). Built once so that the
+# compiled table is reused.
+_FUNNY_MOD_RESPONSE_TABLE = DropTable([
+    (0.20, "NO_POWER"),
+    (0.20, "MOD_ABUSE"),
+    (0.20, "OVERFLOW"),
+    (0.20, "SEGFAULT"),
+    (0.20,
+     DropTable([
+         (0.25, "FART"),
+         (0.25, "HAMSTER"),
+         (0.25, "SWORD"),
+         (0.25, "REPRESSED"),
+     ])),
+])
+
+
 def FunnyModResponse(message: discord.Message):
     """Returns a funny message if a mod tries to do something silly with the giveaway.
     """
@@ -442,17 +826,14 @@ Total winnings: -2,147,483,648 gold. Please report to the Corrupted Gauntlet imm
     SWORD = f"You can't expect to wield supreme executive power just because some watery tart threw a sword at you {message.author.mention}."
     REPRESSED = f"Help! Help! I'm being repressed! ({message.author.mention})"
 
-    response_table = DropTable([
-        (0.20, NO_POWER),
-        (0.20, MOD_ABUSE),
-        (0.20, OVERFLOW),
-        (0.20, SEGFAULT),
-        (0.20,
-         DropTable([
-             (0.25, FART),
-             (0.25, HAMSTER),
-             (0.25, SWORD),
-             (0.25, REPRESSED),
-         ])),
-    ])
-    return response_table.Roll()
+    responses = {
+        "NO_POWER": NO_POWER,
+        "MOD_ABUSE": MOD_ABUSE,
+        "OVERFLOW": OVERFLOW,
+        "SEGFAULT": SEGFAULT,
+        "FART": FART,
+        "HAMSTER": HAMSTER,
+        "SWORD": SWORD,
+        "REPRESSED": REPRESSED,
+    }
+    return responses[_FUNNY_MOD_RESPONSE_TABLE.Roll()]
@@ -0,0 +1,110 @@
+import collections
+
+
+class ParticipationCache():
+    """LRU cache of who has participated in the current giveaway month.
+
+    Maps discord_user_id to the participation timestamp, or to None if the user
+    is known not to have participated (negative entry). All entries belong to a
+    single giveaway month; asking about a later month empties the cache, so
+    nothing survives the month boundary.
+
+    After Prewarm(), the cache holds every participant for the month, so a user
+    without an entry is known not to have participated. That stops being true
+    if a participant is evicted.
+
+    Not thread-safe. Only use from the event loop.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.giveaway_month: int | None = None
+        self._entries: collections.OrderedDict[int, int | None] = (
+            collections.OrderedDict())
+        self._complete = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def Get(self, discord_user_id: int,
+            giveaway_month: int) -> tuple[bool, int | None]:
+        """Returns (hit, participation_micros).
+
+        participation_micros is None on a miss, or on a negative hit.
+        """
+        if not self._UseMonth(giveaway_month):
+            self.misses += 1
+            return False, None
+        if discord_user_id in self._entries:
+            self._entries.move_to_end(discord_user_id)
+            self.hits += 1
+            return True, self._entries[discord_user_id]
+        if self._complete:
+            self.hits += 1
+            return True, None
+        self.misses += 1
+        return False, None
+
+    def Put(self, discord_user_id: int, giveaway_month: int,
+            participation_micros: int | None):
+        if not self._UseMonth(giveaway_month):
+            return
+        if participation_micros is None and self._complete:
+            # Already implied.
+            self._entries.pop(discord_user_id, None)
+            return
+        self._entries[discord_user_id] = participation_micros
+        self._entries.move_to_end(discord_user_id)
+        while len(self._entries) > self.capacity:
+            _, evicted_micros = self._entries.popitem(last=False)
+            self.evictions += 1
+            if evicted_micros is not None:
+                self._complete = False
+
+    def Prewarm(self, giveaway_month: int, participants: dict[int, int]):
+        """Loads every participant for the month.
+
+        participants maps discord_user_id to participation timestamp.
+        """
+        if not self._UseMonth(giveaway_month):
+            return
+        # Negative entries are implied once complete, so drop them to make
+        # room.
+        for discord_user_id in [
+                user_id for user_id, micros in self._entries.items()
+                if micros is None
+        ]:
+            del self._entries[discord_user_id]
+        self._complete = True
+        for discord_user_id, participation_micros in participants.items():
+            self.Put(discord_user_id, giveaway_month, participation_micros)
+
+    def Clear(self):
+        self.giveaway_month = None
+        self._entries.clear()
+        self._complete = False
+
+    def Stats(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups > 0 else 0
+        return f"""Month: {self.giveaway_month}
+Entries: {len(self._entries)}/{self.capacity}
+Prewarmed: {self._complete}
+Hits: {self.hits}
+Misses: {self.misses}
+Hit rate: {hit_rate:.1%}
+Evictions: {self.evictions}"""
+
+    def _UseMonth(self, giveaway_month: int) -> bool:
+        """Moves the cache to giveaway_month if it is newer.
+
+        Returns False if giveaway_month is older than the cached month.
+        """
+        if self.giveaway_month == giveaway_month:
+            return True
+        if self.giveaway_month is not None and giveaway_month < self.giveaway_month:
+            return False
+        self.Clear()
+        self.giveaway_month = giveaway_month
+        return True
@@ -0,0 +1,61 @@
+from advice_bot.commands.participation_cache import ParticipationCache
+
+
+def test_positive_and_negative_entries():
+    cache = ParticipationCache(capacity=10)
+
+    assert cache.Get(1, 202601) == (False, None)
+    cache.Put(1, 202601, 123)
+    cache.Put(2, 202601, None)
+
+    assert cache.Get(1, 202601) == (True, 123)
+    assert cache.Get(2, 202601) == (True, None)
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_expires_at_month_boundary():
+    cache = ParticipationCache(capacity=10)
+    cache.Put(1, 202601, 123)
+
+    assert cache.Get(1, 202602) == (False, None)
+    # Late writes for the previous month are ignored.
+    cache.Put(1, 202601, 123)
+    assert cache.Get(1, 202602) == (False, None)
+
+
+def test_evicts_least_recently_used():
+    cache = ParticipationCache(capacity=2)
+    cache.Put(1, 202601, 1)
+    cache.Put(2, 202601, 2)
+    cache.Get(1, 202601)
+    cache.Put(3, 202601, 3)
+
+    assert cache.Get(2, 202601) == (False, None)
+    assert cache.Get(1, 202601) == (True, 1)
+    assert cache.Get(3, 202601) == (True, 3)
+    assert cache.evictions == 1
+
+
+def test_prewarm_implies_negative_entries():
+    cache = ParticipationCache(capacity=2)
+    cache.Prewarm(202601, {1: 1})
+
+    assert cache.Get(1, 202601) == (True, 1)
+    assert cache.Get(2, 202601) == (True, None)
+
+    # Evicting a participant means absent users are no longer known.
+    cache.Put(3, 202601, 3)
+    cache.Put(4, 202601, 4)
+    assert cache.Get(2, 202601) == (False, None)
+
+
+def test_correcting_an_entry_keeps_prewarm():
+    cache = ParticipationCache(capacity=10)
+    cache.Prewarm(202601, {1: 1})
+
+    # E.g. another instance recorded user 2's participation.
+    cache.Put(2, 202601, 2)
+
+    assert cache.Get(2, 202601) == (True, 2)
+    assert cache.Get(3, 202601) == (True, None)
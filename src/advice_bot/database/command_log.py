@@ -0,0 +1,238 @@
+"""Write-behind writer for the command_log table.
+
+Commands are queued in memory and written in batches by a background task, so
+that logging never delays the response to the user. A batch is flushed once it
+has _MAX_BATCH_ROWS rows, or _FLUSH_INTERVAL_S after its first row arrived,
+whichever comes first. Each batch costs one transaction regardless of size.
+
+Batches the database can't take are journaled, and written later by the
+journal's replayer. Deadlocks and lock wait timeouts are retried. Batches the
+database rejects are split in half and written again, so that e.g. one bad row
+only loses itself.
+"""
+
+from absl import logging
+import asyncio
+import functools
+import mysql.connector
+import random
+import typing
+from mysql.connector import errorcode
+from mysql.connector.cursor import MySQLCursor
+
+from advice_bot.database import journal, statements
+
+_FLUSH_INTERVAL_S = 0.25
+_MAX_BATCH_ROWS = 200
+# Bounds memory use. Once this many rows are waiting, Enqueue() blocks until
+# the writer catches up.
+_MAX_QUEUED_ROWS = 10000
+_JOURNAL_KIND = "command_log"
+# Errors that abort the transaction without any fault in the batch.
+_RETRIED_ERRNOS = frozenset(
+    [errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT])
+_MAX_RETRIES = 3
+# Doubles after each retry, with jitter so that instances don't collide again.
+_RETRY_BACKOFF_S = 0.05
+
+
+class CommandLogEntry(typing.NamedTuple):
+    message_id: int
+    timestamp_micros: int
+    discord_user_id: int
+    discord_username: str
+    command: str
+    command_status: int
+
+
+class CommandLogWriter():
+
+    def __init__(self,
+                 flush_interval_s: float = _FLUSH_INTERVAL_S,
+                 max_batch_rows: int = _MAX_BATCH_ROWS,
+                 max_queued_rows: int = _MAX_QUEUED_ROWS):
+        self._flush_interval_s = flush_interval_s
+        self._max_batch_rows = max_batch_rows
+        # None is used as a sentinel to stop the writer.
+        self._queue: asyncio.Queue[CommandLogEntry | None] = asyncio.Queue(
+            maxsize=max_queued_rows)
+        self._task: asyncio.Task | None = None
+
+    def Start(self):
+        self._task = asyncio.create_task(self._Run(), name="command_log")
+
+    async def Enqueue(self, entry: CommandLogEntry):
+        """Queues an entry, waiting for space if the queue is full."""
+        if self._queue.full():
+            logging.warning("command_log queue is full, waiting for writer.")
+        await self._queue.put(entry)
+
+    async def Stop(self):
+        """Flushes everything queued so far, then stops the writer."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _Run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await self._queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            stopping = False
+            deadline = loop.time() + self._flush_interval_s
+            while len(batch) < self._max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await _Flush(batch)
+            if stopping:
+                return
+
+
+async def _Flush(batch: list[CommandLogEntry]):
+    try:
+        await _Write(batch)
+        return
+    except Exception as e:
+        if journal.IsUnavailable(e):
+            if not journal.Enabled():
+                logging.exception(f"Dropped {len(batch)} command_log row(s).")
+                return
+            logging.warning(
+                f"Journaling {len(batch)} command_log row(s): {e!r}")
+        elif len(batch) == 1:
+            logging.exception(f"Dropped command_log row {batch[0]}.")
+            return
+        else:
+            logging.warning(f"Splitting {len(batch)} command_log rows: {e!r}")
+            middle = len(batch) // 2
+            await _Flush(batch[:middle])
+            await _Flush(batch[middle:])
+            return
+    try:
+        await journal.Append(_JOURNAL_KIND,
+                             {"entries": [entry._asdict() for entry in batch]})
+    except Exception:
+        logging.exception(f"Dropped {len(batch)} command_log row(s).")
+
+
+async def _Write(batch: list[CommandLogEntry]):
+    for attempt in range(_MAX_RETRIES + 1):
+        try:
+            await journal.Write(functools.partial(_InsertBatchInTransaction,
+                                                  batch),
+                                transaction=True)
+            return
+        except mysql.connector.Error as e:
+            if e.errno not in _RETRIED_ERRNOS or attempt == _MAX_RETRIES:
+                raise
+            logging.warning(f"Retrying {len(batch)} command_log row(s): {e!r}")
+        await asyncio.sleep(
+            random.uniform(1, 2) * _RETRY_BACKOFF_S * 2**attempt)
+
+
+# Batch sizes vary from flush to flush, so only single rows, the common case
+# when traffic is light, are prepared.
+_UPSERT_DISCORD_USERS = statements.Declare("upsert_discord_users",
+                                           row="(%s, %s)",
+                                           prepared_rows=(1,),
+                                           sql="""
+    INSERT INTO discord_users
+        (discord_user_id, discord_username)
+    VALUES
+        {rows}
+    AS new
+    ON DUPLICATE KEY UPDATE
+        discord_username = new.discord_username
+""")
+_INSERT_COMMAND_LOG = statements.Declare("insert_command_log",
+                                         row="(%s, %s, %s, %s, %s)",
+                                         prepared_rows=(1,),
+                                         sql="""
+    INSERT INTO command_log
+        (message_id, timestamp_micros, discord_user_id,
+         command, command_status)
+    VALUES
+        {rows}
+    AS new
+    ON DUPLICATE KEY UPDATE
+        timestamp_micros = new.timestamp_micros
+""")
+
+
+def _InsertBatchInTransaction(batch: list[CommandLogEntry],
+                              cursor: MySQLCursor):
+    # Later entries win, so the most recent username is kept.
+    usernames = {}
+    for entry in batch:
+        usernames[entry.discord_user_id] = entry.discord_username
+
+    # In ID order, so that concurrent batches lock the rows in the same order
+    # rather than deadlocking.
+    values = []
+    for discord_user_id, discord_username in sorted(usernames.items()):
+        values += [discord_user_id, discord_username]
+    statements.Execute(cursor,
+                       _UPSERT_DISCORD_USERS,
+                       values,
+                       rows=len(usernames))
+
+    values = []
+    for entry in batch:
+        values += [
+            entry.message_id, entry.timestamp_micros, entry.discord_user_id,
+            entry.command, entry.command_status
+        ]
+    statements.Execute(cursor, _INSERT_COMMAND_LOG, values, rows=len(batch))
+
+
+def _ReplayBatch(record: dict, cursor: MySQLCursor):
+    # Both inserts are upserts, so replaying twice is harmless.
+    _InsertBatchInTransaction(
+        [CommandLogEntry(**entry) for entry in record["entries"]], cursor)
+
+
+journal.RegisterReplayer(_JOURNAL_KIND, _ReplayBatch)
+
+# Global writer, set up by Start().
+_WRITER: CommandLogWriter | None = None
+
+
+def Start():
+    """Starts the global writer. Must be called from the event loop."""
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = CommandLogWriter()
+        _WRITER.Start()
+
+
+async def Stop():
+    """Flushes and stops the global writer."""
+    global _WRITER
+    if _WRITER is not None:
+        await _WRITER.Stop()
+        _WRITER = None
+
+
+async def Log(entry: CommandLogEntry):
+    """Logs a command.
+
+    If the global writer is not running (e.g. in one-off tools), writes the
+    entry immediately instead.
+    """
+    if _WRITER is None:
+        await _Flush([entry])
+        return
+    await _WRITER.Enqueue(entry)
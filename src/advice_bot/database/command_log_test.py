@@ -0,0 +1,124 @@
+import asyncio
+import mysql.connector
+from mysql.connector import errorcode
+
+from advice_bot.database import command_log
+from advice_bot.database import storage
+
+
+class FakeCursor():
+
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query, values):
+        self.queries.append((query, values))
+
+
+def _Entry(message_id: int, discord_user_id: int = 1):
+    return command_log.CommandLogEntry(message_id=message_id,
+                                       timestamp_micros=message_id,
+                                       discord_user_id=discord_user_id,
+                                       discord_username=f"user{message_id}",
+                                       command="!roll",
+                                       command_status=0)
+
+
+def _FakeStorage(monkeypatch, errors: list[Exception] | None = None):
+    """Returns the list of batches that would have been written.
+
+    Raises the errors in turn instead of writing, if given.
+    """
+    batches = []
+
+    async def RunInTransaction(fn):
+        cursor = FakeCursor()
+        fn(cursor)
+        if errors:
+            raise errors.pop(0)
+        batches.append(cursor.queries)
+
+    monkeypatch.setattr(storage, "RunInTransaction", RunInTransaction)
+    return batches
+
+
+def test_flushes_full_batches_and_remainder_on_stop(monkeypatch):
+    batches = _FakeStorage(monkeypatch)
+
+    async def Run():
+        writer = command_log.CommandLogWriter(flush_interval_s=60,
+                                              max_batch_rows=3)
+        writer.Start()
+        for i in range(7):
+            await writer.Enqueue(_Entry(i))
+        await writer.Stop()
+
+    asyncio.run(Run())
+
+    # Two full batches, then the leftover row flushed by Stop().
+    assert len(batches) == 3
+    # Each batch is one users upsert and one command_log insert.
+    assert all(len(batch) == 2 for batch in batches)
+    # message_id is the first of 5 values per row.
+    logged_ids = [batch[1][1][0::5] for batch in batches]
+    assert logged_ids == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_dedupes_users_keeping_latest_username(monkeypatch):
+    batches = _FakeStorage(monkeypatch)
+
+    async def Run():
+        writer = command_log.CommandLogWriter(flush_interval_s=60)
+        writer.Start()
+        await writer.Enqueue(_Entry(1, discord_user_id=7))
+        await writer.Enqueue(_Entry(2, discord_user_id=7))
+        await writer.Stop()
+
+    asyncio.run(Run())
+
+    assert len(batches) == 1
+    _, users_values = batches[0][0]
+    assert users_values == [7, "user2"]
+
+
+def _LoggedIds(batches) -> list[list[int]]:
+    # message_id is the first of 5 values per row.
+    return [batch[1][1][0::5] for batch in batches]
+
+
+def test_upserts_users_in_id_order(monkeypatch):
+    batches = _FakeStorage(monkeypatch)
+
+    asyncio.run(
+        command_log._Flush(
+            [_Entry(1, discord_user_id=9),
+             _Entry(2, discord_user_id=3)]))
+
+    _, users_values = batches[0][0]
+    assert users_values == [3, "user2", 9, "user1"]
+
+
+def test_retries_deadlocks(monkeypatch):
+    monkeypatch.setattr(command_log, "_RETRY_BACKOFF_S", 0)
+    batches = _FakeStorage(monkeypatch, [
+        mysql.connector.DatabaseError(errno=errorcode.ER_LOCK_DEADLOCK),
+        mysql.connector.DatabaseError(errno=errorcode.ER_LOCK_WAIT_TIMEOUT),
+    ])
+
+    asyncio.run(command_log._Flush([_Entry(1), _Entry(2)]))
+
+    assert _LoggedIds(batches) == [[1, 2]]
+
+
+def test_splits_rejected_batches(monkeypatch):
+    too_long = mysql.connector.DataError(errno=errorcode.ER_DATA_TOO_LONG)
+    # The whole batch, then its first half, then the bad row on its own.
+    batches = _FakeStorage(monkeypatch, [too_long, too_long, too_long])
+
+    asyncio.run(command_log._Flush([_Entry(1),
+                                    _Entry(2),
+                                    _Entry(3),
+                                    _Entry(4)]))
+
+    # Only the bad row, 1, is lost.
+    assert _LoggedIds(batches) == [[2], [3, 4]]
@@ -0,0 +1,251 @@
+"""A database connection pool that grows and shrinks with demand.
+
+Compared to mysql.connector's pool, which is fixed in size and resets the
+session on every checkout:
+* Connections are opened on demand, up to max_size. Those beyond min_size are
+  closed once idle for idle_timeout_s.
+* When every connection is in use, Acquire() waits for one, up to a timeout.
+* Checkouts cost no round trip. Instead, Maintain() periodically pings idle
+  connections, and retires those older than max_lifetime_s.
+
+Thread-safe.
+"""
+
+from absl import logging
+import mysql.connector
+import threading
+import time
+import typing
+
+from advice_bot.util import metrics
+
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 5
+DEFAULT_WAIT_TIMEOUT_S = 5.0
+DEFAULT_MAX_LIFETIME_S = 3600.0
+DEFAULT_IDLE_TIMEOUT_S = 300.0
+DEFAULT_VALIDATION_INTERVAL_S = 30.0
+
+
+class PoolTimeout(mysql.connector.errors.PoolError):
+    """No connection became available in time."""
+
+
+class _Entry():
+
+    def __init__(self, connection, now: float):
+        self.connection = connection
+        self.created_at = now
+        self.idle_since = now
+        self.validated_at = now
+        # Per-connection state that survives checkouts, e.g. prepared
+        # statements.
+        self.cache: dict[str, typing.Any] = {}
+
+
+class PooledConnection():
+    """A connection borrowed from the pool. close() gives it back."""
+
+    def __init__(self, pool: "ConnectionPool", entry: _Entry):
+        self._pool = pool
+        self._entry: _Entry | None = entry
+        self._invalid = False
+
+    @property
+    def cache(self) -> dict[str, typing.Any]:
+        """State kept with the physical connection across checkouts."""
+        if self._entry is None:
+            raise mysql.connector.InterfaceError("Connection already closed")
+        return self._entry.cache
+
+    def Invalidate(self):
+        """Makes close() discard the connection, e.g. after it broke."""
+        self._invalid = True
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool._Release(entry, self._invalid)
+
+    def __getattr__(self, name: str):
+        if self._entry is None:
+            raise mysql.connector.InterfaceError("Connection already closed")
+        return getattr(self._entry.connection, name)
+
+
+class ConnectionPool():
+
+    def __init__(self,
+                 connect: typing.Callable[[], typing.Any],
+                 min_size: int = DEFAULT_MIN_SIZE,
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 wait_timeout_s: float = DEFAULT_WAIT_TIMEOUT_S,
+                 max_lifetime_s: float = DEFAULT_MAX_LIFETIME_S,
+                 idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+                 validation_interval_s: float = DEFAULT_VALIDATION_INTERVAL_S,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        """connect() opens a new connection."""
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(f"Bad pool size bounds: [{min_size}, {max_size}]")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wait_timeout_s = wait_timeout_s
+        self._max_lifetime_s = max_lifetime_s
+        self._idle_timeout_s = idle_timeout_s
+        self._validation_interval_s = validation_interval_s
+        self._clock = clock
+
+        self._condition = threading.Condition()
+        # Least recently used first.
+        self._idle: list[_Entry] = []
+        # Open connections, including those being opened or validated.
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self._closed = False
+
+    def Acquire(self, timeout_s: float | None = None) -> PooledConnection:
+        """Returns an idle connection, or opens one if below max_size.
+
+        Otherwise waits up to timeout_s (by default wait_timeout_s) for a
+        connection to be released, then raises PoolTimeout.
+        """
+        timeout_s = self.wait_timeout_s if timeout_s is None else timeout_s
+        start = self._clock()
+        entry = None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise mysql.connector.errors.PoolError("Pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                remaining_s = start + timeout_s - self._clock()
+                if remaining_s <= 0:
+                    metrics.Increment("advice_bot_db_pool_timeouts_total")
+                    raise PoolTimeout(
+                        msg=f"No connection available after {timeout_s}s")
+                self.waiting += 1
+                self._UpdateGauges()
+                try:
+                    self._condition.wait(remaining_s)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+            self._UpdateGauges()
+        metrics.Observe("advice_bot_db_pool_wait_seconds",
+                        self._clock() - start)
+
+        if entry is None:
+            try:
+                entry = _Entry(self._connect(), self._clock())
+            except Exception:
+                with self._condition:
+                    self.size -= 1
+                    self.in_use -= 1
+                    self._condition.notify()
+                    self._UpdateGauges()
+                raise
+        return PooledConnection(self, entry)
+
+    def Maintain(self):
+        """Closes idle connections that are too old, have been idle too long,
+        or fail a ping. Then opens connections up to min_size. Blocking."""
+        now = self._clock()
+        to_close = []
+        to_validate = []
+        with self._condition:
+            idle, self._idle = self._idle, []
+            for entry in idle:
+                if (now - entry.created_at >= self._max_lifetime_s or
+                    (now - entry.idle_since >= self._idle_timeout_s and
+                     self.size - len(to_close) > self.min_size)):
+                    to_close.append(entry)
+                elif now - entry.validated_at >= self._validation_interval_s:
+                    to_validate.append(entry)
+                else:
+                    self._idle.append(entry)
+            self.size -= len(to_close)
+            self._UpdateGauges()
+
+        for entry in to_validate:
+            try:
+                entry.connection.ping()
+            except Exception as e:
+                logging.warning(f"Closing broken idle connection: {e!r}")
+                to_close.append(entry)
+                with self._condition:
+                    self.size -= 1
+                continue
+            entry.validated_at = self._clock()
+            with self._condition:
+                # Still among the least recently used.
+                self._idle.insert(0, entry)
+                self._condition.notify()
+        for entry in to_close:
+            _Close(entry)
+
+        while True:
+            with self._condition:
+                if self._closed or self.size >= self.min_size:
+                    self._UpdateGauges()
+                    return
+                self.size += 1
+            try:
+                entry = _Entry(self._connect(), self._clock())
+            except Exception:
+                logging.exception("Failed to open a connection.")
+                with self._condition:
+                    self.size -= 1
+                    self._UpdateGauges()
+                return
+            with self._condition:
+                self._idle.insert(0, entry)
+                self._condition.notify()
+
+    def Close(self):
+        """Closes idle connections now, and the others once released."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self.size -= len(idle)
+            self._condition.notify_all()
+        for entry in idle:
+            _Close(entry)
+
+    def _Release(self, entry: _Entry, invalid: bool):
+        now = self._clock()
+        with self._condition:
+            self.in_use -= 1
+            retire = (invalid or self._closed or
+                      now - entry.created_at >= self._max_lifetime_s)
+            if retire:
+                self.size -= 1
+            else:
+                entry.idle_since = now
+                self._idle.append(entry)
+            # Either an idle connection, or room to open one.
+            self._condition.notify()
+            self._UpdateGauges()
+        if retire:
+            _Close(entry)
+
+    def _UpdateGauges(self):
+        metrics.SetGauge("advice_bot_db_pool_connections",
+                         self.in_use,
+                         state="in_use")
+        metrics.SetGauge("advice_bot_db_pool_connections",
+                         len(self._idle),
+                         state="idle")
+        metrics.SetGauge("advice_bot_db_pool_waiting_threads", self.waiting)
+
+
+def _Close(entry: _Entry):
+    try:
+        entry.connection.close()
+    except Exception as e:
+        logging.warning(f"Failed to close connection: {e!r}")
@@ -0,0 +1,144 @@
+import pytest
+import threading
+
+from advice_bot.database import connection_pool
+
+
+class FakeConnection():
+
+    def __init__(self, number: int):
+        self.number = number
+        self.closed = False
+        self.pings = 0
+        self.broken = False
+
+    def ping(self):
+        self.pings += 1
+        if self.broken:
+            raise ConnectionError("Gone")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _Pool(**kwargs):
+    opened = []
+
+    def Connect():
+        opened.append(FakeConnection(len(opened)))
+        return opened[-1]
+
+    clock = FakeClock()
+    pool = connection_pool.ConnectionPool(Connect, clock=clock, **kwargs)
+    return pool, opened, clock
+
+
+def test_grows_to_max_size_then_times_out():
+    pool, opened, _ = _Pool(min_size=0, max_size=2)
+
+    first = pool.Acquire()
+    second = pool.Acquire()
+    assert len(opened) == 2
+    with pytest.raises(connection_pool.PoolTimeout):
+        pool.Acquire(timeout_s=0)
+
+    # Released connections are reused, without a round trip.
+    first.close()
+    first.close()
+    third = pool.Acquire(timeout_s=0)
+    assert third.number == 0
+    assert len(opened) == 2
+    assert opened[0].pings == 0
+    assert pool.in_use == 2
+    second.close()
+    third.close()
+    assert pool.in_use == 0
+
+
+def test_waiter_gets_released_connection():
+    pool, opened, _ = _Pool(min_size=0, max_size=1)
+    connection = pool.Acquire()
+    acquired = []
+
+    def Wait():
+        acquired.append(pool.Acquire(timeout_s=60))
+
+    waiter = threading.Thread(target=Wait)
+    waiter.start()
+    while pool.waiting == 0:
+        pass
+    connection.close()
+    waiter.join()
+
+    assert acquired[0].number == 0
+    assert len(opened) == 1
+
+
+def test_invalidated_connection_is_closed():
+    pool, opened, _ = _Pool(min_size=0, max_size=1)
+    connection = pool.Acquire()
+    connection.Invalidate()
+    connection.close()
+
+    assert opened[0].closed
+    assert pool.size == 0
+    assert pool.Acquire().number == 1
+
+
+def test_maintain():
+    pool, opened, clock = _Pool(min_size=2,
+                                max_size=4,
+                                max_lifetime_s=1000,
+                                idle_timeout_s=100,
+                                validation_interval_s=10)
+    pool.Maintain()
+    assert len(opened) == 2
+
+    connections = [pool.Acquire() for _ in range(4)]
+    for connection in connections:
+        connection.close()
+    assert pool.size == 4
+
+    # Validates idle connections, replacing broken ones.
+    clock.now = 10
+    opened[3].broken = True
+    pool.Maintain()
+    assert [connection.pings for connection in opened] == [1, 1, 1, 1]
+    assert opened[3].closed
+    assert pool.size == 3
+
+    # Shrinks to min_size once idle for long enough.
+    clock.now = 105
+    pool.Maintain()
+    assert pool.size == 2
+    assert sum(connection.closed for connection in opened) == 2
+
+    # Retires old connections, then opens new ones.
+    clock.now = 1000
+    pool.Maintain()
+    assert pool.size == 2
+    assert all(connection.closed for connection in opened[:4])
+    assert len(opened) == 6
+
+
+def test_close():
+    pool, opened, _ = _Pool(min_size=0, max_size=2)
+    idle = pool.Acquire()
+    busy = pool.Acquire()
+    idle.close()
+    pool.Close()
+
+    assert opened[0].closed
+    assert not opened[1].closed
+    busy.close()
+    assert opened[1].closed
+    assert pool.size == 0
@@ -0,0 +1,362 @@
+"""Local write-ahead journal for writes the database couldn't take.
+
+When MySQL is down or too slow, writes that must not be lost (command_log rows,
+and giveaway rolls along with their discord_users rows) are appended to a
+journal on local disk instead, and RunReplayer() writes them to MySQL once it
+recovers. Replies then don't wait on the database.
+
+Append() returns once the record is on disk. Records appended while a batch is
+being written share the next fsync.
+
+Each record is a line holding the CRC-32 of its JSON payload, then the payload.
+A record torn by a crash, or otherwise corrupted, fails its checksum and is
+skipped.
+
+The journal is split into segments. New records go to the newest segment. The
+replayer seals it, then replays sealed segments oldest first, deleting each
+once replayed. A segment is replayed from the start again if its replay was
+interrupted, so replaying a record must be idempotent.
+
+Processes may share a journal directory, e.g. two instances overlapping during
+a deploy. Each segment is locked (with flock) by the process writing it, and
+then by the process replaying it, so a replayer only takes segments that are
+sealed, or left over from a process that died. Dev and prod journal to
+different directories, as they write to different databases. Each shard
+journals to a subdirectory of its environment's directory, and replays the
+segments of every shard, so that none are left behind when --shard_count
+changes.
+"""
+
+from absl import flags
+from absl import logging
+import asyncio
+import fcntl
+import functools
+import json
+import mysql.connector
+from mysql.connector.cursor import MySQLCursor
+import os
+import time
+import typing
+import zlib
+
+from advice_bot import sharding
+from advice_bot.database import storage
+from advice_bot.util import metrics
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string(
+    "journal_dir", "~/.cache/advice_bot/journal",
+    "Where writes are journaled while the database is unavailable, in a "
+    "subdirectory per --env.")
+
+T = typing.TypeVar("T")
+
+# How long to wait for a database write before journaling it instead.
+WRITE_TIMEOUT_S = 5.0
+_REPLAY_INTERVAL_S = 10.0
+_SEGMENT_SUFFIX = ".journal"
+
+# Writes a record to the database, given its kind. Called in a transaction.
+_REPLAYERS: dict[str, typing.Callable[[dict, MySQLCursor], None]] = {}
+
+
+def RegisterReplayer(kind: str, fn: typing.Callable[[dict, MySQLCursor], None]):
+    """Sets how records of the given kind are replayed. fn must be idempotent."""
+    _REPLAYERS[kind] = fn
+
+
+def IsUnavailable(e: BaseException) -> bool:
+    """Returns whether e means the database couldn't take a write, as opposed
+    to rejecting it."""
+    if isinstance(
+            e,
+        (TimeoutError, mysql.connector.errors.PoolError,
+         mysql.connector.InterfaceError, mysql.connector.OperationalError)):
+        return True
+    # Client errors, e.g. CR_CONN_HOST_ERROR.
+    return (isinstance(e, mysql.connector.Error) and e.errno is not None and
+            2000 <= e.errno < 3000)
+
+
+async def Write(fn: typing.Callable[[MySQLCursor], T],
+                transaction: bool = False) -> T:
+    """Runs a database write, giving up after WRITE_TIMEOUT_S.
+
+    Raises TimeoutError if the database is too slow. The write may still go
+    through afterwards, which replaying a journaled copy must tolerate.
+    """
+    run = storage.RunInTransaction if transaction else storage.RunQuery
+    return await asyncio.wait_for(run(fn), WRITE_TIMEOUT_S)
+
+
+def _Encode(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _Decode(data: bytes) -> tuple[list[dict], int]:
+    """Returns the valid records, and how many corrupt ones were skipped."""
+    lines = data.split(b"\n")
+    # Whatever follows the last newline is a torn write, or empty.
+    lines.pop()
+    records = []
+    corrupt = 0
+    for line in lines:
+        checksum, _, payload = line.partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                raise ValueError("Bad checksum")
+            records.append(json.loads(payload))
+        except ValueError:
+            corrupt += 1
+    if data and not data.endswith(b"\n"):
+        corrupt += 1
+    return records, corrupt
+
+
+def _ReadSegment(path: str) -> tuple[list[dict], int]:
+    with open(path, "rb") as f:
+        return _Decode(f.read())
+
+
+def _SyncDirectory(directory: str):
+    """Makes renames in directory durable. Blocking."""
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _LockSegment(path: str) -> int | None:
+    """Returns an fd holding the segment's lock, or None if another process
+    holds it, or the segment is gone. Blocking."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # Unless it was replayed and deleted by whoever held the lock before.
+        if os.fstat(fd).st_ino == os.stat(path).st_ino:
+            return fd
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    os.close(fd)
+    return None
+
+
+class Journal():
+
+    def __init__(self, directory: str, replay_root: str | None = None):
+        """Appends to segments in directory. Replays the segments in
+        replay_root and its subdirectories, by default directory."""
+        self._directory = directory
+        self._replay_root = replay_root or directory
+        # Held while writing a batch, or sealing the current segment.
+        self._lock = asyncio.Lock()
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        # The segment being appended to, opened by the first write to it.
+        self._path: str | None = None
+        self._fd: int | None = None
+        self._last_segment_id = 0
+
+    async def Append(self, kind: str, record: dict):
+        """Appends a record, returning once it is on disk."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((_Encode({"kind": kind, **record}), future))
+        async with self._lock:
+            # Unless it was written by whoever held the lock before us.
+            if not future.done():
+                batch, self._pending = self._pending, []
+                write = asyncio.ensure_future(self._WriteBatch(batch))
+                try:
+                    await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    # The batch holds other callers' records, and the next
+                    # one must not overlap with it, so finish it first.
+                    await asyncio.wait([write])
+                    raise
+        future.result()
+        metrics.Increment("advice_bot_journal_appends_total", kind=kind)
+
+    async def Replay(self) -> bool:
+        """Replays everything journaled so far into the database.
+
+        Returns False if the database is still unavailable.
+        """
+        while True:
+            segments = await asyncio.to_thread(self._SealedSegments)
+            for path in segments:
+                fd = await asyncio.to_thread(_LockSegment, path)
+                if fd is None:
+                    # Still being written, or replayed by another process.
+                    continue
+                try:
+                    if not await self._ReplaySegment(path):
+                        return False
+                    await asyncio.to_thread(os.remove, path)
+                finally:
+                    os.close(fd)
+            if not await self._Seal():
+                return True
+
+    def Close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._path = None
+
+    async def _WriteBatch(self, batch: list[tuple[bytes, asyncio.Future]]):
+        try:
+            await asyncio.to_thread(self._Write,
+                                    b"".join(data for data, _ in batch))
+        except Exception as e:
+            # Don't append after what may be a torn write.
+            self.Close()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    def _Write(self, data: bytes):
+        """Appends data to the current segment and syncs it. Blocking."""
+        if self._fd is None:
+            os.makedirs(self._directory, mode=0o700, exist_ok=True)
+            # Segments sort in the order they were created, including those
+            # left over from earlier runs.
+            segment_id = max(time.time_ns(), self._last_segment_id + 1)
+            self._last_segment_id = segment_id
+            path = os.path.join(
+                self._directory,
+                f"{segment_id:020d}.{os.getpid()}{_SEGMENT_SUFFIX}")
+            # Locked before it gets its name, so that no replayer takes it.
+            temp_path = f"{path}.new"
+            fd = os.open(temp_path,
+                         os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND,
+                         0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                os.rename(temp_path, path)
+                # Or a crash could lose the segment's name, and with it the
+                # records synced below.
+                _SyncDirectory(self._directory)
+            except OSError:
+                os.close(fd)
+                raise
+            self._path = path
+            self._fd = fd
+        os.write(self._fd, data)
+        os.fsync(self._fd)
+
+    async def _Seal(self) -> bool:
+        """Starts a new segment. Returns False if the current one was empty."""
+        async with self._lock:
+            if self._fd is None:
+                return False
+            self.Close()
+            return True
+
+    def _SealedSegments(self) -> list[str]:
+        """Returns the segments in the replay root and its subdirectories,
+        oldest first, except the current one. Blocking."""
+        try:
+            directories = [self._replay_root] + [
+                entry.path
+                for entry in os.scandir(self._replay_root)
+                if entry.is_dir()
+            ]
+        except FileNotFoundError:
+            return []
+        paths = []
+        for directory in directories:
+            try:
+                filenames = os.listdir(directory)
+            except FileNotFoundError:
+                continue
+            paths += [
+                os.path.join(directory, filename)
+                for filename in filenames
+                if filename.endswith(_SEGMENT_SUFFIX)
+            ]
+        return sorted((path for path in paths if path != self._path),
+                      key=os.path.basename)
+
+    async def _ReplaySegment(self, path: str) -> bool:
+        records, corrupt = await asyncio.to_thread(_ReadSegment, path)
+        if corrupt > 0:
+            logging.error(f"Skipping {corrupt} corrupt record(s) in {path}.")
+            metrics.Increment("advice_bot_journal_replayed_total",
+                              kind="unknown",
+                              result="corrupt")
+        for record in records:
+            kind = record["kind"]
+            replay_fn = _REPLAYERS.get(kind)
+            try:
+                if replay_fn is None:
+                    raise ValueError(f"No replayer for {kind} records")
+                await Write(functools.partial(replay_fn, record),
+                            transaction=True)
+            except Exception as e:
+                if IsUnavailable(e):
+                    logging.warning(
+                        f"Database still unavailable, will replay {path} "
+                        f"later: {e!r}")
+                    return False
+                logging.exception(f"Dropped journaled record: {record}")
+                result = "dropped"
+            else:
+                result = "ok"
+            metrics.Increment("advice_bot_journal_replayed_total",
+                              kind=kind,
+                              result=result)
+        logging.info(f"Replayed {len(records)} journaled record(s) from "
+                     f"{path}.")
+        return True
+
+
+# Global journal, set up by Start().
+_JOURNAL: Journal | None = None
+
+
+def Start():
+    """Starts journaling writes the database can't take."""
+    global _JOURNAL
+    if _JOURNAL is None:
+        env_directory = os.path.join(os.path.expanduser(FLAGS.journal_dir),
+                                     FLAGS.env)
+        directory = env_directory
+        if sharding.Enabled():
+            directory = os.path.join(directory, f"shard{FLAGS.shard_id}")
+        _JOURNAL = Journal(directory, replay_root=env_directory)
+
+
+def Stop():
+    global _JOURNAL
+    if _JOURNAL is not None:
+        _JOURNAL.Close()
+        _JOURNAL = None
+
+
+def Enabled() -> bool:
+    return _JOURNAL is not None
+
+
+async def Append(kind: str, record: dict):
+    """Journals a record for replay. Requires Start()."""
+    await _JOURNAL.Append(kind, record)
+
+
+async def RunReplayer():
+    """Periodically replays the journal into the database. Runs forever."""
+    while True:
+        if _JOURNAL is not None:
+            try:
+                await _JOURNAL.Replay()
+            except Exception:
+                logging.exception("Failed to replay the journal.")
+        await asyncio.sleep(_REPLAY_INTERVAL_S)
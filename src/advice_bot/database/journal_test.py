@@ -0,0 +1,205 @@
+import asyncio
+import mysql.connector
+import os
+import pytest
+import threading
+
+from advice_bot.commands import monthly_giveaway
+from advice_bot.commands.monthly_giveaway import Prize
+from advice_bot.database import command_log, journal, sqlite_standin, storage
+
+
+def test_decode_skips_corrupt_and_torn_records():
+    first = journal._Encode({"kind": "a", "n": 1})
+    second = journal._Encode({"kind": "a", "n": 2})
+    corrupted = first.replace(b'"n":1', b'"n":7')
+
+    records, corrupt = journal._Decode(first + corrupted + second + second[:5])
+
+    assert records == [{"kind": "a", "n": 1}, {"kind": "a", "n": 2}]
+    assert corrupt == 2
+
+
+def test_concurrent_appends_are_batched(tmp_path, monkeypatch):
+    syncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd:
+                        (syncs.append(fd), real_fsync(fd)))
+
+    async def Run():
+        j = journal.Journal(str(tmp_path))
+        await asyncio.gather(*[j.Append("a", {"n": i}) for i in range(10)])
+        j.Close()
+
+    asyncio.run(Run())
+
+    # The first append is written on its own, after syncing the directory for
+    # the new segment. The rest share the next fsync.
+    assert len(syncs) == 3
+    [segment] = os.listdir(tmp_path)
+    records, corrupt = journal._ReadSegment(os.path.join(tmp_path, segment))
+    assert [record["n"] for record in records] == list(range(10))
+    assert corrupt == 0
+
+
+def test_replays_idempotently_once_database_recovers(tmp_path, monkeypatch):
+    backend = sqlite_standin.SqliteBackend(sqlite_standin.CreateDatabase(
+        str(tmp_path)),
+                                           latency_s=0,
+                                           pool_size=1)
+    monkeypatch.setattr(storage, "_BACKEND", backend)
+    run_in_transaction = storage.RunInTransaction
+    journal_dir = str(tmp_path / "journal")
+
+    async def Unavailable(fn):
+        raise mysql.connector.errors.PoolError("Can't connect")
+
+    async def Run():
+        j = journal.Journal(journal_dir)
+        entry = command_log.CommandLogEntry(message_id=1,
+                                            timestamp_micros=1,
+                                            discord_user_id=7,
+                                            discord_username="user7",
+                                            command="!roll",
+                                            command_status=0)
+        await j.Append(command_log._JOURNAL_KIND,
+                       {"entries": [entry._asdict()]})
+        await j.Append(
+            monthly_giveaway._JOURNAL_KIND, {
+                "discord_user_id": 8,
+                "discord_username": "user8",
+                "timestamp_micros": 1,
+                "prizes": [Prize.NO_PRIZE, Prize.GP_2M],
+            })
+
+        # Kept while the database is down.
+        monkeypatch.setattr(storage, "RunInTransaction", Unavailable)
+        assert not await j.Replay()
+        assert len(os.listdir(journal_dir)) == 1
+
+        monkeypatch.setattr(storage, "RunInTransaction", run_in_transaction)
+        assert await j.Replay()
+        assert os.listdir(journal_dir) == []
+
+        # Replaying the same records again changes nothing.
+        await j.Append(command_log._JOURNAL_KIND,
+                       {"entries": [entry._asdict()]})
+        await j.Append(
+            monthly_giveaway._JOURNAL_KIND, {
+                "discord_user_id": 8,
+                "discord_username": "user8",
+                "timestamp_micros": 2,
+                "prizes": [Prize.GOODYBAG],
+            })
+        assert await j.Replay()
+        j.Close()
+
+    asyncio.run(Run())
+
+    cursor = backend.Connect().cursor()
+    cursor.execute("SELECT discord_user_id FROM discord_users")
+    assert sorted(cursor.fetchall()) == [(7,), (8,)]
+    cursor.execute("SELECT message_id FROM command_log")
+    assert cursor.fetchall() == [(1,)]
+    cursor.execute(
+        "SELECT prize FROM monthly_giveaway_rolls ORDER BY sequence_index")
+    assert cursor.fetchall() == [(Prize.NO_PRIZE,), (Prize.GP_2M,)]
+    backend.Shutdown()
+
+
+def test_only_replays_segments_no_process_holds(tmp_path, monkeypatch):
+    replayed = []
+    monkeypatch.setitem(journal._REPLAYERS, "test",
+                        lambda record, cursor: replayed.append(record["n"]))
+
+    async def RunInTransaction(fn):
+        return fn(None)
+
+    monkeypatch.setattr(storage, "RunInTransaction", RunInTransaction)
+
+    async def Run():
+        # As if in two processes sharing the directory.
+        writer = journal.Journal(str(tmp_path))
+        replayer = journal.Journal(str(tmp_path))
+        await writer.Append("test", {"n": 1})
+
+        # The writer is still appending to its segment.
+        assert await replayer.Replay()
+        assert replayed == []
+        assert len(os.listdir(tmp_path)) == 1
+
+        # E.g. the writer exited without replaying.
+        writer.Close()
+        assert await replayer.Replay()
+        assert replayed == [1]
+        assert os.listdir(tmp_path) == []
+
+    asyncio.run(Run())
+
+
+def test_cancelled_append_finishes_its_batch(tmp_path):
+    writing = threading.Event()
+    release = threading.Event()
+
+    async def Run():
+        j = journal.Journal(str(tmp_path))
+        write = j._Write
+
+        def BlockingWrite(data: bytes):
+            writing.set()
+            release.wait()
+            write(data)
+
+        j._Write = BlockingWrite
+        first = asyncio.create_task(j.Append("a", {"n": 1}))
+        await asyncio.to_thread(writing.wait)
+        second = asyncio.create_task(j.Append("a", {"n": 2}))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        try:
+            # Waits for the write, rather than letting the next batch
+            # overlap it.
+            assert not first.done()
+        finally:
+            release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await second
+        j.Close()
+
+    asyncio.run(Run())
+
+    [segment] = os.listdir(tmp_path)
+    records, _ = journal._ReadSegment(os.path.join(tmp_path, segment))
+    assert [record["n"] for record in records] == [1, 2]
+
+
+def test_replays_segments_of_other_shards(tmp_path, monkeypatch):
+    replayed = []
+    monkeypatch.setitem(journal._REPLAYERS, "test",
+                        lambda record, cursor: replayed.append(record["n"]))
+
+    async def RunInTransaction(fn):
+        return fn(None)
+
+    monkeypatch.setattr(storage, "RunInTransaction", RunInTransaction)
+
+    async def Run():
+        # Left behind by a shard that no longer exists, and from before
+        # sharding.
+        old_shard = journal.Journal(str(tmp_path / "shard3"))
+        await old_shard.Append("test", {"n": 1})
+        old_shard.Close()
+        unsharded = journal.Journal(str(tmp_path))
+        await unsharded.Append("test", {"n": 2})
+        unsharded.Close()
+
+        shard = journal.Journal(str(tmp_path / "shard0"),
+                                replay_root=str(tmp_path))
+        assert await shard.Replay()
+
+    asyncio.run(Run())
+
+    assert replayed == [1, 2]
+    assert os.listdir(tmp_path / "shard3") == []
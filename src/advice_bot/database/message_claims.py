@@ -0,0 +1,136 @@
+"""Claims on messages, so that only one instance handles each message.
+
+Every instance connected to the same database sees every message (e.g. two
+prod instances overlapping during a deploy). Before responding to a message, an
+instance claims its message_id with an insert into message_claims. Only the
+instance whose insert succeeds executes the command and responds. Admin
+commands are the exception: they act on the instance that runs them (e.g.
+!admin status, !admin kill), so every instance runs them.
+
+A claim is a lease: once it expires, another instance may take the message
+over, e.g. if the gateway delivers it again after the claiming instance died.
+Expired claims are deleted by RunCleanup().
+
+Every response waits for its claim, so a claim that takes longer than
+_CLAIM_TIMEOUT_S is abandoned, and the instance responds anyway.
+"""
+
+from absl import flags
+from absl import logging
+import asyncio
+import functools
+import mysql.connector
+from mysql.connector import errorcode
+from mysql.connector.cursor import MySQLCursor
+import time
+
+from advice_bot.database import statements, storage
+from advice_bot.util import metrics
+
+FLAGS = flags.FLAGS
+flags.DEFINE_bool(
+    "claim_messages", True,
+    "Claim each message in the database before responding, so that "
+    "instances sharing the database don't respond twice.")
+flags.DEFINE_float("message_claim_lease_s", 60,
+                   "How long a claim on a message lasts.")
+
+# Claims are kept for a while after expiring, for debugging.
+_RETENTION_MICROS = 24 * 3600 * 1000000
+_CLEANUP_INTERVAL_S = 3600
+# Well under journal.WRITE_TIMEOUT_S, as responses wait for it.
+_CLAIM_TIMEOUT_S = 0.5
+
+_INSERT_CLAIM = statements.Declare("insert_message_claim",
+                                   prepared=True,
+                                   sql="""
+    INSERT INTO message_claims
+        (message_id, instance_id, lease_expiry_micros)
+    VALUES
+        (%(message_id)s, %(instance_id)s, %(lease_expiry_micros)s)
+""")
+_TAKE_OVER_CLAIM = statements.Declare("take_over_message_claim",
+                                      prepared=True,
+                                      sql="""
+    UPDATE message_claims
+    SET
+        instance_id = %(instance_id)s,
+        lease_expiry_micros = %(lease_expiry_micros)s
+    WHERE
+        message_id = %(message_id)s
+        AND lease_expiry_micros < %(timestamp_micros)s
+""")
+_DELETE_EXPIRED = statements.Declare("delete_expired_message_claims",
+                                     sql="""
+    DELETE FROM message_claims WHERE lease_expiry_micros < %s
+""")
+
+
+def _ClaimMessage(message_id: int, instance_id: str, timestamp_micros: int,
+                  lease_micros: int, cursor: MySQLCursor) -> str:
+    """Returns "WON", "TAKEN_OVER" or "LOST"."""
+    values = {
+        "message_id": message_id,
+        "instance_id": instance_id,
+        "timestamp_micros": timestamp_micros,
+        "lease_expiry_micros": timestamp_micros + lease_micros,
+    }
+    try:
+        statements.Execute(cursor, _INSERT_CLAIM, values)
+        return "WON"
+    except mysql.connector.IntegrityError as e:
+        if e.errno != errorcode.ER_DUP_ENTRY:
+            raise
+
+    # Already claimed. Take over the claim if its lease expired. The row lock
+    # makes sure only one instance does.
+    statements.Execute(cursor, _TAKE_OVER_CLAIM, values)
+    return "TAKEN_OVER" if cursor.rowcount == 1 else "LOST"
+
+
+async def Claim(message_id: int, instance_id: str,
+                timestamp_micros: int) -> bool:
+    """Returns True if this instance should handle the message.
+
+    If claims are disabled, or the claim fails or times out, handles the
+    message anyway: better to respond twice than not at all.
+    """
+    if not FLAGS.claim_messages:
+        return True
+    try:
+        # Each statement commits on its own, so the insert is visible to
+        # other instances right away.
+        result = await asyncio.wait_for(
+            storage.RunQuery(
+                functools.partial(_ClaimMessage, message_id, instance_id,
+                                  timestamp_micros,
+                                  int(FLAGS.message_claim_lease_s * 1000000))),
+            _CLAIM_TIMEOUT_S)
+    except TimeoutError:
+        logging.warning(f"Timed out claiming message {message_id}.")
+        result = "TIMEOUT"
+    except Exception:
+        logging.exception(f"Failed to claim message {message_id}.")
+        result = "ERROR"
+    metrics.Increment("advice_bot_message_claims_total", result=result)
+    return result != "LOST"
+
+
+def _DeleteExpired(before_micros: int, cursor: MySQLCursor) -> int:
+    statements.Execute(cursor, _DELETE_EXPIRED, (before_micros,))
+    return cursor.rowcount
+
+
+async def RunCleanup():
+    """Periodically deletes old claims. Runs forever."""
+    while True:
+        if FLAGS.claim_messages:
+            try:
+                deleted = await storage.RunQuery(
+                    functools.partial(
+                        _DeleteExpired,
+                        time.time_ns() // 1000 - _RETENTION_MICROS))
+                logging.info(f"Deleted {deleted} expired message claim(s).")
+            except Exception:
+                logging.exception("Failed to delete expired message claims.")
+        await asyncio.sleep(_CLEANUP_INTERVAL_S)
@@ -0,0 +1,49 @@
+import asyncio
+import types
+
+from advice_bot.database import message_claims, sqlite_standin, storage
+
+_LEASE_MICROS = 60 * 1000000
+
+
+def test_claim_message(tmp_path):
+    path = sqlite_standin.CreateDatabase(str(tmp_path))
+    backend = sqlite_standin.SqliteBackend(path, latency_s=0, pool_size=1)
+    cursor = backend.Connect().cursor()
+
+    def Claim(instance_id: str, timestamp_micros: int) -> str:
+        return message_claims._ClaimMessage(1, instance_id, timestamp_micros,
+                                            _LEASE_MICROS, cursor)
+
+    # The first claim wins with a single insert.
+    assert Claim("a", 0) == "WON"
+    assert backend.round_trips == 1
+    # Other instances lose until the lease expires, including the same one
+    # seeing the message again.
+    assert Claim("b", 1) == "LOST"
+    assert Claim("a", 2) == "LOST"
+    assert Claim("b", _LEASE_MICROS + 1) == "TAKEN_OVER"
+    assert Claim("a", _LEASE_MICROS + 2) == "LOST"
+    # Other messages are unaffected.
+    assert message_claims._ClaimMessage(2, "a", 0, _LEASE_MICROS,
+                                        cursor) == "WON"
+
+    assert message_claims._DeleteExpired(2 * _LEASE_MICROS, cursor) == 1
+    cursor.execute("SELECT message_id, instance_id FROM message_claims")
+    assert cursor.fetchall() == [(1, "b")]
+    backend.Shutdown()
+
+
+def test_responds_if_the_claim_times_out(monkeypatch):
+    monkeypatch.setattr(
+        message_claims, "FLAGS",
+        types.SimpleNamespace(claim_messages=True, message_claim_lease_s=60))
+    monkeypatch.setattr(message_claims, "_CLAIM_TIMEOUT_S", 0.01)
+
+    async def RunQuery(fn):
+        # The database hangs.
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(storage, "RunQuery", RunQuery)
+
+    assert asyncio.run(message_claims.Claim(1, "a", 0))
@@ -1,41 +1,47 @@
+-- Reports read the rollups, which the schema's triggers keep up to date. See
+-- schema/schema.sql.
+
 -- Participants per month
 SELECT
-  YEAR(FROM_UNIXTIME(timestamp_micros / 1e6)) AS year,
-  MONTH(FROM_UNIXTIME(timestamp_micros / 1e6)) AS month,
-  COUNT(DISTINCT discord_user_id) AS num_participants
-FROM monthly_giveaway_rolls
-GROUP BY year, month
-ORDER BY year, month;
+  giveaway_month DIV 100 AS year,
+  giveaway_month MOD 100 AS month,
+  num_participants
+FROM monthly_giveaway_participant_counts
+ORDER BY giveaway_month;
 
 -- Individual prizes per month
 SELECT
-  YEAR(FROM_UNIXTIME(timestamp_micros / 1e6)) AS year,
-  MONTH(FROM_UNIXTIME(timestamp_micros / 1e6)) AS month,
+  giveaway_month DIV 100 AS year,
+  giveaway_month MOD 100 AS month,
   prize,
   prize_name,
-  COUNT(*) AS count,
-  COUNT(*) * prize_value_m AS payout_m
-FROM monthly_giveaway_rolls
+  num_rolls AS count,
+  num_rolls * prize_value_m AS payout_m
+FROM monthly_giveaway_prize_counts
   NATURAL JOIN prizes
-WHERE prize != 0
-GROUP BY year, month, prize
-ORDER BY year, month, prize;
+WHERE prize != 0 AND num_rolls > 0
+ORDER BY giveaway_month, prize;
 
 -- Net prizes per month
 SELECT
-  year, month, SUM(payout_m) AS total_payout_m
+  giveaway_month DIV 100 AS year,
+  giveaway_month MOD 100 AS month,
+  SUM(num_rolls * prize_value_m) AS total_payout_m
+FROM monthly_giveaway_prize_counts
+  NATURAL JOIN prizes
+GROUP BY giveaway_month
+ORDER BY giveaway_month;
+
+-- Rollups that disagree with the rolls. Should return nothing. Slow, as it
+-- scans every roll.
+SELECT
+  giveaway_month, prize, rolls.num_rolls,
+  COALESCE(rollups.num_rolls, 0) AS rollup_num_rolls
 FROM (
-  SELECT
-    YEAR(FROM_UNIXTIME(timestamp_micros / 1e6)) AS year,
-    MONTH(FROM_UNIXTIME(timestamp_micros / 1e6)) AS month,
-    prize,
-    prize_name,
-    COUNT(*) AS count,
-    COUNT(*) * prize_value_m AS payout_m
-  FROM monthly_giveaway_rolls
-    NATURAL JOIN prizes
-  WHERE prize != 0
-  GROUP BY year, month, prize
-) AS monthly_payouts
-GROUP BY year, month
-ORDER BY year, month;
+    SELECT giveaway_month, prize, COUNT(*) AS num_rolls
+    FROM monthly_giveaway_rolls
+    GROUP BY giveaway_month, prize
+  ) AS rolls
+  LEFT JOIN monthly_giveaway_prize_counts AS rollups
+    USING (giveaway_month, prize)
+WHERE rolls.num_rolls != COALESCE(rollups.num_rolls, 0);
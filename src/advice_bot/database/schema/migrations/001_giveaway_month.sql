@@ -0,0 +1,20 @@
+-- Adds monthly_giveaway_rolls.giveaway_month and the unique key that makes
+-- recording a participation atomic.
+--
+-- The unique key cannot be added if a user has more than one participation in
+-- the same month. That should only be possible in dev (via --force); delete the
+-- extra rows first.
+
+-- giveaway_month is the UTC month.
+SET time_zone = '+00:00';
+
+ALTER TABLE monthly_giveaway_rolls
+  ADD COLUMN giveaway_month INTEGER NOT NULL DEFAULT 0 AFTER discord_user_id;
+
+UPDATE monthly_giveaway_rolls
+SET giveaway_month =
+  EXTRACT(YEAR_MONTH FROM FROM_UNIXTIME(timestamp_micros DIV 1000000));
+
+ALTER TABLE monthly_giveaway_rolls
+  ALTER COLUMN giveaway_month DROP DEFAULT,
+  ADD UNIQUE KEY participation (discord_user_id, giveaway_month, sequence_index);
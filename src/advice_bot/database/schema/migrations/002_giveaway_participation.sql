@@ -0,0 +1,32 @@
+-- Replaces the monthly_giveaway view with the monthly_giveaway_participation
+-- table, and backfills it from existing rolls.
+--
+-- The trigger is created before the backfill so that participations recorded
+-- while this runs are not missed. Requires 001_giveaway_month.sql.
+
+CREATE TABLE monthly_giveaway_participation (
+  discord_user_id BIGINT NOT NULL,
+  giveaway_month INTEGER NOT NULL,
+  timestamp_micros BIGINT NOT NULL,
+
+  PRIMARY KEY (discord_user_id, giveaway_month),
+  FOREIGN KEY (discord_user_id)
+    REFERENCES discord_users (discord_user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TRIGGER monthly_giveaway_participation_insert
+AFTER INSERT ON monthly_giveaway_rolls
+FOR EACH ROW
+  INSERT INTO monthly_giveaway_participation
+    (discord_user_id, giveaway_month, timestamp_micros)
+  SELECT NEW.discord_user_id, NEW.giveaway_month, NEW.timestamp_micros
+  FROM DUAL
+  WHERE NEW.sequence_index = 0;
+
+INSERT IGNORE INTO monthly_giveaway_participation
+  (discord_user_id, giveaway_month, timestamp_micros)
+SELECT discord_user_id, giveaway_month, timestamp_micros
+FROM monthly_giveaway_rolls
+WHERE sequence_index = 0;
+
+DROP VIEW IF EXISTS monthly_giveaway;
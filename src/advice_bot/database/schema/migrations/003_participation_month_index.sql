@@ -0,0 +1,4 @@
+-- Index for loading all participants of a month (participation cache prewarm).
+
+ALTER TABLE monthly_giveaway_participation
+  ADD KEY giveaway_month (giveaway_month);
@@ -0,0 +1,12 @@
+-- Claims on messages, so that only one instance responds to each.
+
+CREATE TABLE message_claims (
+  message_id BIGINT NOT NULL,
+  -- See AdminCommand.
+  instance_id CHAR(36) NOT NULL,
+  lease_expiry_micros BIGINT NOT NULL,
+
+  PRIMARY KEY (message_id),
+  -- For deleting expired claims.
+  KEY lease_expiry_micros (lease_expiry_micros)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,68 @@
+-- Adds the monthly_giveaway_participant_counts and
+-- monthly_giveaway_prize_counts rollups, and backfills them from existing
+-- participations and rolls.
+--
+-- The triggers are created before the backfill so that participations recorded
+-- while this runs are not missed. The backfill then recounts each month from
+-- scratch, replacing whatever the triggers counted so far, so nothing is
+-- counted twice. It can be re-run on its own to repair the rollups. Requires
+-- 002_giveaway_participation.sql.
+
+CREATE TABLE monthly_giveaway_participant_counts (
+  giveaway_month INTEGER NOT NULL,
+  num_participants INTEGER NOT NULL,
+
+  PRIMARY KEY (giveaway_month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE monthly_giveaway_prize_counts (
+  giveaway_month INTEGER NOT NULL,
+  prize INTEGER NOT NULL,
+  num_rolls INTEGER NOT NULL,
+
+  PRIMARY KEY (giveaway_month, prize)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TRIGGER monthly_giveaway_participant_counts_insert
+AFTER INSERT ON monthly_giveaway_participation
+FOR EACH ROW
+  INSERT INTO monthly_giveaway_participant_counts
+    (giveaway_month, num_participants)
+  VALUES (NEW.giveaway_month, 1)
+  ON DUPLICATE KEY UPDATE num_participants = num_participants + 1;
+
+CREATE TRIGGER monthly_giveaway_participant_counts_delete
+AFTER DELETE ON monthly_giveaway_participation
+FOR EACH ROW
+  UPDATE monthly_giveaway_participant_counts
+  SET num_participants = num_participants - 1
+  WHERE giveaway_month = OLD.giveaway_month;
+
+CREATE TRIGGER monthly_giveaway_prize_counts_insert
+AFTER INSERT ON monthly_giveaway_rolls
+FOR EACH ROW
+  INSERT INTO monthly_giveaway_prize_counts
+    (giveaway_month, prize, num_rolls)
+  VALUES (NEW.giveaway_month, NEW.prize, 1)
+  ON DUPLICATE KEY UPDATE num_rolls = num_rolls + 1;
+
+CREATE TRIGGER monthly_giveaway_prize_counts_delete
+AFTER DELETE ON monthly_giveaway_rolls
+FOR EACH ROW
+  UPDATE monthly_giveaway_prize_counts
+  SET num_rolls = num_rolls - 1
+  WHERE giveaway_month = OLD.giveaway_month AND prize = OLD.prize;
+
+-- The scans lock the rows they read, so concurrent participations either
+-- wait for the backfill, or are already committed and counted by it.
+REPLACE INTO monthly_giveaway_participant_counts
+  (giveaway_month, num_participants)
+SELECT giveaway_month, COUNT(*)
+FROM monthly_giveaway_participation
+GROUP BY giveaway_month;
+
+REPLACE INTO monthly_giveaway_prize_counts
+  (giveaway_month, prize, num_rolls)
+SELECT giveaway_month, prize, COUNT(*)
+FROM monthly_giveaway_rolls
+GROUP BY giveaway_month, prize;
@@ -20,6 +20,8 @@ CREATE TABLE command_log (
 
 CREATE TABLE monthly_giveaway_rolls (
   discord_user_id BIGINT NOT NULL,
+  -- UTC month of the participation, as YYYYMM.
+  giveaway_month INTEGER NOT NULL,
   timestamp_micros BIGINT NOT NULL,
   -- Identifies the unique roll within a given participation.
   sequence_index INTEGER NOT NULL,
@@ -27,6 +29,8 @@ CREATE TABLE monthly_giveaway_rolls (
   prize INTEGER NOT NULL,
 
   PRIMARY KEY (discord_user_id, timestamp_micros, sequence_index),
+  -- At most one participation per user per month.
+  UNIQUE KEY participation (discord_user_id, giveaway_month, sequence_index),
   FOREIGN KEY (discord_user_id)
     REFERENCES discord_users (discord_user_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -49,10 +53,89 @@ VALUES
   (5, 'GP_5M', 5),
   (6, 'GP_10M', 10);
 
-CREATE OR REPLACE VIEW monthly_giveaway
-AS
-  SELECT
-    discord_user_id,
-    MAX(timestamp_micros) AS last_participation_micros
-  FROM monthly_giveaway_rolls
-  GROUP BY discord_user_id;
+-- One row per user per month they participated in the giveaway. Maintained by
+-- the trigger below, so it is written in the same statement as the rolls.
+CREATE TABLE monthly_giveaway_participation (
+  discord_user_id BIGINT NOT NULL,
+  -- UTC month of the participation, as YYYYMM.
+  giveaway_month INTEGER NOT NULL,
+  timestamp_micros BIGINT NOT NULL,
+
+  PRIMARY KEY (discord_user_id, giveaway_month),
+  -- For prewarming the participation cache.
+  KEY giveaway_month (giveaway_month),
+  FOREIGN KEY (discord_user_id)
+    REFERENCES discord_users (discord_user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TRIGGER monthly_giveaway_participation_insert
+AFTER INSERT ON monthly_giveaway_rolls
+FOR EACH ROW
+  INSERT INTO monthly_giveaway_participation
+    (discord_user_id, giveaway_month, timestamp_micros)
+  SELECT NEW.discord_user_id, NEW.giveaway_month, NEW.timestamp_micros
+  FROM DUAL
+  WHERE NEW.sequence_index = 0;
+
+-- Rollups for reporting, so that reports don't scan every roll. Maintained by
+-- the triggers below, in the same statement as the participation. See
+-- database/prizes.sql.
+CREATE TABLE monthly_giveaway_participant_counts (
+  -- UTC month of the giveaway, as YYYYMM.
+  giveaway_month INTEGER NOT NULL,
+  num_participants INTEGER NOT NULL,
+
+  PRIMARY KEY (giveaway_month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE monthly_giveaway_prize_counts (
+  -- UTC month of the giveaway, as YYYYMM.
+  giveaway_month INTEGER NOT NULL,
+  -- See Prize enum.
+  prize INTEGER NOT NULL,
+  num_rolls INTEGER NOT NULL,
+
+  PRIMARY KEY (giveaway_month, prize)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TRIGGER monthly_giveaway_participant_counts_insert
+AFTER INSERT ON monthly_giveaway_participation
+FOR EACH ROW
+  INSERT INTO monthly_giveaway_participant_counts
+    (giveaway_month, num_participants)
+  VALUES (NEW.giveaway_month, 1)
+  ON DUPLICATE KEY UPDATE num_participants = num_participants + 1;
+
+CREATE TRIGGER monthly_giveaway_participant_counts_delete
+AFTER DELETE ON monthly_giveaway_participation
+FOR EACH ROW
+  UPDATE monthly_giveaway_participant_counts
+  SET num_participants = num_participants - 1
+  WHERE giveaway_month = OLD.giveaway_month;
+
+CREATE TRIGGER monthly_giveaway_prize_counts_insert
+AFTER INSERT ON monthly_giveaway_rolls
+FOR EACH ROW
+  INSERT INTO monthly_giveaway_prize_counts
+    (giveaway_month, prize, num_rolls)
+  VALUES (NEW.giveaway_month, NEW.prize, 1)
+  ON DUPLICATE KEY UPDATE num_rolls = num_rolls + 1;
+
+CREATE TRIGGER monthly_giveaway_prize_counts_delete
+AFTER DELETE ON monthly_giveaway_rolls
+FOR EACH ROW
+  UPDATE monthly_giveaway_prize_counts
+  SET num_rolls = num_rolls - 1
+  WHERE giveaway_month = OLD.giveaway_month AND prize = OLD.prize;
+
+-- Which instance is handling each message. See database/message_claims.py.
+CREATE TABLE message_claims (
+  message_id BIGINT NOT NULL,
+  -- See AdminCommand.
+  instance_id CHAR(36) NOT NULL,
+  lease_expiry_micros BIGINT NOT NULL,
+
+  PRIMARY KEY (message_id),
+  -- For deleting expired claims.
+  KEY lease_expiry_micros (lease_expiry_micros)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,303 @@
+"""SQLite stand-in for the MySQL database, for local load testing.
+
+Implements the storage backend interface on top of a SQLite file, translating
+the few MySQL-specific constructs the bot uses. Each round trip can be delayed
+to model network latency to a real database server.
+
+Not a general-purpose MySQL emulator: only the schema and queries in this repo
+are expected to work.
+"""
+
+import collections
+import mysql.connector
+from mysql.connector import errorcode
+import os
+import queue
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import typing
+
+from advice_bot.database import connection_pool, storage
+
+# SQLite version of schema/schema.sql, minus tables the bot doesn't use.
+_SCHEMA = """
+CREATE TABLE discord_users (
+  discord_user_id INTEGER NOT NULL PRIMARY KEY,
+  discord_username TEXT NOT NULL
+);
+
+CREATE TABLE command_log (
+  message_id INTEGER NOT NULL PRIMARY KEY,
+  timestamp_micros INTEGER NOT NULL,
+  discord_user_id INTEGER NOT NULL
+    REFERENCES discord_users (discord_user_id),
+  command TEXT NOT NULL,
+  command_status INTEGER NOT NULL
+);
+
+CREATE TABLE monthly_giveaway_rolls (
+  discord_user_id INTEGER NOT NULL
+    REFERENCES discord_users (discord_user_id),
+  giveaway_month INTEGER NOT NULL,
+  timestamp_micros INTEGER NOT NULL,
+  sequence_index INTEGER NOT NULL,
+  prize INTEGER NOT NULL,
+  PRIMARY KEY (discord_user_id, timestamp_micros, sequence_index),
+  UNIQUE (discord_user_id, giveaway_month, sequence_index)
+);
+
+CREATE TABLE monthly_giveaway_participation (
+  discord_user_id INTEGER NOT NULL
+    REFERENCES discord_users (discord_user_id),
+  giveaway_month INTEGER NOT NULL,
+  timestamp_micros INTEGER NOT NULL,
+  PRIMARY KEY (discord_user_id, giveaway_month)
+);
+
+CREATE INDEX giveaway_month
+  ON monthly_giveaway_participation (giveaway_month);
+
+CREATE TRIGGER monthly_giveaway_participation_insert
+AFTER INSERT ON monthly_giveaway_rolls
+FOR EACH ROW WHEN NEW.sequence_index = 0
+BEGIN
+  INSERT INTO monthly_giveaway_participation
+    (discord_user_id, giveaway_month, timestamp_micros)
+  VALUES (NEW.discord_user_id, NEW.giveaway_month, NEW.timestamp_micros);
+END;
+
+CREATE TABLE monthly_giveaway_participant_counts (
+  giveaway_month INTEGER NOT NULL PRIMARY KEY,
+  num_participants INTEGER NOT NULL
+);
+
+CREATE TABLE monthly_giveaway_prize_counts (
+  giveaway_month INTEGER NOT NULL,
+  prize INTEGER NOT NULL,
+  num_rolls INTEGER NOT NULL,
+  PRIMARY KEY (giveaway_month, prize)
+);
+
+CREATE TRIGGER monthly_giveaway_participant_counts_insert
+AFTER INSERT ON monthly_giveaway_participation
+FOR EACH ROW
+BEGIN
+  INSERT INTO monthly_giveaway_participant_counts
+    (giveaway_month, num_participants)
+  VALUES (NEW.giveaway_month, 1)
+  ON CONFLICT DO UPDATE SET num_participants = num_participants + 1;
+END;
+
+CREATE TRIGGER monthly_giveaway_participant_counts_delete
+AFTER DELETE ON monthly_giveaway_participation
+FOR EACH ROW
+BEGIN
+  UPDATE monthly_giveaway_participant_counts
+  SET num_participants = num_participants - 1
+  WHERE giveaway_month = OLD.giveaway_month;
+END;
+
+CREATE TRIGGER monthly_giveaway_prize_counts_insert
+AFTER INSERT ON monthly_giveaway_rolls
+FOR EACH ROW
+BEGIN
+  INSERT INTO monthly_giveaway_prize_counts
+    (giveaway_month, prize, num_rolls)
+  VALUES (NEW.giveaway_month, NEW.prize, 1)
+  ON CONFLICT DO UPDATE SET num_rolls = num_rolls + 1;
+END;
+
+CREATE TRIGGER monthly_giveaway_prize_counts_delete
+AFTER DELETE ON monthly_giveaway_rolls
+FOR EACH ROW
+BEGIN
+  UPDATE monthly_giveaway_prize_counts
+  SET num_rolls = num_rolls - 1
+  WHERE giveaway_month = OLD.giveaway_month AND prize = OLD.prize;
+END;
+
+CREATE TABLE prizes (
+  prize INTEGER NOT NULL PRIMARY KEY,
+  prize_name TEXT NOT NULL,
+  prize_value_m INTEGER NOT NULL
+);
+
+INSERT INTO prizes
+  (prize, prize_name, prize_value_m)
+VALUES
+  (0, 'NO_PRIZE', 0),
+  (1, 'GOODYBAG', 5),
+  (2, 'GP_2M', 2),
+  (3, 'CUSTOM_RANK', 0),
+  (4, 'CUSTOM_RANK_PLUSPLUS', 0),
+  (5, 'GP_5M', 5),
+  (6, 'GP_10M', 10);
+
+CREATE TABLE message_claims (
+  message_id INTEGER NOT NULL PRIMARY KEY,
+  instance_id TEXT NOT NULL,
+  lease_expiry_micros INTEGER NOT NULL
+);
+
+CREATE INDEX lease_expiry_micros ON message_claims (lease_expiry_micros);
+"""
+
+_NAMED_PARAM_REGEX = re.compile(r"%\((\w+)\)s")
+_ROW_ALIAS_REGEX = re.compile(r"\bAS (\w+)\s+ON DUPLICATE KEY UPDATE\b(.*)",
+                              re.DOTALL)
+
+
+def _TranslateUpsert(match: re.Match) -> str:
+    assignments = re.sub(rf"\b{match[1]}\.", "excluded.", match[2])
+    return "ON CONFLICT DO UPDATE SET" + assignments
+
+
+def TranslateQuery(query: str) -> str:
+    """Rewrites a MySQL query from this repo into SQLite syntax."""
+    query = _NAMED_PARAM_REGEX.sub(r":\1", query)
+    query = query.replace("%s", "?")
+    query = _ROW_ALIAS_REGEX.sub(_TranslateUpsert, query)
+    return query.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET")
+
+
+def _TranslateError(e: sqlite3.IntegrityError) -> mysql.connector.Error:
+    message = str(e)
+    if message.startswith("UNIQUE") or message.startswith("PRIMARY KEY"):
+        errno = errorcode.ER_DUP_ENTRY
+    elif message.startswith("FOREIGN KEY"):
+        errno = errorcode.ER_NO_REFERENCED_ROW_2
+    else:
+        errno = None
+    return mysql.connector.IntegrityError(msg=message, errno=errno)
+
+
+class _Cursor():
+
+    def __init__(self, cnx: "_Connection", named_tuple: bool):
+        self._cnx = cnx
+        self._cursor = cnx.sqlite.cursor()
+        self._named_tuple = named_tuple
+
+    def execute(self, query: str, params: typing.Any = ()):
+        self._cnx.RoundTrip()
+        try:
+            self._cursor.execute(TranslateQuery(query), params)
+        except sqlite3.IntegrityError as e:
+            raise _TranslateError(e) from e
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def fetchall(self) -> list:
+        return list(self)
+
+    def __iter__(self):
+        rows = self._cursor.fetchall()
+        if not self._named_tuple:
+            return iter(rows)
+        row_type = collections.namedtuple(
+            "Row", [column[0] for column in self._cursor.description])
+        return iter([row_type(*row) for row in rows])
+
+    def close(self):
+        self._cursor.close()
+
+
+class _Connection():
+    """A pooled connection. Returns itself to the pool when closed."""
+
+    def __init__(self, backend: "SqliteBackend", sqlite: sqlite3.Connection):
+        self._backend = backend
+        self.sqlite = sqlite
+
+    def RoundTrip(self):
+        self._backend.CountRoundTrip()
+
+    def start_transaction(self):
+        self.RoundTrip()
+        self.sqlite.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self.RoundTrip()
+        self.sqlite.execute("COMMIT")
+
+    def rollback(self):
+        self.RoundTrip()
+        self.sqlite.execute("ROLLBACK")
+
+    def cursor(self, named_tuple: bool = False) -> _Cursor:
+        return _Cursor(self, named_tuple)
+
+    def close(self):
+        self._backend.Release(self)
+
+
+class SqliteBackend(storage._Backend):
+    """Stands in for storage's MySQL backend, on a shared SQLite file.
+
+    Every query, commit and rollback counts as one round trip, and sleeps for
+    latency_s first to model the network.
+    """
+
+    def __init__(self, path: str, latency_s: float, pool_size: int):
+        super().__init__(pool_size)
+        self._path = path
+        self._latency_s = latency_s
+        self._idle: queue.SimpleQueue[_Connection] = queue.SimpleQueue()
+        self._stats_lock = threading.Lock()
+        self.round_trips = 0
+        for _ in range(pool_size):
+            self._idle.put(_Connection(self, self._Open()))
+
+    def _Open(self) -> sqlite3.Connection:
+        sqlite = sqlite3.connect(self._path,
+                                 timeout=60,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+        sqlite.execute("PRAGMA foreign_keys = ON")
+        return sqlite
+
+    def CountRoundTrip(self):
+        with self._stats_lock:
+            self.round_trips += 1
+        if self._latency_s > 0:
+            time.sleep(self._latency_s)
+
+    def Connect(self) -> _Connection:
+        return self._idle.get()
+
+    def Release(self, cnx: _Connection):
+        self._idle.put(cnx)
+
+    def Open(self):
+        pass
+
+    def Shutdown(self):
+        self.executor.shutdown(wait=True)
+        while not self._idle.empty():
+            self._idle.get().sqlite.close()
+
+
+def BackendFactory(path: str,
+                   latency_s: float) -> typing.Callable[[int], SqliteBackend]:
+    """Returns a storage._BACKEND_FACTORY for the database at path.
+
+    Sizes the backend like the default pool limits.
+    """
+    return lambda extra_connections: SqliteBackend(
+        path, latency_s, connection_pool.DEFAULT_MAX_SIZE + extra_connections)
+
+
+def CreateDatabase(directory: str | None = None) -> str:
+    """Creates an empty database with the bot's schema. Returns its path."""
+    fd, path = tempfile.mkstemp(suffix=".sqlite3", dir=directory)
+    os.close(fd)
+    sqlite = sqlite3.connect(path)
+    sqlite.execute("PRAGMA journal_mode = WAL")
+    sqlite.executescript(_SCHEMA)
+    sqlite.close()
+    return path
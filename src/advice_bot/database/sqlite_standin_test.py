@@ -0,0 +1,84 @@
+from advice_bot.commands import monthly_giveaway
+from advice_bot.commands.monthly_giveaway import Prize
+from advice_bot.database import sqlite_standin
+
+
+class _User():
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+
+def test_translate_query():
+    query = """
+        INSERT INTO discord_users (discord_user_id, discord_username)
+        VALUES (%(discord_user_id)s, %s) AS new
+        ON DUPLICATE KEY UPDATE discord_username = new.discord_username
+    """
+
+    assert " ".join(sqlite_standin.TranslateQuery(query).split()) == (
+        "INSERT INTO discord_users (discord_user_id, discord_username) "
+        "VALUES (:discord_user_id, ?) "
+        "ON CONFLICT DO UPDATE SET discord_username = excluded.discord_username"
+    )
+
+
+def test_record_giveaway_outcome(tmp_path):
+    path = sqlite_standin.CreateDatabase(str(tmp_path))
+    backend = sqlite_standin.SqliteBackend(path, latency_s=0, pool_size=1)
+    cnx = backend.Connect()
+    cursor = cnx.cursor(named_tuple=True)
+    user = _User(123, "someone")
+    timestamp_micros = 1738400000000000  # 2025-02-01
+    prizes = [Prize.NO_PRIZE, Prize.GP_2M, Prize.NO_PRIZE, Prize.GOODYBAG]
+
+    # New user: the insert fails the foreign key, so the user is added and the
+    # insert retried.
+    assert monthly_giveaway._RecordGiveawayOutcome(user, timestamp_micros,
+                                                   prizes, False, cursor)
+    assert backend.round_trips == 3
+    # Already participated this month.
+    assert not monthly_giveaway._RecordGiveawayOutcome(
+        user, timestamp_micros + 1, prizes, False, cursor)
+    assert backend.round_trips == 4
+
+    # The trigger recorded the participation.
+    assert monthly_giveaway._SelectParticipationMicros(
+        user.id, 202502, cursor) == timestamp_micros
+
+    cursor.close()
+    cnx.close()
+    backend.Shutdown()
+
+
+def test_giveaway_rollups(tmp_path):
+    path = sqlite_standin.CreateDatabase(str(tmp_path))
+    backend = sqlite_standin.SqliteBackend(path, latency_s=0, pool_size=1)
+    cnx = backend.Connect()
+    cursor = cnx.cursor(named_tuple=True)
+    timestamp_micros = 1738400000000000  # 2025-02-01
+    prizes = [Prize.NO_PRIZE, Prize.GP_2M, Prize.NO_PRIZE, Prize.GOODYBAG]
+
+    for user_id in range(3):
+        assert monthly_giveaway._RecordGiveawayOutcome(
+            _User(user_id, "someone"), timestamp_micros, prizes, False, cursor)
+    # Replacing a participation, in dev, doesn't count it twice.
+    assert monthly_giveaway._RecordGiveawayOutcome(_User(0, "someone"),
+                                                   timestamp_micros + 1,
+                                                   [Prize.GP_10M] * 4, True,
+                                                   cursor)
+
+    stats = monthly_giveaway._SelectMonthlyStats(202502, cursor)
+    assert stats.num_participants == 3
+    assert stats.prize_counts == [
+        (Prize.GOODYBAG, 2, 10),
+        (Prize.GP_2M, 2, 4),
+        (Prize.GP_10M, 4, 40),
+    ]
+    assert monthly_giveaway._SelectMonthlyStats(202503,
+                                                cursor) == (202503, 0, [])
+
+    cursor.close()
+    cnx.close()
+    backend.Shutdown()
@@ -0,0 +1,180 @@
+"""Registry of SQL statements, declared once by name.
+
+Statements are declared at import time with Declare(), and run with Execute()
+on a cursor from storage.RunQuery() or RunInTransaction().
+
+Statements declared with prepared=True run as server-side prepared statements:
+prepared the first time they run on a connection, then executed by ID with
+binary parameters, so the server doesn't parse them again. The prepared handles
+are cached on the physical connection, so they survive pool checkouts. Only use
+prepared=True for statements that don't return rows.
+
+A statement with a {rows} placeholder inserts a variable number of rows: the
+placeholder is replaced by that many copies of row. Each row count would be a
+separate prepared statement, costing a prepare round trip per new count, so only
+the row counts in prepared_rows are prepared. Others run as text.
+
+Prepared statements are experimental and opt-in: they only run when
+MysqlParams.prepared_statements is set, as they need the pure Python protocol,
+which is then used for every query (see storage.py). Otherwise, e.g. by default
+and on the stand-in databases, every statement runs as text. Compare
+advice_bot_db_statement_cache_hits_total with the prepares and evictions to see
+whether the cached handles pay off.
+"""
+
+import collections
+import mysql.connector
+import re
+import typing
+
+from advice_bot.database.connection_pool import PooledConnection
+from advice_bot.util import metrics
+
+# Least recently used statements beyond this are closed.
+_MAX_PREPARED_PER_CONNECTION = 64
+_CACHE_KEY = "prepared_statements"
+_NAMED_PARAM_REGEX = re.compile(r"%\((\w+)\)s")
+
+Values = dict[str, typing.Any] | typing.Sequence[typing.Any]
+
+
+class Statement():
+
+    def __init__(self, name: str, sql: str, row: str | None, prepared: bool,
+                 prepared_rows: typing.Collection[int]):
+        self.name = name
+        self._prepared = prepared
+        self._prepared_rows = frozenset(prepared_rows)
+        self._sql = sql
+        self._row = row
+        self._param_names = _NAMED_PARAM_REGEX.findall(sql)
+        # By number of rows. Built on first use, as they run on hot paths.
+        self._sql_by_rows: dict[int | None, str] = {}
+
+    def IsPrepared(self, rows: int | None = None) -> bool:
+        if self._row is None:
+            return self._prepared
+        return rows in self._prepared_rows
+
+    def Sql(self, rows: int | None = None) -> str:
+        sql = self._sql_by_rows.get(rows)
+        if sql is None:
+            sql = self._sql
+            if self._row is not None:
+                sql = sql.replace("{rows}", ", ".join([self._row] * rows))
+            self._sql_by_rows[rows] = sql
+        return sql
+
+    def PreparedSql(self, rows: int | None = None) -> bytes:
+        """Returns the SQL with ? placeholders, as the server expects."""
+        sql = _NAMED_PARAM_REGEX.sub("?", self.Sql(rows))
+        return sql.replace("%s", "?").encode()
+
+    def Params(self, values: Values) -> tuple:
+        """Returns values as a tuple in placeholder order."""
+        if isinstance(values, dict):
+            return tuple(values[name] for name in self._param_names)
+        return tuple(values)
+
+
+_REGISTRY: dict[str, Statement] = {}
+
+
+def Declare(
+    name: str,
+    *,
+    sql: str,
+    row: str | None = None,
+    prepared: bool = False,
+    prepared_rows: typing.Collection[int] = ()
+) -> Statement:
+    """Declares a statement. Parameters are either all named, as
+    %(name)s, or all positional, as %s.
+
+    Statements with a row use prepared_rows rather than prepared.
+    """
+    if name in _REGISTRY:
+        raise ValueError(f"Statement {name} declared twice")
+    if row is None and prepared_rows:
+        raise ValueError(f"Statement {name} has prepared_rows but no row")
+    if row is not None and prepared:
+        raise ValueError(
+            f"Statement {name} has a row, so must use prepared_rows")
+    statement = _REGISTRY[name] = Statement(name, sql, row, prepared,
+                                            prepared_rows)
+    return statement
+
+
+class StatementCursor():
+    """Wraps a cursor to run prepared statements on its connection."""
+
+    def __init__(self, cursor, connection: PooledConnection):
+        self._cursor = cursor
+        self._connection = connection
+        # Set by the last prepared statement.
+        self._affected_rows: int | None = None
+
+    def execute(self, *args, **kwargs):
+        self._affected_rows = None
+        return self._cursor.execute(*args, **kwargs)
+
+    @property
+    def rowcount(self) -> int:
+        if self._affected_rows is not None:
+            return self._affected_rows
+        return self._cursor.rowcount
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def ExecutePrepared(self, statement: Statement, values: Values,
+                        rows: int | None):
+        handle = self._PreparedHandle(statement, rows)
+        result = self._connection.cmd_stmt_execute(
+            handle["statement_id"],
+            data=statement.Params(values),
+            parameters=handle["parameters"])
+        if not isinstance(result, dict):
+            raise mysql.connector.ProgrammingError(
+                f"Prepared statement {statement.name} returned rows")
+        self._affected_rows = result["affected_rows"]
+
+    def _PreparedHandle(self, statement: Statement, rows: int | None) -> dict:
+        cache: collections.OrderedDict[tuple[str, int | None], dict] = (
+            self._connection.cache.setdefault(_CACHE_KEY,
+                                              collections.OrderedDict()))
+        key = (statement.name, rows)
+        handle = cache.get(key)
+        if handle is not None:
+            cache.move_to_end(key)
+            metrics.Increment("advice_bot_db_statement_cache_hits_total",
+                              statement=statement.name)
+            return handle
+
+        handle = cache[key] = self._connection.cmd_stmt_prepare(
+            statement.PreparedSql(rows))
+        metrics.Increment("advice_bot_db_statement_prepares_total",
+                          statement=statement.name)
+        if len(cache) > _MAX_PREPARED_PER_CONNECTION:
+            _, evicted = cache.popitem(last=False)
+            self._connection.cmd_stmt_close(evicted["statement_id"])
+            metrics.Increment("advice_bot_db_statement_evictions_total")
+        return handle
+
+
+def Execute(cursor,
+            statement: Statement,
+            values: Values = (),
+            rows: int | None = None):
+    """Runs statement. Results, if any, are read from cursor as usual.
+
+    rows is the number of rows, for statements with a {rows} placeholder.
+    """
+    if statement.IsPrepared(rows) and isinstance(cursor, StatementCursor):
+        cursor.ExecutePrepared(statement, values, rows)
+    else:
+        # E.g. on the stand-in databases.
+        cursor.execute(statement.Sql(rows), values)
@@ -0,0 +1,136 @@
+import pytest
+
+from advice_bot.database import connection_pool, statements
+from advice_bot.util import metrics
+
+_INSERT = statements.Declare("test_insert",
+                             row="(%s, %s)",
+                             prepared_rows=(1, 2, 3),
+                             sql="INSERT INTO t (a, b) VALUES {rows}")
+_UPSERT = statements.Declare("test_upsert",
+                             prepared=True,
+                             sql="""
+    INSERT INTO t (a, b) VALUES (%(a)s, %(b)s)
+    ON DUPLICATE KEY UPDATE b = %(b)s
+""")
+_SELECT = statements.Declare("test_select", sql="SELECT b FROM t")
+
+
+class FakeConnection():
+
+    def __init__(self):
+        self.prepared = {}
+        self.executed = []
+        self.closed_statements = []
+        self.queries = []
+
+    def cmd_stmt_prepare(self, sql: bytes) -> dict:
+        statement_id = len(self.prepared) + 1
+        self.prepared[statement_id] = sql
+        return {"statement_id": statement_id, "parameters": []}
+
+    def cmd_stmt_execute(self, statement_id: int, data: tuple,
+                         parameters: list) -> dict:
+        self.executed.append((statement_id, data))
+        return {"affected_rows": len(data)}
+
+    def cmd_stmt_close(self, statement_id: int):
+        self.closed_statements.append(statement_id)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor():
+
+    def __init__(self, connection: FakeConnection):
+        self._connection = connection
+        self.rowcount = -1
+
+    def execute(self, query, values):
+        self._connection.queries.append((query, values))
+
+
+def _Cursor(pool: connection_pool.ConnectionPool):
+    connection = pool.Acquire()
+    return statements.StatementCursor(connection.cursor(), connection)
+
+
+def test_sql():
+    assert _INSERT.Sql(
+        rows=2) == "INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)"
+    assert _INSERT.PreparedSql(rows=1) == b"INSERT INTO t (a, b) VALUES (?, ?)"
+    assert b"b = ?" in _UPSERT.PreparedSql()
+    assert _UPSERT.Params({"a": 1, "b": 2}) == (1, 2, 2)
+
+
+def test_prepares_once_per_connection():
+    metrics.Reset()
+    connection = FakeConnection()
+    pool = connection_pool.ConnectionPool(lambda: connection, max_size=1)
+
+    for i in range(3):
+        cursor = _Cursor(pool)
+        statements.Execute(cursor, _UPSERT, {"a": i, "b": i})
+        assert cursor.rowcount == 3
+        cursor._connection.close()
+
+    # Prepared on the first checkout, and reused on later ones.
+    assert len(connection.prepared) == 1
+    assert connection.executed == [(1, (0, 0, 0)), (1, (1, 1, 1)),
+                                   (1, (2, 2, 2))]
+    text = metrics.PrometheusText()
+    assert ('advice_bot_db_statement_prepares_total{statement="test_upsert"} 1'
+            in text)
+    assert (
+        'advice_bot_db_statement_cache_hits_total{statement="test_upsert"} 2'
+        in text)
+
+
+def test_each_row_count_is_prepared_separately(monkeypatch):
+    monkeypatch.setattr(statements, "_MAX_PREPARED_PER_CONNECTION", 2)
+    connection = FakeConnection()
+    pool = connection_pool.ConnectionPool(lambda: connection, max_size=1)
+    cursor = _Cursor(pool)
+
+    statements.Execute(cursor, _INSERT, [1, 2], rows=1)
+    statements.Execute(cursor, _INSERT, [1, 2, 3, 4], rows=2)
+    statements.Execute(cursor, _INSERT, [1, 2], rows=1)
+    # Evicts the least recently used, for 2 rows.
+    statements.Execute(cursor, _INSERT, [1, 2, 3, 4, 5, 6], rows=3)
+
+    assert connection.closed_statements == [2]
+    assert [statement_id for statement_id, _ in connection.executed
+           ] == [1, 2, 1, 3]
+
+
+def test_falls_back_to_text():
+    connection = FakeConnection()
+    pool = connection_pool.ConnectionPool(lambda: connection, max_size=1)
+    cursor = _Cursor(pool)
+
+    statements.Execute(cursor, _SELECT)
+    # Row counts that aren't in prepared_rows.
+    statements.Execute(cursor, _INSERT, [1, 2, 3, 4, 5, 6, 7, 8], rows=4)
+    # Cursors not from the pool, e.g. from a stand-in database.
+    statements.Execute(FakeCursor(connection), _INSERT, [1, 2], rows=1)
+
+    assert connection.queries == [
+        ("SELECT b FROM t", ()),
+        ("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s), (%s, %s)",
+         [1, 2, 3, 4, 5, 6, 7, 8]),
+        ("INSERT INTO t (a, b) VALUES (%s, %s)", [1, 2]),
+    ]
+    assert connection.prepared == {}
+
+
+def test_declare_checks_prepared_options():
+    with pytest.raises(ValueError):
+        statements.Declare("test_prepared_row",
+                           row="(%s)",
+                           prepared=True,
+                           sql="INSERT INTO t (a) VALUES {rows}")
+    with pytest.raises(ValueError):
+        statements.Declare("test_prepared_rows_without_row",
+                           prepared_rows=(1,),
+                           sql="INSERT INTO t (a) VALUES (%s)")
@@ -1,26 +1,305 @@
 """Library for accessing the database."""
 
-from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
+from absl import logging
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import mysql.connector
+import threading
+import typing
+from mysql.connector.cursor import MySQLCursor
 
 from advice_bot import params
+from advice_bot.database import connection_pool, statements
+from advice_bot.database.connection_pool import ConnectionPool, PooledConnection
+from advice_bot.util import metrics
+from advice_bot.util.admission_queue import AdmissionQueue
 
-# Global database.Connection pool, lazily loaded and refreshed as needed.
-_CNX_POOL = None
+T = typing.TypeVar("T")
 
+# How often RunMaintenance() maintains the pool.
+_MAINTENANCE_INTERVAL_S = 10.0
+# Beyond this, calls fail right away instead of waiting for a worker.
+_MAX_WAITING_CALLS = 10000
 
-def _CreatePool() -> MySQLConnectionPool:
-    return MySQLConnectionPool(pool_name="main_pool",
-                               pool_size=5,
-                               pool_reset_session=True,
-                               **params.MysqlConnectionArgs())
 
+class _Backend():
+    """A connection pool plus worker threads for blocking database calls.
 
-def Connect() -> PooledMySQLConnection:
+    There is one worker per connection the pool may open, so a worker rarely
+    waits on the pool. Instead, calls wait on the event loop for a free worker,
+    for up to wait_timeout_s (see _Run()). The pool is created lazily.
+    """
+
+    def __init__(self,
+                 pool_size: int,
+                 wait_timeout_s: float = connection_pool.DEFAULT_WAIT_TIMEOUT_S,
+                 prepared_statements: bool = False,
+                 **pool_args):
+        """pool_size is the maximum number of connections. pool_args are
+        passed on to ConnectionPool."""
+        self.pool_size = pool_size
+        self.wait_timeout_s = wait_timeout_s
+        self.prepared_statements = prepared_statements
+        self._pool_args = pool_args
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="storage")
+        self.admission = AdmissionQueue(max_running=pool_size,
+                                        max_waiting=_MAX_WAITING_CALLS)
+        self._pool: ConnectionPool | None = None
+        self._pool_lock = threading.Lock()
+
+        # Maintained by _Run(), on the event loop.
+        self.in_flight = 0
+        self.calls = 0
+        # Calls that found every worker busy, and had to wait.
+        self.queued_calls = 0
+
+    def _GetPool(self) -> ConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                # No reset round trip on checkout, unlike mysql.connector's
+                # pool. Calls don't leave session state behind, and each
+                # transaction ends with a commit or rollback.
+                #
+                # Prepared statements need the pure Python protocol: the C
+                # extension drops the error code of their errors, and returns
+                # different handles. Otherwise use the faster C extension.
+                self._pool = ConnectionPool(functools.partial(
+                    mysql.connector.connect,
+                    autocommit=True,
+                    use_pure=self.prepared_statements,
+                    **params.MysqlConnectionArgs()),
+                                            max_size=self.pool_size,
+                                            wait_timeout_s=self.wait_timeout_s,
+                                            **self._pool_args)
+            return self._pool
+
+    def Connect(self) -> PooledConnection:
+        return self._GetPool().Acquire()
+
+    def Open(self):
+        """Opens the pool's minimum number of connections. Blocking."""
+        self._GetPool().Maintain()
+
+    def Maintain(self):
+        """See ConnectionPool.Maintain(). Blocking."""
+        with self._pool_lock:
+            pool = self._pool
+        if pool is not None:
+            pool.Maintain()
+
+    def Shutdown(self):
+        """Waits for in-flight calls, then closes the connections. Blocking."""
+        self.executor.shutdown(wait=True)
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.Close()
+                self._pool = None
+
+
+def _CreateBackend(extra_connections: int) -> _Backend:
+    pool_args = params.MysqlPoolArgs()
+    min_size = pool_args.pop("min_size", connection_pool.DEFAULT_MIN_SIZE)
+    max_size = pool_args.pop("max_size", connection_pool.DEFAULT_MAX_SIZE)
+    return _Backend(
+        max_size + extra_connections,
+        min_size=min_size + extra_connections,
+        prepared_statements=params.Params().mysql_params.prepared_statements,
+        **pool_args)
+
+
+# Global backend, lazily created and replaced by Resize().
+_BACKEND: _Backend | None = None
+_EXTRA_CONNECTIONS = 0
+# Creates a backend, given how many connections to add to the configured
+# limits. Replaced by the load tester to run against a stand-in database.
+_BACKEND_FACTORY: typing.Callable[[int], _Backend] = _CreateBackend
+
+
+def _GetBackend() -> _Backend:
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _BACKEND_FACTORY(_EXTRA_CONNECTIONS)
+    return _BACKEND
+
+
+def PoolSize() -> int:
+    """Returns the maximum number of concurrent database calls."""
+    return _GetBackend().pool_size
+
+
+def Connect() -> PooledConnection:
     """Returns a database.Connection, creating the pool lazily.
 
-  Raises PoolError if no connections are available.
+  Blocks on network I/O, so must not be called from the event loop. Use
+  RunQuery() or RunInTransaction() instead.
+
+  Waits for a connection if all are in use, then raises PoolTimeout (a
+  PoolError) if none became available.
   """
-    global _CNX_POOL
-    if _CNX_POOL is None:
-        _CNX_POOL = _CreatePool()
-    return _CNX_POOL.get_connection()
+    return _GetBackend().Connect()
+
+
+def _RunWithCursor(backend: _Backend, fn: typing.Callable[[MySQLCursor], T],
+                   transaction: bool, named_tuple: bool) -> T:
+    cnx = backend.Connect()
+    if transaction:
+        cnx.start_transaction()
+    cursor = cnx.cursor(named_tuple=named_tuple)
+    if backend.prepared_statements and isinstance(cnx, PooledConnection):
+        cursor = statements.StatementCursor(cursor, cnx)
+    try:
+        result = fn(cursor)
+        if transaction:
+            cnx.commit()
+        return result
+    except Exception as e:
+        if (isinstance(cnx, PooledConnection) and
+                isinstance(e, (mysql.connector.InterfaceError,
+                               mysql.connector.OperationalError))):
+            # May be broken, so close it rather than hand it out again. The
+            # server rolls back any transaction.
+            cnx.Invalidate()
+        elif transaction:
+            cnx.rollback()
+        raise
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+def _QueryName(fn: typing.Callable) -> str:
+    if isinstance(fn, functools.partial):
+        fn = fn.func
+    return getattr(fn, "__name__", "unknown")
+
+
+def _UpdateWaiting(backend: _Backend):
+    metrics.SetGauge("advice_bot_db_calls_waiting",
+                     max(backend.in_flight - backend.pool_size, 0))
+
+
+@contextlib.asynccontextmanager
+async def _Admit(backend: _Backend):
+    """Waits for one of backend's workers to be free, and holds it."""
+    loop = asyncio.get_running_loop()
+    backend.calls += 1
+    if backend.in_flight >= backend.pool_size:
+        backend.queued_calls += 1
+    backend.in_flight += 1
+    _UpdateWaiting(backend)
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            queued_at = loop.time()
+            try:
+                await stack.enter_async_context(
+                    backend.admission.Admit(backend.wait_timeout_s))
+            except (asyncio.QueueFull, TimeoutError) as e:
+                metrics.Increment("advice_bot_db_call_timeouts_total")
+                raise connection_pool.PoolTimeout(
+                    msg="No database connection available") from e
+            metrics.Observe("advice_bot_db_call_wait_seconds",
+                            loop.time() - queued_at)
+            yield
+    finally:
+        backend.in_flight -= 1
+        _UpdateWaiting(backend)
+
+
+async def _Run(fn: typing.Callable[[MySQLCursor], T], transaction: bool,
+               named_tuple: bool) -> T:
+    loop = asyncio.get_running_loop()
+    # Includes waiting for a connection, as that is part of the latency.
+    with metrics.Timer("advice_bot_db_query_seconds",
+                       command=metrics.CURRENT_COMMAND.get(),
+                       query=_QueryName(fn)):
+        while True:
+            # Bind the backend, so its workers only ever use its own pool.
+            backend = _GetBackend()
+            async with _Admit(backend):
+                # Resize() only shuts down a backend's workers after swapping
+                # it out, so they still accept work if it is current.
+                if backend is _BACKEND:
+                    return await loop.run_in_executor(backend.executor,
+                                                      _RunWithCursor, backend,
+                                                      fn, transaction,
+                                                      named_tuple)
+            # Swapped out while this call waited. Wait on the new one instead.
+            metrics.Increment("advice_bot_db_call_requeues_total")
+
+
+async def RunQuery(fn: typing.Callable[[MySQLCursor], T],
+                   named_tuple: bool = False) -> T:
+    """Calls fn(cursor) on a storage worker thread and returns its result.
+
+    fn runs outside of an explicit transaction, so each statement commits on
+    its own. Intended for reads and single-statement writes.
+    """
+    return await _Run(fn, False, named_tuple)
+
+
+async def RunInTransaction(fn: typing.Callable[[MySQLCursor], T],
+                           named_tuple: bool = False) -> T:
+    """Calls fn(cursor) inside a transaction on a storage worker thread.
+
+    Commits if fn returns normally, otherwise rolls back and re-raises.
+    """
+    return await _Run(fn, True, named_tuple)
+
+
+async def _ToThreadUninterrupted(fn: typing.Callable[[], T]) -> T:
+    """Like asyncio.to_thread(), but if cancelled, waits for fn to return
+    before raising CancelledError, so that it can't overlap with Shutdown()."""
+    future = asyncio.ensure_future(asyncio.to_thread(fn))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+
+async def Resize(extra_connections: int = 0):
+    """Adds extra_connections to both the configured minimum and maximum
+    number of connections.
+
+    The new minimum is opened before switching over, and calls already running
+    on the old pool are allowed to finish.
+    """
+    global _BACKEND, _EXTRA_CONNECTIONS
+    if _BACKEND is not None and _EXTRA_CONNECTIONS == extra_connections:
+        return
+    backend = _BACKEND_FACTORY(extra_connections)
+    try:
+        await _ToThreadUninterrupted(backend.Open)
+    except asyncio.CancelledError:
+        # Don't leak its connections and workers.
+        await asyncio.to_thread(backend.Shutdown)
+        raise
+    old_backend, _BACKEND = _BACKEND, backend
+    _EXTRA_CONNECTIONS = extra_connections
+    if old_backend is not None:
+        await _ToThreadUninterrupted(old_backend.Shutdown)
+
+
+async def RunMaintenance():
+    """Periodically checks idle connections, and grows or shrinks the pool
+    towards its minimum. Runs forever."""
+    while True:
+        await asyncio.sleep(_MAINTENANCE_INTERVAL_S)
+        backend = _BACKEND
+        if backend is not None:
+            try:
+                await _ToThreadUninterrupted(backend.Maintain)
+            except Exception:
+                logging.exception("Failed to maintain the connection pool.")
+
+
+def Shutdown():
+    """Waits for in-flight database calls to finish and stops the workers."""
+    global _BACKEND, _EXTRA_CONNECTIONS
+    if _BACKEND is not None:
+        _BACKEND.Shutdown()
+        _BACKEND = None
+    _EXTRA_CONNECTIONS = 0
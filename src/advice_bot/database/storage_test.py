@@ -0,0 +1,133 @@
+import asyncio
+import mysql.connector
+import pytest
+import threading
+import time
+
+from advice_bot import params
+from advice_bot.database import statements, storage
+
+
+class FakeBackend(storage._Backend):
+
+    def __init__(self, opening: threading.Event, release: threading.Event):
+        super().__init__(pool_size=1)
+        self._opening = opening
+        self._release = release
+        self.opened = False
+        self.shut_down = False
+
+    def Open(self):
+        self._opening.set()
+        self._release.wait()
+        self.opened = True
+
+    def Shutdown(self):
+        super().Shutdown()
+        self.shut_down = True
+
+
+def test_cancelled_resize_shuts_down_new_backend(monkeypatch):
+    opening = threading.Event()
+    release = threading.Event()
+    backends = []
+
+    def Factory(extra_connections: int) -> FakeBackend:
+        backends.append(FakeBackend(opening, release))
+        return backends[-1]
+
+    monkeypatch.setattr(storage, "_BACKEND_FACTORY", Factory)
+    monkeypatch.setattr(storage, "_BACKEND", None)
+
+    async def Run():
+        resize = asyncio.create_task(storage.Resize(10))
+        await asyncio.to_thread(opening.wait)
+        resize.cancel()
+        await asyncio.sleep(0)
+        # Waits for Open() to return, rather than leaving it running.
+        assert not resize.done()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await resize
+
+    asyncio.run(Run())
+    assert backends[0].opened
+    assert backends[0].shut_down
+    assert storage._BACKEND is None
+
+
+class FakeCursor():
+
+    def close(self):
+        pass
+
+
+class FakeConnection():
+
+    def cursor(self, named_tuple: bool):
+        return FakeCursor()
+
+    def close(self):
+        pass
+
+
+def test_only_prepared_statements_use_the_pure_protocol(monkeypatch):
+    connect_args = []
+
+    def Connect(**kwargs):
+        connect_args.append(kwargs)
+        return FakeConnection()
+
+    monkeypatch.setattr(mysql.connector, "connect", Connect)
+    monkeypatch.setattr(params, "MysqlConnectionArgs", dict)
+
+    cursor_types = []
+    for prepared_statements in [False, True]:
+        backend = storage._Backend(pool_size=1,
+                                   prepared_statements=prepared_statements)
+        cursor_types.append(
+            storage._RunWithCursor(backend,
+                                   type,
+                                   transaction=False,
+                                   named_tuple=False))
+        backend.Shutdown()
+
+    assert [args["use_pure"] for args in connect_args] == [False, True]
+    assert cursor_types == [FakeCursor, statements.StatementCursor]
+
+
+class ConnectingBackend(storage._Backend):
+
+    def Connect(self) -> FakeConnection:
+        return FakeConnection()
+
+    def Open(self):
+        pass
+
+
+def test_resize_while_calls_are_queued(monkeypatch):
+    monkeypatch.setattr(
+        storage, "_BACKEND_FACTORY",
+        lambda extra_connections: ConnectingBackend(1 + extra_connections))
+    monkeypatch.setattr(storage, "_BACKEND", None)
+    monkeypatch.setattr(storage, "_EXTRA_CONNECTIONS", 0)
+
+    def Query(cursor) -> int:
+        time.sleep(0.01)
+        return 1
+
+    async def Run() -> list[int]:
+        queries = [
+            asyncio.create_task(storage.RunQuery(Query)) for _ in range(20)
+        ]
+        # Let them queue behind the single connection.
+        await asyncio.sleep(0)
+        await storage.Resize(3)
+        return await asyncio.gather(*queries)
+
+    try:
+        # The queued calls move to the new backend, rather than failing on
+        # the old one's shut down workers.
+        assert asyncio.run(Run()) == [1] * 20
+    finally:
+        storage.Shutdown()
@@ -0,0 +1,312 @@
+"""Load test for the bot, without Discord or MySQL.
+
+Feeds synthetic messages to AdviceBot.on_message at a fixed rate, from a fake
+gateway whose channels record responses instead of sending them. Storage runs
+against a SQLite stand-in (see database/sqlite_standin.py), with a simulated
+network delay per round trip.
+
+Reports throughput, end-to-end latency, database round trips per command, how
+often a database call found every connection busy and how many messages the
+responses were coalesced into.
+
+Workloads:
+    rollover: a storm of !roll in the giveaway channel, as at the start of a
+        month. Runs in surge mode unless --nosurge.
+    dice: dice roll chatter in the dice channel.
+    spam: commands for other bots, mostly in channels we don't watch.
+    mixed: all of the above.
+
+Usage (from src/): python -m advice_bot.load_tester --workload=rollover
+"""
+
+from absl import app
+from absl import flags
+from absl import logging
+import asyncio
+import discord
+import functools
+from google.protobuf import text_format
+import numpy as np
+import random
+import tempfile
+import time
+
+from advice_bot import params
+from advice_bot.advice_bot import AdviceBot
+from advice_bot.benchmarks import fakes
+from advice_bot.commands import monthly_giveaway
+from advice_bot.database import command_log, sqlite_standin, storage
+from advice_bot.permission_index import PermissionIndex
+from advice_bot.proto import params_pb2
+from advice_bot.util import metrics, response_dispatcher
+from advice_bot.util.admission_queue import AdmissionQueue
+
+FLAGS = flags.FLAGS
+flags.DEFINE_enum("workload", "mixed", ["rollover", "dice", "spam", "mixed"],
+                  "Message mix to send.")
+flags.DEFINE_float("rate", 500, "Messages per second.")
+flags.DEFINE_float("duration_s", 10, "How long to send messages for.")
+flags.DEFINE_integer("users", 5000, "Number of distinct users.")
+flags.DEFINE_float("db_latency_ms", 1.0,
+                   "Simulated network latency per database round trip.")
+flags.DEFINE_bool("surge", True, "Use surge mode for the rollover workload.")
+flags.DEFINE_bool(
+    "known_users", True,
+    "Add every user to discord_users first, as if they had used the bot "
+    "before. Otherwise each user's first command takes extra round trips.")
+flags.DEFINE_integer(
+    "channel_sends_per_s", 50,
+    "Per-channel rate limit of the fake gateway. Discord's is 5 per 5 "
+    "seconds (see util/response_dispatcher.py), which would make draining "
+    "the responses take a long time.")
+
+_BOT_USER_ID = 1
+_GUILD_ID = 1000
+_OTHER_GUILD_ID = 2000
+_GIVEAWAY_CHANNEL_ID = 1001
+_DICE_CHANNEL_ID = 1002
+_HELP_CHANNEL_ID = 1003
+_UNWATCHED_CHANNEL_IDS = range(1100, 1120)
+
+_CONFIG = f"""
+servers {{
+  guild_id: {_GUILD_ID}
+  commands {{
+    command: MONTHLY_GIVEAWAY_COMMAND
+    channels {{ specific_channels: {_GIVEAWAY_CHANNEL_ID} }}
+  }}
+  commands {{
+    command: DICEROLL_COMMAND
+    channels {{ specific_channels: {_DICE_CHANNEL_ID} }}
+  }}
+  commands {{
+    command: HELP_COMMAND
+    channels {{ specific_channels: {_HELP_CHANNEL_ID} }}
+  }}
+}}
+"""
+
+_OTHER_BOT_COMMANDS = [
+    "!play never gonna give you up",
+    "!skip",
+    "!rank",
+    "!price \"twisted bow\"",
+    "!kc zulrah",
+]
+
+
+class _FakeChannel():
+    """A text channel that records responses instead of sending them."""
+
+    def __init__(self, guild, channel_id: int):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, content: str, **kwargs):
+        self.sent += 1
+
+
+class _FakeGateway():
+    """Builds messages as the Discord gateway would deliver them."""
+
+    def __init__(self, num_users: int):
+        self._guilds = {
+            guild_id: fakes.Obj(id=guild_id, name=f"guild-{guild_id}")
+            for guild_id in [_GUILD_ID, _OTHER_GUILD_ID]
+        }
+        self._channels = {}
+        self._users = [
+            fakes.User(10000 + i,
+                       roles=["Mod Team"] if i % 100 == 0 else ["Member"])
+            for i in range(num_users)
+        ]
+        self._next_message_id = 1
+
+    def Channel(self, guild_id: int, channel_id: int) -> _FakeChannel:
+        key = (guild_id, channel_id)
+        if key not in self._channels:
+            self._channels[key] = _FakeChannel(self._guilds[guild_id],
+                                               channel_id)
+        return self._channels[key]
+
+    def Responses(self) -> int:
+        return sum(channel.sent for channel in self._channels.values())
+
+    def Message(self, content: str, guild_id: int, channel_id: int, author):
+        channel = self.Channel(guild_id, channel_id)
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return fakes.Obj(id=message_id,
+                         content=content,
+                         author=author,
+                         guild=channel.guild,
+                         channel=channel)
+
+    def Users(self) -> list:
+        return self._users
+
+    def RandomUser(self):
+        return random.choice(self._users)
+
+    def RolloverMessage(self):
+        content = random.choice(["!roll", "!roll", "!roll good luck", "!gimme"])
+        return self.Message(content, _GUILD_ID, _GIVEAWAY_CHANNEL_ID,
+                            self.RandomUser())
+
+    def DiceMessage(self):
+        content = random.choice(["!roll 1-100", "!roll 1-6", "!roll"])
+        return self.Message(content, _GUILD_ID, _DICE_CHANNEL_ID,
+                            self.RandomUser())
+
+    def SpamMessage(self):
+        if random.random() < 0.05:
+            return self.Message("!help", _GUILD_ID, _HELP_CHANNEL_ID,
+                                self.RandomUser())
+        guild_id = random.choice([_GUILD_ID, _OTHER_GUILD_ID])
+        return self.Message(random.choice(_OTHER_BOT_COMMANDS), guild_id,
+                            random.choice(_UNWATCHED_CHANNEL_IDS),
+                            self.RandomUser())
+
+    def Messages(self, workload: str, n: int) -> list:
+        if workload == "rollover":
+            factories = [self.RolloverMessage]
+        elif workload == "dice":
+            factories = [self.DiceMessage]
+        elif workload == "spam":
+            factories = [self.SpamMessage]
+        else:
+            factories = random.choices(
+                [self.RolloverMessage, self.DiceMessage, self.SpamMessage],
+                weights=[20, 20, 60],
+                k=n)
+            return [factory() for factory in factories]
+        return [factories[0]() for _ in range(n)]
+
+
+async def _Deliver(bot: AdviceBot, message, latencies: list[float],
+                   errors: list[Exception]):
+    start = time.perf_counter()
+    try:
+        await bot.on_message(message)
+    except Exception as e:
+        errors.append(e)
+    latencies.append(time.perf_counter() - start)
+
+
+async def _Run(gateway: _FakeGateway, messages: list):
+    bot = AdviceBot(intents=discord.Intents.default())
+    bot._connection.user = fakes.Obj(id=_BOT_USER_ID)
+
+    if FLAGS.known_users:
+        await storage.RunInTransaction(
+            functools.partial(_InsertUsers, gateway.Users()))
+    command_log.Start()
+    response_dispatcher.Start(max_sends_per_period=FLAGS.channel_sends_per_s,
+                              period_s=1.0)
+    surge = FLAGS.workload == "rollover" and FLAGS.surge
+    if surge:
+        await storage.Resize(monthly_giveaway._SURGE_EXTRA_CONNECTIONS)
+        monthly_giveaway._SURGE_ADMISSION = AdmissionQueue(
+            max_running=storage.PoolSize(),
+            max_waiting=monthly_giveaway._SURGE_MAX_WAITING)
+    await monthly_giveaway.PrewarmCache(time.time_ns() // 1000)
+    backend = storage._GetBackend()
+    round_trips_before = backend.round_trips
+    calls_before = backend.calls
+
+    latencies = []
+    errors = []
+    tasks = []
+    interval_s = 1 / FLAGS.rate
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i, message in enumerate(messages):
+        delay = start + i * interval_s - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(
+            asyncio.create_task(_Deliver(bot, message, latencies, errors)))
+    await asyncio.gather(*tasks)
+    elapsed_s = loop.time() - start
+    # Include the command log writes.
+    await command_log.Stop()
+    drain_start = loop.time()
+    await response_dispatcher.Stop()
+    drain_s = loop.time() - drain_start
+
+    commands = await storage.RunQuery(_CountCommands)
+    round_trips = backend.round_trips - round_trips_before
+    calls = backend.calls - calls_before
+    latencies_ms = np.array(latencies) * 1000
+
+    print(f"Workload: {FLAGS.workload}" + (" (surge mode)" if surge else ""))
+    print(f"Messages: {len(messages):,} in {elapsed_s:.2f}s "
+          f"({len(messages) / elapsed_s:,.0f} messages/sec, "
+          f"target {FLAGS.rate:,.0f})")
+    print(f"Commands executed: {commands:,}, "
+          f"errors: {len(errors):,}")
+    print(f"Responses sent as {gateway.Responses():,} messages, "
+          f"{drain_s:.2f}s to send the remainder after the last command")
+    print(f"Latency: p50 {np.percentile(latencies_ms, 50):.2f}ms, "
+          f"p95 {np.percentile(latencies_ms, 95):.2f}ms, "
+          f"p99 {np.percentile(latencies_ms, 99):.2f}ms, "
+          f"max {latencies_ms.max():.2f}ms")
+    if commands:
+        print(f"Database round trips per command: {round_trips / commands:.2f} "
+              f"({calls / commands:.2f} storage calls)")
+    print(f"Storage calls that found every connection busy: "
+          f"{backend.queued_calls:,} of {calls:,} "
+          f"(pool size {backend.pool_size})")
+    admission = monthly_giveaway._SURGE_ADMISSION
+    if admission is not None:
+        print(f"Surge admission: admitted {admission.admitted:,}, "
+              f"rejected {admission.rejected:,}")
+    for e in errors[:5]:
+        print(f"Error: {e!r}")
+    print(metrics.Summary())
+
+    await asyncio.to_thread(storage.Shutdown)
+
+
+def _InsertUsers(users: list, cursor):
+    for i in range(0, len(users), 1000):
+        chunk = users[i:i + 1000]
+        query = f"""
+            INSERT INTO discord_users
+                (discord_user_id, discord_username)
+            VALUES
+                {", ".join(["(%s, %s)"] * len(chunk))}
+        """
+        values = []
+        for user in chunk:
+            values += [user.id, user.name]
+        cursor.execute(query, values)
+
+
+def _CountCommands(cursor) -> int:
+    cursor.execute("SELECT COUNT(*) FROM command_log")
+    return cursor.fetchall()[0][0]
+
+
+def main(argv):
+    # Per-message INFO logs would dominate the measurements.
+    if not FLAGS["verbosity"].present:
+        logging.set_verbosity(logging.WARNING)
+
+    params._PERMISSIONS = PermissionIndex(
+        text_format.Parse(_CONFIG, params_pb2.Config()))
+    with tempfile.TemporaryDirectory() as directory:
+        path = sqlite_standin.CreateDatabase(directory)
+        storage._BACKEND_FACTORY = sqlite_standin.BackendFactory(
+            path, FLAGS.db_latency_ms / 1000)
+
+        gateway = _FakeGateway(FLAGS.users)
+        messages = gateway.Messages(FLAGS.workload,
+                                    int(FLAGS.rate * FLAGS.duration_s))
+        asyncio.run(_Run(gateway, messages))
+
+
+if __name__ == "__main__":
+    app.run(main)
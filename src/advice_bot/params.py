@@ -1,20 +1,54 @@
 from absl import logging
 from absl import flags
+import asyncio
+import contextlib
 from google.protobuf import text_format
 import json
 import os.path
+import time
 
+from advice_bot import sharding
+from advice_bot.permission_index import PermissionIndex
 from advice_bot.proto import params_pb2
-from advice_bot.util import encryption
+from advice_bot.util import sealed_cache
 
 FLAGS = flags.FLAGS
 flags.DEFINE_enum("env", "dev", ["prod", "dev"], "Environment to connect to.")
+flags.DEFINE_string(
+    "params_cache_dir", "~/.cache/advice_bot",
+    "Where to cache the decrypted params between restarts, sealed with a "
+    "local key, so that KMS is only needed when the encrypted params change. "
+    "Empty to disable.")
+flags.DEFINE_string(
+    "params_cache_key_file", "~/.config/advice_bot/params_cache.key",
+    "The local key the cached params are sealed with. Kept apart from "
+    "--params_cache_dir, and only used if no other user can access it.")
+flags.DEFINE_float(
+    "params_reload_interval_s", 5.0,
+    "How often to check the params file for changes, reloading the server "
+    "config when it changes. 0 to disable.")
 
 _PARAMS_CIPHERTEXT = "./production/params.textproto.encrypted"
 _PARAMS_PLAINTEXT = "./production/params.textproto"
 _GCP_PROJECT_ID = "genuine-axle-438304-u4"
 
 _PARAMS = None
+# Seconds spent in each step of loading the params, for the startup logs.
+_LOAD_TIMINGS: dict[str, float] = {}
+
+
+@contextlib.contextmanager
+def _Timed(step: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _LOAD_TIMINGS[step] = time.perf_counter() - start
+
+
+def LoadTimings() -> dict[str, float]:
+    """Returns how long each step of loading the params took, in seconds."""
+    return dict(_LOAD_TIMINGS)
 
 
 def Params() -> params_pb2.Params:
@@ -23,30 +57,78 @@ def Params() -> params_pb2.Params:
     if _PARAMS is not None:
         return _PARAMS
 
-    plaintext = ""
+    params_map = _LoadParamsMap(_ParamsCache())
+    if FLAGS.env not in params_map.environments:
+        logging.fatal(f"Failed to load params for environment: {FLAGS.env}")
+    logging.info(f"Successfully loaded params for environment: {FLAGS.env}")
+    _PARAMS = _ForThisShard(params_map.environments[FLAGS.env])
+    return _PARAMS
+
+
+def _ForThisShard(env_params: params_pb2.Params) -> params_pb2.Params:
+    """Drops the server configs for guilds on other shards, if sharded."""
+    if FLAGS.shard_count is None:
+        return env_params
+    result = params_pb2.Params()
+    result.CopyFrom(env_params)
+    result.config.CopyFrom(
+        sharding.FilterConfig(env_params.config, FLAGS.shard_id,
+                              FLAGS.shard_count))
+    return result
+
+
+def _ParamsCache() -> sealed_cache.SealedCache | None:
+    """Returns the cache for the decrypted params, or None if disabled."""
+    if not FLAGS.params_cache_dir:
+        return None
+    return sealed_cache.SealedCache(
+        os.path.expanduser(FLAGS.params_cache_dir), "params",
+        os.path.expanduser(FLAGS.params_cache_key_file))
+
+
+def _LoadParamsMap(
+        cache: sealed_cache.SealedCache | None) -> params_pb2.ParamsMap:
     # For ease of development.
     if os.path.exists(_PARAMS_PLAINTEXT):
         logging.info(f"Loading decrypted params from {_PARAMS_PLAINTEXT}")
-        with open(_PARAMS_PLAINTEXT, "r") as f:
+        with _Timed("read"), open(_PARAMS_PLAINTEXT, "r") as f:
             plaintext = f.read()
-    else:
-        logging.info(f"Loading encrypted params from {_PARAMS_CIPHERTEXT}")
-        with open(_PARAMS_CIPHERTEXT, "rb") as f:
-            ciphertext = f.read()
+        with _Timed("parse"):
+            return text_format.Parse(plaintext, params_pb2.ParamsMap())
+
+    with _Timed("read"), open(_PARAMS_CIPHERTEXT, "rb") as f:
+        ciphertext = f.read()
+
+    if cache is not None:
+        with _Timed("unseal"):
+            serialized = cache.Get(ciphertext)
+        if serialized is not None:
+            logging.info(f"Loading cached params from {cache.directory}")
+            with _Timed("parse"):
+                return params_pb2.ParamsMap.FromString(serialized)
+
+    logging.info(f"Loading encrypted params from {_PARAMS_CIPHERTEXT}")
+    with _Timed("decrypt"):
+        # Slow to import, and only needed on a cache miss.
+        from advice_bot.util import encryption
 
         location_id = "global"
         key_ring_id = "secrets"
         key_id = "prod_secrets_encryption_key"
         response = encryption.decrypt_symmetric(_GCP_PROJECT_ID, location_id,
                                                 key_ring_id, key_id, ciphertext)
-        plaintext = response.plaintext
+    with _Timed("parse"):
+        params_map = text_format.Parse(response.plaintext,
+                                       params_pb2.ParamsMap())
 
-    params_map = text_format.Parse(plaintext, params_pb2.ParamsMap())
-    if FLAGS.env not in params_map.environments:
-        logging.fatal(f"Failed to load params for environment: {FLAGS.env}")
-    logging.info(f"Successfully loaded params for environment: {FLAGS.env}")
-    _PARAMS = params_map.environments[FLAGS.env]
-    return _PARAMS
+    if cache is not None:
+        with _Timed("seal"):
+            try:
+                cache.Put(ciphertext, params_map.SerializeToString())
+            except OSError:
+                logging.exception(
+                    f"Failed to cache params in {cache.directory}")
+    return params_map
 
 
 def MysqlConnectionArgs() -> dict:
@@ -63,6 +145,27 @@ def MysqlConnectionArgs() -> dict:
     return args
 
 
+_POOL_ARGS = {
+    "min_connections": "min_size",
+    "max_connections": "max_size",
+    "connection_wait_timeout_s": "wait_timeout_s",
+    "connection_max_lifetime_s": "max_lifetime_s",
+    "connection_idle_timeout_s": "idle_timeout_s",
+    "connection_validation_interval_s": "validation_interval_s",
+}
+
+
+def MysqlPoolArgs() -> dict:
+    """Returns the connection pool settings that are set, as ConnectionPool
+    arguments."""
+    mysql_params = Params().mysql_params
+    return {
+        arg: getattr(mysql_params, field)
+        for field, arg in _POOL_ARGS.items()
+        if mysql_params.HasField(field)
+    }
+
+
 _SERVER_CONFIG_MAP = None
 
 
@@ -71,8 +174,135 @@ def ServerConfigMap() -> dict[int, params_pb2.ServerConfig]:
     if _SERVER_CONFIG_MAP is not None:
         return _SERVER_CONFIG_MAP
 
-    _SERVER_CONFIG_MAP = {}
-    for server_config in Params().config.servers:
-        _SERVER_CONFIG_MAP[server_config.guild_id] = server_config
-
+    _SERVER_CONFIG_MAP = _BuildServerConfigMap(Params().config)
     return _SERVER_CONFIG_MAP
+
+
+def _BuildServerConfigMap(
+        config: params_pb2.Config) -> dict[int, params_pb2.ServerConfig]:
+    server_config_map = {}
+    for server_config in config.servers:
+        server_config_map[server_config.guild_id] = server_config
+    return server_config_map
+
+
+_PERMISSIONS = None
+
+
+def Permissions() -> PermissionIndex:
+    """Returns the global index of which commands are enabled where."""
+    global _PERMISSIONS
+    if _PERMISSIONS is not None:
+        return _PERMISSIONS
+
+    _PERMISSIONS = PermissionIndex(Params().config)
+    return _PERMISSIONS
+
+
+# Serializes reloads, so that an older config never replaces a newer one.
+_RELOAD_LOCK = asyncio.Lock()
+
+
+def ValidateConfig(config: params_pb2.Config):
+    """Raises ValueError if config has mistakes."""
+    guild_ids = set()
+    for server_config in config.servers:
+        guild_id = server_config.guild_id
+        if not server_config.HasField("guild_id"):
+            raise ValueError("Server config without guild_id.")
+        if guild_id in guild_ids:
+            raise ValueError(f"Duplicate server config for guild {guild_id}.")
+        guild_ids.add(guild_id)
+
+        for command_config in server_config.commands:
+            command = command_config.command
+            # Also the default if unset.
+            if command == params_pb2.Command.UNKNOWN_COMMAND:
+                raise ValueError(f"Guild {guild_id}: missing command.")
+            channels = command_config.channels
+            if channels.all_channels and channels.specific_channels:
+                raise ValueError(
+                    f"Guild {guild_id}: {params_pb2.Command.Name(command)} "
+                    "sets both all_channels and specific_channels.")
+
+
+def _LoadForReload(
+    current: params_pb2.Params
+) -> tuple[params_pb2.Params, dict[int, params_pb2.ServerConfig],
+           PermissionIndex]:
+    """Loads and validates the new config, and builds what derives from it.
+
+    Blocking, so run off the event loop.
+    """
+    params_map = _LoadParamsMap(_ParamsCache())
+    if FLAGS.env not in params_map.environments:
+        raise ValueError(f"No params for environment: {FLAGS.env}")
+    # Validate everything, so that all shards agree on whether it's valid.
+    ValidateConfig(params_map.environments[FLAGS.env].config)
+    new_params = _ForThisShard(params_map.environments[FLAGS.env])
+
+    # Only the server config is reloaded. The rest is only read at startup.
+    if (new_params.discord_params != current.discord_params or
+            new_params.mysql_params != current.mysql_params):
+        logging.warning("Discord or MySQL params changed, restart to apply.")
+    updated = params_pb2.Params()
+    updated.CopyFrom(current)
+    updated.config.CopyFrom(new_params.config)
+    return (updated, _BuildServerConfigMap(updated.config),
+            PermissionIndex(updated.config))
+
+
+async def Reload() -> params_pb2.Config:
+    """Reloads the server config from the params file.
+
+    The file is read, parsed and validated off the event loop. The config and
+    everything derived from it are then swapped together, without awaiting in
+    between, so no command sees a mix of old and new. Raises (and keeps the
+    current config) if the new one can't be loaded or is invalid.
+    """
+    global _PARAMS
+    global _SERVER_CONFIG_MAP
+    global _PERMISSIONS
+
+    async with _RELOAD_LOCK:
+        new_params, server_config_map, permissions = await asyncio.to_thread(
+            _LoadForReload, Params())
+        _PARAMS = new_params
+        _SERVER_CONFIG_MAP = server_config_map
+        _PERMISSIONS = permissions
+    logging.info(f"Reloaded config for {len(new_params.config.servers)} "
+                 "server(s).")
+    return new_params.config
+
+
+def _ParamsPath() -> str:
+    """Returns the file the params are loaded from."""
+    if os.path.exists(_PARAMS_PLAINTEXT):
+        return _PARAMS_PLAINTEXT
+    return _PARAMS_CIPHERTEXT
+
+
+def _ModifiedTime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+async def WatchForChanges(interval_s: float):
+    """Reloads the server config whenever the params file changes."""
+    path = _ParamsPath()
+    last_modified = _ModifiedTime(path)
+    while True:
+        await asyncio.sleep(interval_s)
+        path = _ParamsPath()
+        modified = _ModifiedTime(path)
+        if modified == last_modified:
+            continue
+        last_modified = modified
+        logging.info(f"{path} changed, reloading.")
+        try:
+            await Reload()
+        except Exception:
+            logging.exception("Failed to reload params, keeping the current "
+                              "config.")
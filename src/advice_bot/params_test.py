@@ -0,0 +1,144 @@
+import asyncio
+from google.protobuf import text_format
+import pytest
+import sys
+import types
+
+from advice_bot import params
+from advice_bot.proto import params_pb2
+from advice_bot.util import sealed_cache
+
+_PARAMS_MAP = """
+environments {
+  key: "dev"
+  value { discord_params { discord_application_id: "1234" } }
+}
+"""
+
+
+def _FakeEncryption(calls: list) -> types.ModuleType:
+
+    def decrypt_symmetric(project_id, location_id, key_ring_id, key_id,
+                          ciphertext):
+        calls.append(ciphertext)
+        return types.SimpleNamespace(plaintext=_PARAMS_MAP)
+
+    module = types.ModuleType("advice_bot.util.encryption")
+    module.decrypt_symmetric = decrypt_symmetric
+    return module
+
+
+def test_load_params_map_uses_sealed_cache(tmp_path, monkeypatch):
+    ciphertext_path = tmp_path / "params.textproto.encrypted"
+    ciphertext_path.write_bytes(b"ciphertext")
+    monkeypatch.setattr(params, "_PARAMS_CIPHERTEXT", str(ciphertext_path))
+    monkeypatch.setattr(params, "_PARAMS_PLAINTEXT",
+                        str(tmp_path / "params.textproto"))
+    calls = []
+    monkeypatch.setitem(sys.modules, "advice_bot.util.encryption",
+                        _FakeEncryption(calls))
+    cache = sealed_cache.SealedCache(str(tmp_path / "cache"), "params",
+                                     str(tmp_path / "key" / "params.key"))
+
+    # Miss: decrypts with KMS and fills the cache.
+    params_map = params._LoadParamsMap(cache)
+    assert params_map.environments[
+        "dev"].discord_params.discord_application_id == "1234"
+    assert calls == [b"ciphertext"]
+
+    # Hit: no KMS.
+    assert params._LoadParamsMap(cache) == params_map
+    assert len(calls) == 1
+    assert "unseal" in params.LoadTimings()
+
+    # The ciphertext changed, so the cache is stale.
+    ciphertext_path.write_bytes(b"new ciphertext")
+    assert params._LoadParamsMap(cache) == params_map
+    assert calls == [b"ciphertext", b"new ciphertext"]
+
+
+def _SetUpReload(tmp_path, monkeypatch, config: str):
+    path = tmp_path / "params.textproto"
+    monkeypatch.setattr(params, "_PARAMS_PLAINTEXT", str(path))
+    monkeypatch.setattr(
+        params, "FLAGS",
+        types.SimpleNamespace(env="dev", params_cache_dir="", shard_count=None))
+    monkeypatch.setattr(params, "_PARAMS", None)
+    monkeypatch.setattr(params, "_SERVER_CONFIG_MAP", None)
+    monkeypatch.setattr(params, "_PERMISSIONS", None)
+    _WriteConfig(path, config)
+    return path
+
+
+def _WriteConfig(path, config: str):
+    path.write_text(f"""
+        environments {{
+          key: "dev"
+          value {{
+            discord_params {{ discord_secret_token: "token" }}
+            config {{ {config} }}
+          }}
+        }}
+    """)
+
+
+def test_reload_swaps_config_and_derived_state(tmp_path, monkeypatch):
+    path = _SetUpReload(
+        tmp_path, monkeypatch, """
+        servers {
+          guild_id: 1
+          commands { command: DICEROLL_COMMAND channels { specific_channels: 10 } }
+        }
+    """)
+    assert params.Permissions().IsCommandEnabled(
+        params_pb2.Command.DICEROLL_COMMAND, 1, 10)
+    assert not params.Permissions().IsChannelWatched(1, 11)
+
+    _WriteConfig(
+        path, """
+        servers {
+          guild_id: 1
+          commands {
+            command: DICEROLL_COMMAND
+            channels { specific_channels: 10 specific_channels: 11 }
+          }
+        }
+        servers { guild_id: 2 }
+    """)
+    config = asyncio.run(params.Reload())
+
+    assert len(config.servers) == 2
+    assert params.Permissions().IsChannelWatched(1, 11)
+    assert sorted(params.ServerConfigMap()) == [1, 2]
+    assert params.Params().discord_params.discord_secret_token == "token"
+
+
+def test_reload_keeps_current_config_if_invalid(tmp_path, monkeypatch):
+    path = _SetUpReload(tmp_path, monkeypatch, "servers { guild_id: 1 }")
+    permissions = params.Permissions()
+
+    _WriteConfig(path, "servers { guild_id: 1 } servers { guild_id: 1 }")
+    with pytest.raises(ValueError, match="Duplicate"):
+        asyncio.run(params.Reload())
+
+    assert params.Permissions() is permissions
+    assert len(params.Params().config.servers) == 1
+
+
+def test_validate_config():
+    config = text_format.Parse(
+        """
+        servers {
+          guild_id: 1
+          commands { channels { all_channels: true } }
+        }
+    """, params_pb2.Config())
+    with pytest.raises(ValueError, match="missing command"):
+        params.ValidateConfig(config)
+
+    config.servers[0].commands[0].command = params_pb2.Command.HELP_COMMAND
+    params.ValidateConfig(config)
+
+    config.servers[0].commands[0].channels.specific_channels.append(10)
+    with pytest.raises(ValueError, match="both"):
+        params.ValidateConfig(config)
@@ -0,0 +1,64 @@
+from advice_bot.proto import params_pb2
+
+
+def _Bit(command: params_pb2.Command) -> int:
+    return 1 << command
+
+
+class PermissionIndex():
+    """Immutable index of the commands enabled in each channel.
+
+    Compiled once from a params_pb2.Config. Maps (guild_id, channel_id) to a
+    bitset of enabled Command enums, so that every check is a single dict
+    lookup regardless of how many channels a server lists. Commands enabled for
+    all channels of a guild are folded into every entry for that guild, and
+    also kept per guild for channels that aren't listed anywhere.
+
+    !help is special: it is enabled wherever any other command is.
+    """
+
+    def __init__(self, config: params_pb2.Config):
+        guild_bits: dict[int, int] = {}
+        channel_bits: dict[tuple[int, int], int] = {}
+        for server_config in config.servers:
+            guild_id = server_config.guild_id
+            guild_bits.setdefault(guild_id, 0)
+            for command_config in server_config.commands:
+                bit = _Bit(command_config.command)
+                if command_config.channels.all_channels:
+                    guild_bits[guild_id] |= bit
+                for channel_id in command_config.channels.specific_channels:
+                    key = (guild_id, channel_id)
+                    channel_bits[key] = channel_bits.get(key, 0) | bit
+
+        for (guild_id, channel_id), bits in channel_bits.items():
+            channel_bits[(guild_id, channel_id)] = bits | guild_bits[guild_id]
+
+        help_bit = _Bit(params_pb2.Command.HELP_COMMAND)
+        self._guild_bits = {
+            guild_id: bits | help_bit if bits else 0
+            for guild_id, bits in guild_bits.items()
+        }
+        self._channel_bits = {
+            key: bits | help_bit for key, bits in channel_bits.items()
+        }
+
+    def EnabledCommands(self, guild_id: int, channel_id: int) -> int:
+        """Returns the bitset of commands enabled in the channel."""
+        bits = self._channel_bits.get((guild_id, channel_id))
+        if bits is not None:
+            return bits
+        return self._guild_bits.get(guild_id, 0)
+
+    def IsCommandEnabled(self, command: params_pb2.Command, guild_id: int,
+                         channel_id: int) -> bool:
+        return bool(self.EnabledCommands(guild_id, channel_id) & _Bit(command))
+
+    def IsChannelWatched(self, guild_id: int, channel_id: int) -> bool:
+        """Returns True if any command is enabled in the channel."""
+        return self.EnabledCommands(guild_id, channel_id) != 0
+
+
+def IsEnabled(enabled_commands: int, command: params_pb2.Command) -> bool:
+    """Checks a bitset returned by PermissionIndex.EnabledCommands()."""
+    return bool(enabled_commands & _Bit(command))
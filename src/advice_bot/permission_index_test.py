@@ -0,0 +1,51 @@
+from google.protobuf import text_format
+
+from advice_bot.permission_index import PermissionIndex
+from advice_bot.proto import params_pb2
+
+_CONFIG = """
+servers {
+  guild_id: 1
+  commands {
+    command: ADMIN_COMMAND
+    channels { all_channels: true }
+  }
+  commands {
+    command: MONTHLY_GIVEAWAY_COMMAND
+    channels { specific_channels: 10 specific_channels: 11 }
+  }
+}
+servers {
+  guild_id: 2
+  commands {
+    command: DICEROLL_COMMAND
+    channels { specific_channels: 20 }
+  }
+}
+"""
+
+
+def test_permission_index():
+    index = PermissionIndex(text_format.Parse(_CONFIG, params_pb2.Config()))
+    Command = params_pb2.Command
+
+    # All channels, plus specific channels.
+    assert index.IsCommandEnabled(Command.ADMIN_COMMAND, 1, 10)
+    assert index.IsCommandEnabled(Command.ADMIN_COMMAND, 1, 99)
+    assert index.IsCommandEnabled(Command.MONTHLY_GIVEAWAY_COMMAND, 1, 11)
+    assert not index.IsCommandEnabled(Command.MONTHLY_GIVEAWAY_COMMAND, 1, 99)
+
+    # Only specific channels.
+    assert index.IsCommandEnabled(Command.DICEROLL_COMMAND, 2, 20)
+    assert not index.IsCommandEnabled(Command.DICEROLL_COMMAND, 2, 10)
+    assert not index.IsCommandEnabled(Command.DICEROLL_COMMAND, 1, 20)
+
+    # !help follows whether the channel is watched.
+    assert index.IsCommandEnabled(Command.HELP_COMMAND, 1, 99)
+    assert index.IsCommandEnabled(Command.HELP_COMMAND, 2, 20)
+    assert not index.IsCommandEnabled(Command.HELP_COMMAND, 2, 21)
+
+    assert index.IsChannelWatched(1, 99)
+    assert index.IsChannelWatched(2, 20)
+    assert not index.IsChannelWatched(2, 21)
+    assert not index.IsChannelWatched(3, 20)
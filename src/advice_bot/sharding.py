@@ -0,0 +1,156 @@
+"""Running the bot as several gateway shards, one per worker process.
+
+Discord assigns each guild to shard (guild_id >> 22) % shard_count. Each
+worker connects as one shard and only loads the server configs for its own
+guilds. Workers are started and restarted by src/supervisor.py.
+
+Workers write their health to a status file every _HEARTBEAT_INTERVAL_S, so
+that any of them can report on all shards in !admin status.
+"""
+
+from absl import flags
+import asyncio
+import discord
+import json
+import math
+import os
+import time
+
+from advice_bot.proto import params_pb2
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer(
+    "shard_id", None,
+    "Gateway shard to run as. Set by the supervisor, along with "
+    "--shard_count.")
+flags.DEFINE_integer("shard_count", None, "Total number of gateway shards.")
+flags.DEFINE_string("shard_status_dir", "~/.cache/advice_bot/shards",
+                    "Where shards and the supervisor write their status.")
+
+_HEARTBEAT_INTERVAL_S = 10.0
+# A shard that hasn't written its status for this long is reported as stale.
+_STALE_AFTER_S = 3 * _HEARTBEAT_INTERVAL_S
+SUPERVISOR_STATUS_FILE = "supervisor.json"
+
+
+def Enabled() -> bool:
+    return FLAGS.shard_count is not None
+
+
+def ShardForGuild(guild_id: int, shard_count: int) -> int:
+    """Returns the shard that Discord delivers the guild's events to."""
+    return (guild_id >> 22) % shard_count
+
+
+def FilterConfig(config: params_pb2.Config, shard_id: int,
+                 shard_count: int) -> params_pb2.Config:
+    """Returns the part of config for the guilds of the given shard."""
+    filtered = params_pb2.Config()
+    filtered.servers.extend(
+        server_config for server_config in config.servers
+        if ShardForGuild(server_config.guild_id, shard_count) == shard_id)
+    return filtered
+
+
+def StatusDir() -> str:
+    return os.path.expanduser(FLAGS.shard_status_dir)
+
+
+def WriteStatus(directory: str, filename: str, status: dict):
+    """Atomically replaces a status file."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    path = os.path.join(directory, filename)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(status, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _ReadStatuses(directory: str) -> tuple[dict | None, list[dict]]:
+    """Returns the supervisor's status and those of the shards."""
+    supervisor = None
+    shards = []
+    try:
+        filenames = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return None, []
+    for filename in filenames:
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if filename == SUPERVISOR_STATUS_FILE:
+            supervisor = status
+        else:
+            shards.append(status)
+    return supervisor, shards
+
+
+def _ShardStatus(client: discord.Client, instance_id: str,
+                 start_time: float) -> dict:
+    latency = client.latency
+    return {
+        "shard_id":
+            FLAGS.shard_id,
+        "shard_count":
+            FLAGS.shard_count,
+        "pid":
+            os.getpid(),
+        "instance_id":
+            instance_id,
+        "start_time":
+            start_time,
+        "heartbeat_time":
+            time.time(),
+        "ready":
+            client.is_ready(),
+        # NaN or inf until connected.
+        "latency_ms":
+            round(latency * 1000, 1) if math.isfinite(latency) else None,
+        "guilds":
+            len(client.guilds),
+    }
+
+
+async def RunHeartbeat(client: discord.Client, instance_id: str):
+    """Writes this shard's status periodically. Runs forever."""
+    start_time = time.time()
+    filename = f"shard_{FLAGS.shard_id}.json"
+    while True:
+        await asyncio.to_thread(WriteStatus, StatusDir(), filename,
+                                _ShardStatus(client, instance_id, start_time))
+        await asyncio.sleep(_HEARTBEAT_INTERVAL_S)
+
+
+def StatusReport(directory: str,
+                 shard_count: int,
+                 now: float | None = None) -> str:
+    """Returns a summary of the health of every shard."""
+    now = time.time() if now is None else now
+    supervisor, shards = _ReadStatuses(directory)
+    processes = supervisor["shards"] if supervisor is not None else {}
+    by_id = {status["shard_id"]: status for status in shards}
+
+    lines = []
+    for shard_id in range(shard_count):
+        status = by_id.get(shard_id)
+        process = processes.get(str(shard_id), {})
+        restarts = f", {process.get('restarts', 0)} restart(s)"
+        if status is None:
+            lines.append(f"Shard {shard_id}: NO STATUS{restarts}")
+            continue
+        age_s = now - status["heartbeat_time"]
+        if age_s > _STALE_AFTER_S:
+            health = f"STALE ({age_s:.0f}s)"
+        elif status["ready"]:
+            health = "READY"
+        else:
+            health = "CONNECTING"
+        latency = (f"{status['latency_ms']}ms"
+                   if status["latency_ms"] is not None else "n/a")
+        lines.append(f"Shard {shard_id}: {health}, pid {status['pid']}, "
+                     f"{status['guilds']} guild(s), latency {latency}"
+                     f"{restarts}")
+    return "\n".join(lines)
@@ -0,0 +1,57 @@
+from advice_bot import sharding
+from advice_bot.proto import params_pb2
+
+
+def _GuildId(shard_id: int, shard_count: int, n: int = 0) -> int:
+    """Returns a guild ID on the given shard."""
+    return (((n * shard_count) + shard_id) << 22) | 12345
+
+
+def test_shard_for_guild():
+    assert sharding.ShardForGuild(197038439483310086, 1) == 0
+    for shard_id in range(4):
+        assert sharding.ShardForGuild(_GuildId(shard_id, 4, n=7), 4) == shard_id
+
+
+def test_filter_config():
+    config = params_pb2.Config()
+    for shard_id in [0, 1, 2, 1]:
+        config.servers.add(guild_id=_GuildId(shard_id, 3))
+
+    filtered = sharding.FilterConfig(config, 1, 3)
+
+    assert [server.guild_id for server in filtered.servers
+           ] == [_GuildId(1, 3), _GuildId(1, 3)]
+
+
+def test_status_report(tmp_path):
+    now = 1000.0
+    sharding.WriteStatus(
+        str(tmp_path), sharding.SUPERVISOR_STATUS_FILE,
+        {"shards": {
+            "0": {
+                "restarts": 0
+            },
+            "1": {
+                "restarts": 2
+            }
+        }})
+    shard = {
+        "pid": 10,
+        "ready": True,
+        "latency_ms": 41.5,
+        "guilds": 3,
+        "heartbeat_time": now - 1,
+    }
+    sharding.WriteStatus(str(tmp_path), "shard_0.json", dict(shard, shard_id=0))
+    sharding.WriteStatus(str(tmp_path), "shard_1.json",
+                         dict(shard, shard_id=1, heartbeat_time=now - 100))
+
+    report = sharding.StatusReport(str(tmp_path), 3, now)
+
+    assert report.splitlines() == [
+        "Shard 0: READY, pid 10, 3 guild(s), latency 41.5ms, 0 restart(s)",
+        "Shard 1: STALE (100s), pid 10, 3 guild(s), latency 41.5ms, "
+        "2 restart(s)",
+        "Shard 2: NO STATUS, 0 restart(s)",
+    ]
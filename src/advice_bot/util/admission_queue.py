@@ -0,0 +1,44 @@
+import asyncio
+import contextlib
+
+
+class AdmissionQueue():
+    """Limits how many callers run at once, queueing the rest in FIFO order.
+
+    Callers beyond max_waiting are turned away rather than queued, so that a
+    burst cannot build an unbounded backlog.
+    """
+
+    def __init__(self, max_running: int, max_waiting: int):
+        self._semaphore = asyncio.Semaphore(max_running)
+        self._max_waiting = max_waiting
+
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @contextlib.asynccontextmanager
+    async def Admit(self, timeout_s: float | None = None):
+        """Waits for a slot and holds it until the context exits.
+
+        Raises asyncio.QueueFull if max_waiting callers are already waiting, or
+        TimeoutError if no slot freed up within timeout_s.
+        """
+        if self._semaphore.locked() and self.waiting >= self._max_waiting:
+            self.rejected += 1
+            raise asyncio.QueueFull()
+
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(timeout_s):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            raise
+        finally:
+            self.waiting -= 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
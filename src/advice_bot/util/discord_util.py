@@ -1,7 +1,7 @@
 import discord
 import mysql.connector
 
-from advice_bot.database import storage
+from advice_bot.database import command_log, statements
 from advice_bot.commands.common import Command, CommandResult, CommandStatus
 
 
@@ -10,6 +10,18 @@ def IsAdmin(discord_user: discord.Member | discord.abc.User):
     return discord_user.id == allison_id
 
 
+_UPSERT_DISCORD_USER = statements.Declare("upsert_discord_user",
+                                          prepared=True,
+                                          sql="""
+    INSERT INTO discord_users
+        (discord_user_id, discord_username)
+    VALUES
+        (%(discord_user_id)s, %(discord_username)s)
+    ON DUPLICATE KEY UPDATE
+        discord_username = %(discord_username)s
+""")
+
+
 def UpdateDiscordUserInTransaction(discord_user: discord.Member |
                                    discord.abc.User,
                                    cursor: mysql.connector.cursor.MySQLCursor):
@@ -17,49 +29,21 @@ def UpdateDiscordUserInTransaction(discord_user: discord.Member |
 
     Caller is responsible for setting up the transaction.
     """
-    query = """
-        INSERT INTO discord_users
-            (discord_user_id, discord_username)
-        VALUES
-            (%(discord_user_id)s, %(discord_username)s)
-        ON DUPLICATE KEY UPDATE
-            discord_username = %(discord_username)s
-    """
-    cursor.execute(query, {
+    statements.Execute(cursor, _UPSERT_DISCORD_USER, {
         "discord_user_id": discord_user.id,
         "discord_username": discord_user.name,
     })
 
 
-def LogCommand(message: discord.Message, timestamp_micros: int,
-               result: CommandResult):
-    cnx = storage.Connect()
-    cnx.start_transaction()
-    cursor = cnx.cursor()
-    try:
-        UpdateDiscordUserInTransaction(message.author, cursor)
-        query = """
-            INSERT INTO command_log
-                (message_id, timestamp_micros, discord_user_id,
-                 command, command_status)
-            VALUES
-                (%(message_id)s, %(timestamp_micros)s, %(discord_user_id)s,
-                 %(command)s, %(command_status)s)
-            ON DUPLICATE KEY UPDATE
-                timestamp_micros = %(timestamp_micros)s
-        """
-        cursor.execute(
-            query, {
-                "message_id": message.id,
-                "timestamp_micros": timestamp_micros,
-                "discord_user_id": message.author.id,
-                "command": message.content,
-                "command_status": result.status,
-            })
-        cnx.commit()
-    except Exception:
-        cnx.rollback()
-        raise
-    finally:
-        cursor.close()
-        cnx.close()
+async def LogCommand(message: discord.Message, timestamp_micros: int,
+                     result: CommandResult):
+    """Queues a command_log row. See command_log for the write-behind details."""
+    await command_log.Log(
+        command_log.CommandLogEntry(
+            message_id=message.id,
+            timestamp_micros=timestamp_micros,
+            discord_user_id=message.author.id,
+            discord_username=message.author.name,
+            command=message.content,
+            command_status=result.status,
+        ))
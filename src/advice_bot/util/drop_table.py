@@ -1,9 +1,54 @@
 from absl import logging
+import numpy as np
 import pprint
-import random
 import typing
 import sys
 
+from advice_bot.util import entropy
+
+
+class _AliasTable():
+    """Walker/Vose alias table over a flat distribution.
+
+    Samples in O(1) from a single uniform draw: the integer part of u * n picks
+    a column, and the fractional part decides between the column's own outcome
+    and its alias.
+    """
+
+    def __init__(self, leaves: list[tuple[float, typing.Any]]):
+        n = len(leaves)
+        total = sum(p for p, _ in leaves)
+        self.outcomes = [outcome for _, outcome in leaves]
+        self.probs = [1.0] * n
+        self.aliases = list(range(n))
+
+        scaled = [p * n / total for p, _ in leaves]
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.probs[s] = scaled[s]
+            self.aliases[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Anything left over is 1.0 up to rounding error, so keeps probs[i] = 1.
+
+    def Sample(self, u: float):
+        n = len(self.outcomes)
+        x = u * n
+        i = min(int(x), n - 1)
+        if x - i < self.probs[i]:
+            return self.outcomes[i]
+        return self.outcomes[self.aliases[i]]
+
+
+def _NumpyRng() -> np.random.Generator:
+    return np.random.default_rng(entropy.Rng().getrandbits(128))
+
 
 class DropTable():
     """Implements a drop table.
@@ -15,6 +60,9 @@ class DropTable():
 
     def __init__(self, outcomes: list[tuple[float, typing.Any]]):
         self.outcomes = outcomes
+        # Built by Compile().
+        self._alias_table: _AliasTable | None = None
+        self._cumulative: np.ndarray | None = None
 
         # Check sum of probabilities.
         net_probability = 0
@@ -30,15 +78,59 @@ class DropTable():
             logging.fatal("Probabilities must total 1.")
             sys.exit(1)
 
-    def Roll(self, rng=None):
+    def Flatten(self) -> list[tuple[float, typing.Any]]:
+        """Returns the (probability, outcome) of every leaf, with sub-tables
+        expanded.
+
+        Leaves are in the same order as a depth-first walk of the table.
+        """
+        leaves = []
+        for p, outcome in self.outcomes:
+            if isinstance(outcome, DropTable):
+                for sub_p, sub_outcome in outcome.Flatten():
+                    leaves.append((p * sub_p, sub_outcome))
+            else:
+                leaves.append((p, outcome))
+        return leaves
+
+    def Compile(self):
+        """Builds the tables used by Roll() and RollMany(), if not already built.
+
+        Called lazily by both. Tables are treated as immutable once compiled.
+        """
+        if self._alias_table is None:
+            leaves = self.Flatten()
+            cumulative = np.cumsum([p for p, _ in leaves])
+            # Guard against rounding error at the top end.
+            cumulative /= cumulative[-1]
+            self._cumulative = cumulative
+            self._alias_table = _AliasTable(leaves)
+
+    def Outcomes(self) -> list[typing.Any]:
+        """Returns the leaf outcomes, indexed as in RollMany()."""
+        self.Compile()
+        return self._alias_table.outcomes
+
+    def Roll(self, rng=None, sequential: bool | None = None):
         """Rolls the drop table once.
 
         The option to use a custom RNG is intended for testing only - otherwise
-        uses SystemRandom (/dev/urandom). If a custom RNG is provided, must
-        implement random().
+        uses entropy.Rng(). If a custom RNG is provided, must implement
+        random().
+
+        By default, samples the compiled table in O(1) with a single draw from
+        the RNG. If sequential is True, walks the table like a human would,
+        drawing once per level of nesting. Defaults to sequential if a custom
+        RNG is provided, so that tests can script the draw for each level.
         """
+        if sequential is None:
+            sequential = rng is not None
         if rng is None:
-            rng = random.SystemRandom()
+            rng = entropy.Rng()
+
+        if not sequential:
+            self.Compile()
+            return self._alias_table.Sample(rng.random())
 
         roll = rng.random()
         for p, outcome in self.outcomes:
@@ -47,10 +139,45 @@ class DropTable():
                 continue
             # Recurse for sub-table.
             if isinstance(outcome, DropTable):
-                return outcome.Roll(rng)
+                return outcome.Roll(rng, sequential=True)
             return outcome
         logging.fatal("Failed to choose outcome - this should never happen.")
 
+    def RollMany(self,
+                 n: int,
+                 rng: np.random.Generator | None = None) -> np.ndarray:
+        """Rolls the drop table n times.
+
+        Returns an integer array of length n, where each value is an index into
+        Outcomes(). Unless rng is provided, uses a generator seeded from
+        entropy.Rng().
+        Intended for simulations, not for live rolls.
+        """
+        if rng is None:
+            rng = _NumpyRng()
+        self.Compile()
+        indices = np.searchsorted(self._cumulative, rng.random(n), side="right")
+        dtype = np.min_scalar_type(len(self._cumulative) - 1)
+        return np.minimum(indices, len(self._cumulative) - 1).astype(dtype)
+
+    def CountMany(self,
+                  n: int,
+                  rng: np.random.Generator | None = None,
+                  chunk_size: int = 1 << 20) -> np.ndarray:
+        """Rolls the drop table n times and returns the count of each outcome.
+
+        Counts are indexed as in Outcomes(). Rolls in chunks of chunk_size, so
+        memory use is bounded for large n.
+        """
+        if rng is None:
+            rng = _NumpyRng()
+        self.Compile()
+        counts = np.zeros(len(self._cumulative), dtype=np.int64)
+        for start in range(0, n, chunk_size):
+            indices = self.RollMany(min(chunk_size, n - start), rng)
+            counts += np.bincount(indices, minlength=len(counts))
+        return counts
+
     def __str__(self):
         return pprint.pformat(self.outcomes, indent=2)
 
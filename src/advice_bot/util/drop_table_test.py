@@ -1,3 +1,5 @@
+import numpy as np
+
 from advice_bot.util.drop_table import DropTable
 
 
@@ -37,3 +39,60 @@ def test_drop_table():
     assert drop_table.Roll(MockRandom([0.9, 0.3])) == "d2"
     assert drop_table.Roll(MockRandom([0.9, 0.6])) == "d3"
     assert drop_table.Roll(MockRandom([0.9, 0.9])) == "d4"
+
+
+def _NestedTable():
+    return DropTable([
+        (0.5, "a"),
+        (0.3, DropTable([
+            (0.5, "b1"),
+            (0.5, "b2"),
+        ])),
+        (0.2,
+         DropTable([
+             (0.1, "c1"),
+             (0.9, DropTable([
+                 (0.5, "c2"),
+                 (0.5, "c3"),
+             ])),
+         ])),
+    ])
+
+
+def test_flatten():
+    leaves = _NestedTable().Flatten()
+
+    assert [outcome for _, outcome in leaves
+           ] == ["a", "b1", "b2", "c1", "c2", "c3"]
+    expected = [0.5, 0.15, 0.15, 0.02, 0.09, 0.09]
+    for (p, _), expected_p in zip(leaves, expected):
+        assert abs(p - expected_p) < 1e-12
+
+
+def test_alias_sampling_matches_leaf_distribution():
+    drop_table = _NestedTable()
+    leaves = drop_table.Flatten()
+
+    # Sweep evenly spaced draws over [0, 1): each outcome should be chosen in
+    # proportion to its probability, with a single draw per roll.
+    n = 100000
+    counts = {}
+    for i in range(n):
+        outcome = drop_table.Roll(MockRandom([(i + 0.5) / n]), sequential=False)
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+    for p, outcome in leaves:
+        assert abs(counts[outcome] / n - p) < 1e-3
+
+
+def test_count_many():
+    drop_table = _NestedTable()
+    leaves = drop_table.Flatten()
+    assert drop_table.Outcomes() == [outcome for _, outcome in leaves]
+
+    n = 1000000
+    counts = drop_table.CountMany(n, np.random.default_rng(0), chunk_size=1000)
+
+    assert counts.sum() == n
+    for (p, _), count in zip(leaves, counts):
+        assert abs(count / n - p) < 2e-3
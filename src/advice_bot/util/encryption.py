@@ -1,3 +1,4 @@
+import functools
 from google.cloud import kms
 
 
@@ -47,6 +48,13 @@ def decrypt_symmetric(project_id: str, location_id: str, key_ring_id: str,
     return decrypt_response
 
 
+@functools.cache
+def _Crc32cFun():
+    import crcmod  # type: ignore
+
+    return crcmod.predefined.mkPredefinedCrcFun("crc-32c")
+
+
 def crc32c(data: bytes) -> int:
     """
     Calculates the CRC32C checksum of the provided data.
@@ -55,7 +63,4 @@ def crc32c(data: bytes) -> int:
     Returns:
         An int representing the CRC32C checksum of the provided bytes.
     """
-    import crcmod  # type: ignore
-
-    crc32c_fun = crcmod.predefined.mkPredefinedCrcFun("crc-32c")
-    return crc32c_fun(data)
+    return _Crc32cFun()(data)
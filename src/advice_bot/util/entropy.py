@@ -0,0 +1,110 @@
+"""Process-wide source of randomness for rolls.
+
+By default, serves OS entropy (/dev/urandom) from a buffer that is refilled in
+large chunks, rather than making a syscall per roll. With --rng_seed, uses a
+deterministic PRNG instead, for load tests and replay.
+"""
+
+from absl import flags
+import array
+import os
+import random
+import threading
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer(
+    "rng_seed", None,
+    "If set, rolls use a deterministic PRNG with this seed instead of OS "
+    "entropy. Never use in prod.")
+
+_BUFFER_SIZE = 4096
+
+
+class BufferedSystemRandom(random.Random):
+    """Like random.SystemRandom, but reads os.urandom() in chunks.
+
+    Each chunk is decoded up front into 64-bit words, which are handed out by a
+    list iterator. Advancing the iterator is atomic, so no word is ever served
+    twice, and only refills take a lock. Only random() and getrandbits() draw
+    from the buffer; the other methods of random.Random are built on those.
+    Cannot be seeded.
+    """
+
+    def __init__(self, buffer_size: int = _BUFFER_SIZE):
+        self._buffer_words = max(1, buffer_size // 8)
+        self._words = iter(())
+        self._refill_lock = threading.Lock()
+        super().__init__()
+
+    def _Refill(self):
+        with self._refill_lock:
+            words = array.array("Q", os.urandom(self._buffer_words * 8))
+            self._words = iter(words.tolist())
+
+    def _Word(self) -> int:
+        """Returns 64 random bits."""
+        while True:
+            try:
+                return next(self._words)
+            except StopIteration:
+                self._Refill()
+
+    def random(self) -> float:
+        """Returns a float in [0, 1) with 53 bits of entropy."""
+        return (self._Word() >> 11) * 2.0**-53
+
+    def getrandbits(self, k: int) -> int:
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        if k <= 64:
+            return self._Word() >> (64 - k)
+        bits = 0
+        for _ in range((k + 63) // 64):
+            bits = (bits << 64) | self._Word()
+        return bits >> (-k % 64)
+
+    def seed(self, *args, **kwargs):
+        return None
+
+    def getstate(self):
+        raise NotImplementedError("BufferedSystemRandom has no state.")
+
+    def setstate(self, state):
+        raise NotImplementedError("BufferedSystemRandom has no state.")
+
+
+class _SeededRandom(random.Random):
+    """A seeded random.Random that is safe to share between threads."""
+
+    def __init__(self, seed: int):
+        self._lock = threading.Lock()
+        super().__init__(seed)
+
+    def random(self) -> float:
+        with self._lock:
+            return super().random()
+
+    def getrandbits(self, k: int) -> int:
+        with self._lock:
+            return super().getrandbits(k)
+
+
+_RNG: random.Random | None = None
+_RNG_LOCK = threading.Lock()
+
+
+def Rng() -> random.Random:
+    """Returns the global RNG, creating it on first use."""
+    global _RNG
+    if _RNG is None:
+        with _RNG_LOCK:
+            if _RNG is None:
+                _RNG = _CreateRng()
+    return _RNG
+
+
+def _CreateRng() -> random.Random:
+    seed = FLAGS.rng_seed if FLAGS.is_parsed() else None
+    if seed is None:
+        return BufferedSystemRandom()
+    return _SeededRandom(seed)
@@ -0,0 +1,32 @@
+import collections
+
+from advice_bot.util import entropy
+
+
+def test_buffered_random_ranges():
+    # Small buffer, so that draws span refills.
+    rng = entropy.BufferedSystemRandom(buffer_size=16)
+
+    for _ in range(10000):
+        assert 0.0 <= rng.random() < 1.0
+        assert 0 <= rng.getrandbits(13) < 2**13
+    assert rng.getrandbits(0) == 0
+    assert rng.getrandbits(200).bit_length() <= 200
+
+
+def test_buffered_random_randint():
+    rng = entropy.BufferedSystemRandom()
+
+    counts = collections.Counter(rng.randint(1, 6) for _ in range(60000))
+
+    assert sorted(counts) == [1, 2, 3, 4, 5, 6]
+    for count in counts.values():
+        assert abs(count - 10000) < 600
+
+
+def test_seeded_random_is_deterministic():
+    rng1 = entropy._SeededRandom(1234)
+    rng2 = entropy._SeededRandom(1234)
+
+    assert ([rng1.randint(1, 100) for _ in range(100)
+            ] == [rng2.randint(1, 100) for _ in range(100)])
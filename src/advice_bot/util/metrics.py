@@ -0,0 +1,206 @@
+"""In-process metrics: latency histograms, counters and gauges.
+
+Metrics are identified by a name and a set of labels, as in Prometheus, and are
+created on first use. Safe to update from any thread.
+"""
+
+from absl import flags
+from absl import logging
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer(
+    "metrics_port", None,
+    "If set, serves metrics in the Prometheus text format on "
+    "http://localhost:<port>/metrics. When sharded, each shard adds its "
+    "shard ID to the port.")
+
+# Upper bounds of the histogram buckets, in seconds.
+_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+            0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The command being processed, for attributing work done on its behalf (e.g.
+# database queries) without threading it through every call.
+CURRENT_COMMAND: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "CURRENT_COMMAND", default="NONE")
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram():
+    """Counts observations into fixed buckets."""
+
+    def __init__(self):
+        # One extra bucket for observations above the largest bound.
+        self.bucket_counts = [0] * (len(_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def Observe(self, value: float):
+        self.bucket_counts[bisect.bisect_left(_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def Quantile(self, q: float) -> float:
+        """Estimates the q-th quantile, interpolating within a bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                if i == len(_BUCKETS):
+                    return _BUCKETS[-1]
+                lower = _BUCKETS[i - 1] if i > 0 else 0.0
+                fraction = (rank - cumulative) / bucket_count
+                return lower + (_BUCKETS[i] - lower) * fraction
+            cumulative += bucket_count
+        return _BUCKETS[-1]
+
+
+_LOCK = threading.Lock()
+_HISTOGRAMS: dict[str, dict[Labels, Histogram]] = {}
+_COUNTERS: dict[str, dict[Labels, int]] = {}
+_GAUGES: dict[str, dict[Labels, float]] = {}
+
+
+def _Labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def Observe(name: str, seconds: float, **labels: str):
+    """Records a duration in the histogram name{labels}."""
+    key = _Labels(labels)
+    with _LOCK:
+        histograms = _HISTOGRAMS.setdefault(name, {})
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.Observe(seconds)
+
+
+def Increment(name: str, **labels: str):
+    """Adds one to the counter name{labels}."""
+    key = _Labels(labels)
+    with _LOCK:
+        counters = _COUNTERS.setdefault(name, {})
+        counters[key] = counters.get(key, 0) + 1
+
+
+def SetGauge(name: str, value: float, **labels: str):
+    """Sets the gauge name{labels} to value."""
+    key = _Labels(labels)
+    with _LOCK:
+        _GAUGES.setdefault(name, {})[key] = value
+
+
+@contextlib.contextmanager
+def Timer(name: str, **labels: str):
+    """Records the duration of the block in the histogram name{labels}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        Observe(name, time.perf_counter() - start, **labels)
+
+
+def Reset():
+    """Forgets all metrics. For tests."""
+    with _LOCK:
+        _HISTOGRAMS.clear()
+        _COUNTERS.clear()
+        _GAUGES.clear()
+
+
+def _FormatLabels(labels: Labels, extra: Labels = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def PrometheusText() -> str:
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _LOCK:
+        for name, counters in sorted(_COUNTERS.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(counters.items()):
+                lines.append(f"{name}{_FormatLabels(labels)} {value}")
+        for name, gauges in sorted(_GAUGES.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(gauges.items()):
+                lines.append(f"{name}{_FormatLabels(labels)} {value}")
+        for name, histograms in sorted(_HISTOGRAMS.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(_BUCKETS + ("+Inf",),
+                                               histogram.bucket_counts):
+                    cumulative += bucket_count
+                    le = _FormatLabels(labels, (("le", str(bound)),))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{_FormatLabels(labels)} "
+                             f"{histogram.sum}")
+                lines.append(f"{name}_count{_FormatLabels(labels)} "
+                             f"{histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def Summary() -> str:
+    """Returns a compact human-readable summary of all metrics."""
+    lines = []
+    with _LOCK:
+        for name, histograms in sorted(_HISTOGRAMS.items()):
+            lines.append(f"{name} (count p50/p95/p99 ms):")
+            for labels, histogram in sorted(histograms.items()):
+                quantiles = "/".join(f"{histogram.Quantile(q) * 1000:.2f}"
+                                     for q in [0.5, 0.95, 0.99])
+                label_str = " ".join(v for _, v in labels)
+                lines.append(f"  {label_str}: {histogram.count} {quantiles}")
+        for name, values in sorted(_COUNTERS.items()) + sorted(_GAUGES.items()):
+            lines.append(f"{name}:")
+            for labels, value in sorted(values.items()):
+                label_str = " ".join(v for _, v in labels)
+                lines.append(f"  {label_str}: {value}")
+    return "\n".join(lines)
+
+
+async def _HandleRequest(reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter):
+    try:
+        request = await reader.readuntil(b"\r\n\r\n")
+        if request.startswith(b"GET /metrics "):
+            status = b"200 OK"
+            body = PrometheusText().encode()
+        else:
+            status = b"404 Not Found"
+            body = b""
+        writer.write(b"HTTP/1.1 " + status + b"\r\n"
+                     b"Content-Type: text/plain; version=0.0.4\r\n" +
+                     f"Content-Length: {len(body)}\r\n".encode() +
+                     b"Connection: close\r\n\r\n" + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def MaybeStartServer(port_offset: int = 0) -> asyncio.Server | None:
+    """Starts the metrics endpoint if --metrics_port is set.
+
+    Only listens on localhost.
+    """
+    if FLAGS.metrics_port is None:
+        return None
+    port = FLAGS.metrics_port + port_offset
+    server = await asyncio.start_server(_HandleRequest, "127.0.0.1", port)
+    logging.info(f"Serving metrics on port {port}")
+    return server
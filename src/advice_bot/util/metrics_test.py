@@ -0,0 +1,59 @@
+import asyncio
+
+from advice_bot.util import metrics
+
+
+def test_histogram_quantile():
+    histogram = metrics.Histogram()
+    for _ in range(90):
+        histogram.Observe(0.0008)  # (0.5ms, 1ms] bucket
+    for _ in range(10):
+        histogram.Observe(0.2)  # (100ms, 250ms] bucket
+
+    assert 0.0005 < histogram.Quantile(0.5) <= 0.001
+    assert 0.1 < histogram.Quantile(0.95) <= 0.25
+    assert histogram.count == 100
+
+
+def test_prometheus_text():
+    metrics.Reset()
+    metrics.Observe("latency_seconds", 0.003, command="HELP_COMMAND")
+    metrics.Increment("outcomes_total", command="HELP_COMMAND", outcome="OK")
+    metrics.SetGauge("queue_depth", 3)
+
+    text = metrics.PrometheusText()
+
+    assert 'outcomes_total{command="HELP_COMMAND",outcome="OK"} 1' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 3\n" in text
+    assert ('latency_seconds_bucket{command="HELP_COMMAND",le="0.0025"} 0'
+            in text)
+    assert ('latency_seconds_bucket{command="HELP_COMMAND",le="0.005"} 1'
+            in text)
+    assert 'latency_seconds_bucket{command="HELP_COMMAND",le="+Inf"} 1' in text
+    assert 'latency_seconds_count{command="HELP_COMMAND"} 1' in text
+    metrics.Reset()
+
+
+def test_metrics_endpoint():
+
+    async def Fetch(path: str) -> bytes:
+        server = await asyncio.start_server(metrics._HandleRequest, "127.0.0.1",
+                                            0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    metrics.Reset()
+    metrics.Increment("requests_total")
+
+    assert asyncio.run(Fetch("/metrics")).endswith(b"\r\n\r\n"
+                                                   b"# TYPE requests_total "
+                                                   b"counter\n"
+                                                   b"requests_total 1\n")
+    assert asyncio.run(Fetch("/")).startswith(b"HTTP/1.1 404")
+    metrics.Reset()
@@ -0,0 +1,205 @@
+"""Outbound queue for responses, with a queue per channel.
+
+Responses are sent by a background task per channel, so that handling a command
+never waits on Discord. Each channel's task sends its responses in order and
+stays within Discord's per-channel rate limit. While it waits for the rate
+limit, responses pile up, and are then coalesced into as few messages as fit
+in Discord's message length limit.
+"""
+
+from absl import logging
+import asyncio
+import collections
+import discord
+import typing
+
+from advice_bot.util import metrics
+
+_MAX_MESSAGE_LENGTH = 2000
+# Discord allows 5 messages per 5 seconds in a channel. This isn't exposed by
+# discord.py (which instead sleeps and retries once a limit is hit), so track
+# it ourselves.
+_MAX_SENDS_PER_PERIOD = 5
+_PERIOD_S = 5.0
+# Beyond this, new responses for the channel are dropped.
+_MAX_QUEUED_PER_CHANNEL = 1000
+_SEPARATOR = "\n\n"
+
+
+class _Response(typing.NamedTuple):
+    content: str
+    enqueued_at: float
+
+
+class _SendWindow():
+    """Tracks recent sends to a channel against its rate limit."""
+
+    def __init__(self, max_sends: int, period_s: float):
+        self._period_s = period_s
+        self._send_times: collections.deque[float] = collections.deque(
+            maxlen=max_sends)
+        self._blocked_until = 0.0
+
+    def Delay(self, now: float) -> float:
+        """Returns how long to wait before the next send."""
+        delay = self._blocked_until - now
+        if len(self._send_times) == self._send_times.maxlen:
+            delay = max(delay, self._send_times[0] + self._period_s - now)
+        return max(delay, 0.0)
+
+    def Record(self, now: float):
+        self._send_times.append(now)
+
+    def Block(self, until: float):
+        """Holds off sends after Discord rate limited us anyway."""
+        self._blocked_until = max(self._blocked_until, until)
+
+
+class _Channel():
+
+    def __init__(self, channel: discord.abc.Messageable, window: _SendWindow):
+        self.channel = channel
+        self.window = window
+        self.pending: collections.deque[_Response] = collections.deque()
+        self.task: asyncio.Task | None = None
+
+
+class ResponseDispatcher():
+
+    def __init__(self,
+                 max_sends_per_period: int = _MAX_SENDS_PER_PERIOD,
+                 period_s: float = _PERIOD_S,
+                 max_message_length: int = _MAX_MESSAGE_LENGTH,
+                 max_queued_per_channel: int = _MAX_QUEUED_PER_CHANNEL):
+        self._max_sends_per_period = max_sends_per_period
+        self._period_s = period_s
+        self._max_message_length = max_message_length
+        self._max_queued_per_channel = max_queued_per_channel
+        self._channels: dict[int, _Channel] = {}
+        self._queued = 0
+
+    def Send(self, channel: discord.abc.Messageable, content: str):
+        """Queues a response to be sent to channel.
+
+        Must be called from the event loop.
+        """
+        state = self._channels.get(channel.id)
+        if state is None:
+            state = self._channels[channel.id] = _Channel(
+                channel, _SendWindow(self._max_sends_per_period,
+                                     self._period_s))
+        if len(state.pending) >= self._max_queued_per_channel:
+            logging.warning(
+                "Response queue for channel %d is full, dropping "
+                "response.", channel.id)
+            metrics.Increment("advice_bot_responses_dropped_total",
+                              reason="queue_full")
+            return
+        loop = asyncio.get_running_loop()
+        state.pending.append(_Response(content, loop.time()))
+        self._SetQueued(self._queued + 1)
+        if state.task is None:
+            state.task = asyncio.create_task(self._Drain(state),
+                                             name=f"responses_{channel.id}")
+
+    async def Stop(self):
+        """Waits until everything queued so far has been sent."""
+        tasks = [
+            state.task
+            for state in self._channels.values()
+            if state.task is not None
+        ]
+        await asyncio.gather(*tasks)
+
+    def _SetQueued(self, queued: int):
+        self._queued = queued
+        metrics.SetGauge("advice_bot_response_queue_depth", queued)
+
+    def _TakeBatch(self, pending: collections.deque[_Response]):
+        """Takes the longest run of responses that fit in one message.
+
+        A single response over the limit is still sent on its own.
+        """
+        batch = [pending.popleft()]
+        length = len(batch[0].content)
+        while pending:
+            length += len(_SEPARATOR) + len(pending[0].content)
+            if length > self._max_message_length:
+                break
+            batch.append(pending.popleft())
+        return batch
+
+    def _Retry(self, state: _Channel, batch: list[_Response],
+               retry_after_s: float):
+        """Puts batch back, to be sent once the rate limit resets."""
+        state.pending.extendleft(reversed(batch))
+        state.window.Block(asyncio.get_running_loop().time() + retry_after_s)
+        metrics.Increment("advice_bot_response_rate_limited_total")
+
+    def _Drop(self, state: _Channel, batch: list[_Response]):
+        logging.exception("Failed to send %d response(s) to channel %d.",
+                          len(batch), state.channel.id)
+        metrics.Increment("advice_bot_responses_dropped_total",
+                          reason="send_failed")
+
+    async def _Drain(self, state: _Channel):
+        loop = asyncio.get_running_loop()
+        try:
+            while state.pending:
+                delay = state.window.Delay(loop.time())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                batch = self._TakeBatch(state.pending)
+                content = _SEPARATOR.join(
+                    response.content for response in batch)
+                state.window.Record(loop.time())
+                try:
+                    await state.channel.send(content, suppress_embeds=True)
+                except discord.RateLimited as e:
+                    self._Retry(state, batch, e.retry_after)
+                    continue
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        self._Drop(state, batch)
+                    else:
+                        self._Retry(state, batch, self._period_s)
+                        continue
+                except Exception:
+                    self._Drop(state, batch)
+                else:
+                    metrics.Increment("advice_bot_response_messages_total")
+
+                self._SetQueued(self._queued - len(batch))
+                now = loop.time()
+                for response in batch:
+                    metrics.Observe("advice_bot_response_lag_seconds",
+                                    now - response.enqueued_at)
+        finally:
+            state.task = None
+
+
+# Global dispatcher, set up by Start() or on first use.
+_DISPATCHER: ResponseDispatcher | None = None
+
+
+def Start(**kwargs):
+    """Starts the global dispatcher. See ResponseDispatcher for kwargs."""
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        _DISPATCHER = ResponseDispatcher(**kwargs)
+
+
+async def Stop():
+    """Sends everything queued, then stops the global dispatcher."""
+    global _DISPATCHER
+    if _DISPATCHER is not None:
+        await _DISPATCHER.Stop()
+        _DISPATCHER = None
+
+
+def Send(channel: discord.abc.Messageable, content: str):
+    """Queues a response, starting the global dispatcher if necessary."""
+    Start()
+    _DISPATCHER.Send(channel, content)
@@ -0,0 +1,102 @@
+import asyncio
+import discord
+
+from advice_bot.util import response_dispatcher
+
+
+class FakeChannel():
+
+    def __init__(self, channel_id: int = 1, failures: list | None = None):
+        self.id = channel_id
+        self.sent = []
+        self.send_times = []
+        # Exceptions to raise from the next sends.
+        self._failures = failures or []
+
+    async def send(self, content: str, **kwargs):
+        if self._failures:
+            raise self._failures.pop(0)
+        self.sent.append(content)
+        self.send_times.append(asyncio.get_running_loop().time())
+
+
+class RateLimitedResponse():
+    status = 429
+    reason = "Too Many Requests"
+
+
+def test_coalesces_in_order_within_length_limit():
+    channel = FakeChannel()
+
+    async def Run():
+        dispatcher = response_dispatcher.ResponseDispatcher(
+            max_sends_per_period=1, period_s=0.05, max_message_length=20)
+        dispatcher.Send(channel, "reply 0")
+        # Sent right away, using up the rate limit, so the rest wait and are
+        # coalesced.
+        await asyncio.sleep(0)
+        for i in range(1, 6):
+            dispatcher.Send(channel, f"reply {i}")
+        await dispatcher.Stop()
+
+    asyncio.run(Run())
+
+    assert channel.sent == [
+        "reply 0",
+        "reply 1\n\nreply 2",
+        "reply 3\n\nreply 4",
+        "reply 5",
+    ]
+
+
+def test_respects_rate_limit():
+    channel = FakeChannel()
+
+    async def Run():
+        dispatcher = response_dispatcher.ResponseDispatcher(
+            max_sends_per_period=2, period_s=0.1, max_message_length=1)
+        for i in range(5):
+            dispatcher.Send(channel, str(i))
+        await dispatcher.Stop()
+
+    asyncio.run(Run())
+
+    assert channel.sent == ["0", "1", "2", "3", "4"]
+    times = channel.send_times
+    for i in range(2, len(times)):
+        assert times[i] - times[i - 2] >= 0.1
+
+
+def test_retries_when_rate_limited():
+    channel = FakeChannel(failures=[
+        discord.HTTPException(RateLimitedResponse(), "rate limited"),
+    ])
+
+    async def Run():
+        dispatcher = response_dispatcher.ResponseDispatcher(period_s=0.01)
+        dispatcher.Send(channel, "hello")
+        await dispatcher.Stop()
+
+    asyncio.run(Run())
+
+    assert channel.sent == ["hello"]
+
+
+def test_drops_on_failure_and_when_full():
+    channel = FakeChannel(failures=[RuntimeError("boom")])
+
+    async def Run():
+        dispatcher = response_dispatcher.ResponseDispatcher(
+            max_sends_per_period=1,
+            period_s=0.01,
+            max_message_length=1,
+            max_queued_per_channel=2)
+        for content in ["a", "b", "c"]:
+            dispatcher.Send(channel, content)
+        await dispatcher.Stop()
+        assert dispatcher._queued == 0
+
+    asyncio.run(Run())
+
+    # "a" failed to send and "c" didn't fit in the queue.
+    assert channel.sent == ["b"]
@@ -0,0 +1,97 @@
+"""A local cache for secrets, sealed with a key that never leaves this machine.
+
+Used to keep decrypted data across restarts without storing it in the clear.
+The key is kept apart from the cache, so that the cache alone (e.g. in a backup)
+can't be unsealed, and is only used if no other user can access it.
+Each entry is derived from some source (e.g. a ciphertext that is expensive to
+decrypt) and is only returned for that exact source, so it is invalidated when
+the source changes.
+
+File format: SHA-256 of the source, then a nonce, then the data encrypted with
+AES-256-GCM, authenticating the source hash.
+"""
+
+from cryptography.hazmat.primitives.ciphers import aead
+import cryptography.exceptions
+import hashlib
+import os
+
+_KEY_BYTES = 32
+_HASH_BYTES = 32
+_NONCE_BYTES = 12
+
+
+class SealedCache():
+
+    def __init__(self, directory: str, name: str, key_path: str):
+        """key_path is where the key is kept, outside directory."""
+        self.directory = directory
+        self._key_path = key_path
+        self._path = os.path.join(directory, f"{name}.sealed")
+
+    def Get(self, source: bytes) -> bytes | None:
+        """Returns the data cached for source, or None on a miss.
+
+        Tampered or otherwise unreadable entries are treated as misses.
+        """
+        try:
+            with open(self._path, "rb") as f:
+                sealed = f.read()
+            key = _ReadKey(self._key_path)
+        except OSError:
+            return None
+
+        source_hash = hashlib.sha256(source).digest()
+        if sealed[:_HASH_BYTES] != source_hash:
+            return None
+        nonce = sealed[_HASH_BYTES:_HASH_BYTES + _NONCE_BYTES]
+        try:
+            return aead.AESGCM(key).decrypt(nonce,
+                                            sealed[_HASH_BYTES + _NONCE_BYTES:],
+                                            source_hash)
+        except (cryptography.exceptions.InvalidTag, ValueError):
+            return None
+
+    def Put(self, source: bytes, data: bytes):
+        """Caches data for source, replacing any previous entry."""
+        source_hash = hashlib.sha256(source).digest()
+        nonce = os.urandom(_NONCE_BYTES)
+        sealed = source_hash + nonce + aead.AESGCM(self._Key()).encrypt(
+            nonce, data, source_hash)
+
+        # Write and rename, so that a crash never leaves a partial entry.
+        _MakePrivateDirs(self.directory)
+        temp_path = f"{self._path}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(sealed)
+        os.replace(temp_path, self._path)
+
+    def _Key(self) -> bytes:
+        """Returns the local key, creating it if necessary."""
+        _MakePrivateDirs(os.path.dirname(self._key_path))
+        try:
+            fd = os.open(self._key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o600)
+        except FileExistsError:
+            return _ReadKey(self._key_path)
+        key = os.urandom(_KEY_BYTES)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+
+def _MakePrivateDirs(directory: str):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # makedirs() leaves the mode of an existing directory alone.
+    os.chmod(directory, 0o700)
+
+
+def _ReadKey(path: str) -> bytes:
+    """Reads the key, raising PermissionError if other users could too."""
+    with open(os.open(path, os.O_RDONLY | os.O_NOFOLLOW), "rb") as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            raise PermissionError(
+                f"{path} must only be accessible by its owner")
+        return f.read()
@@ -0,0 +1,65 @@
+import os
+
+from advice_bot.util import sealed_cache
+
+
+def _Cache(tmp_path) -> sealed_cache.SealedCache:
+    return sealed_cache.SealedCache(str(tmp_path / "cache"), "params",
+                                    str(tmp_path / "key" / "local.key"))
+
+
+def test_round_trip(tmp_path):
+    cache = _Cache(tmp_path)
+
+    assert cache.Get(b"ciphertext") is None
+    cache.Put(b"ciphertext", b"secret")
+
+    assert cache.Get(b"ciphertext") == b"secret"
+    # Not stored in the clear, nor with its key.
+    assert b"secret" not in (tmp_path / "cache" / "params.sealed").read_bytes()
+    assert os.listdir(tmp_path / "cache") == ["params.sealed"]
+    assert os.stat(tmp_path / "key" / "local.key").st_mode & 0o077 == 0
+
+
+def test_tightens_existing_directories(tmp_path):
+    (tmp_path / "cache").mkdir(mode=0o755)
+    (tmp_path / "key").mkdir(mode=0o755)
+    _Cache(tmp_path).Put(b"ciphertext", b"secret")
+
+    assert os.stat(tmp_path / "cache").st_mode & 0o077 == 0
+    assert os.stat(tmp_path / "key").st_mode & 0o077 == 0
+
+
+def test_invalidated_when_source_changes(tmp_path):
+    cache = _Cache(tmp_path)
+    cache.Put(b"ciphertext", b"secret")
+
+    assert cache.Get(b"new ciphertext") is None
+
+
+def test_tampered_or_rekeyed_entries_miss(tmp_path):
+    cache = _Cache(tmp_path)
+    cache.Put(b"ciphertext", b"secret")
+    path = tmp_path / "cache" / "params.sealed"
+    key_path = tmp_path / "key" / "local.key"
+    sealed = path.read_bytes()
+
+    path.write_bytes(sealed[:-1] + bytes([sealed[-1] ^ 1]))
+    assert cache.Get(b"ciphertext") is None
+
+    path.write_bytes(sealed)
+    key = key_path.read_bytes()
+    key_path.write_bytes(os.urandom(32))
+    assert cache.Get(b"ciphertext") is None
+
+    # Keys that other users could read are not used.
+    key_path.write_bytes(key)
+    key_path.chmod(0o644)
+    assert cache.Get(b"ciphertext") is None
+
+
+def test_unreadable_entries_miss(tmp_path):
+    cache = _Cache(tmp_path)
+    (tmp_path / "cache" / "params.sealed").mkdir(parents=True)
+
+    assert cache.Get(b"ciphertext") is None
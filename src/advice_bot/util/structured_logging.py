@@ -0,0 +1,151 @@
+"""Structured JSON logging, written from a background thread.
+
+Log calls on the event loop only enqueue the record: formatting, JSON encoding
+and file I/O happen on a QueueListener thread. Records are written one JSON
+object per line to a size-rotated file.
+
+Pass structured fields with extra=, e.g.:
+
+    logging.info("REJECTING message %d: not enabled", message.id,
+                 extra={"message_id": message.id, "command": "HELP_COMMAND"})
+"""
+
+from absl import flags
+from absl import logging as absl_logging
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+from advice_bot.util import metrics
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("log_max_bytes", 50 * 1024 * 1024,
+                     "Size at which the JSON log file is rotated.")
+flags.DEFINE_integer("log_backup_count", 10,
+                     "Number of rotated JSON log files to keep.")
+
+# Fields that every record has, null if not given.
+FIELDS = ("message_id", "command", "status", "latency_ms")
+
+_MAX_QUEUED_RECORDS = 100000
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        # RotatingFileHandler formats each record twice: once to decide
+        # whether to rotate, and once to write it.
+        cached = getattr(record, "_json", None)
+        if cached is not None:
+            return cached
+        entry = {
+            "time":
+                datetime.datetime.fromtimestamp(record.created,
+                                                datetime.UTC).isoformat(),
+            "level":
+                record.levelname,
+            "source":
+                f"{record.filename}:{record.lineno}",
+            "msg":
+                record.getMessage(),
+        }
+        for field in FIELDS:
+            entry[field] = getattr(record, field, None)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        record._json = json.dumps(entry, default=str)
+        return record._json
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records without formatting them.
+
+    The stock QueueHandler formats the message before enqueueing it, which
+    would put string building back on the caller's thread. Drops records
+    rather than blocking if the writer falls behind, counting them in
+    advice_bot_log_records_dropped_total.
+    """
+
+    def __init__(self, queue: queue.Queue):
+        super().__init__(queue)
+        self.listener: logging.handlers.QueueListener | None = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.Increment("advice_bot_log_records_dropped_total")
+
+    def emit(self, record: logging.LogRecord):
+        super().emit(record)
+        if record.levelno >= logging.CRITICAL and self.listener is not None:
+            # The absl handler aborts the process on FATAL, so write
+            # everything out first.
+            self.listener.stop()
+            self.listener = None
+
+
+def _CreateQueueHandler(path: str, max_bytes: int,
+                        backup_count: int) -> _QueueHandler:
+    """Returns a handler that queues records for a rotated JSON file.
+
+    The listener writing the file is not started yet.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+
+    queue_handler = _QueueHandler(queue.Queue(maxsize=_MAX_QUEUED_RECORDS))
+    queue_handler.listener = logging.handlers.QueueListener(
+        queue_handler.queue, file_handler, respect_handler_level=True)
+    return queue_handler
+
+
+def _LinkLatest(path: str, link_path: str):
+    """Points link_path at path, like absl does for its log files."""
+    temp_path = f"{link_path}.{os.getpid()}.tmp"
+    try:
+        os.symlink(os.path.basename(path), temp_path)
+        os.replace(temp_path, link_path)
+    except OSError:
+        # Only a convenience.
+        pass
+
+
+def Setup(log_dir: str, program_name: str):
+    """Sends log records to a rotated JSON file in log_dir.
+
+    Each process gets its own file, as rotating a file that other processes
+    write to would mix up their records. <program_name>.json.log links to the
+    latest one.
+
+    The absl handler stays installed, but only writes to stderr: everything
+    with --alsologtostderr, otherwise warnings and above.
+    """
+    path = os.path.join(log_dir, f"{program_name}.{os.getpid()}.json.log")
+    queue_handler = _CreateQueueHandler(path, FLAGS.log_max_bytes,
+                                        FLAGS.log_backup_count)
+    listener = queue_handler.listener
+    assert listener is not None
+    _LinkLatest(path, os.path.join(log_dir, f"{program_name}.json.log"))
+
+    absl_handler = absl_logging.get_absl_handler()
+    absl_handler.setLevel(
+        logging.NOTSET if FLAGS.alsologtostderr else logging.WARNING)
+    logging.getLogger().handlers = [queue_handler, absl_handler]
+
+    listener.start()
+
+    def Stop():
+        # Unless already stopped by a FATAL record.
+        if queue_handler.listener is not None:
+            listener.stop()
+
+    atexit.register(Stop)
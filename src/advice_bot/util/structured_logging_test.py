@@ -0,0 +1,104 @@
+import json
+import logging
+
+from advice_bot.util import metrics, structured_logging
+
+
+class _CountingArg():
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "arg"
+
+
+def _Record(msg: str, *args, level=logging.INFO, **extra) -> logging.LogRecord:
+    logger = logging.getLogger("structured_logging_test")
+    return logger.makeRecord(logger.name,
+                             level,
+                             "test.py",
+                             12,
+                             msg,
+                             args,
+                             None,
+                             extra=extra)
+
+
+def test_json_formatter_fields():
+    record = _Record("PROCESSED message %d",
+                     123,
+                     message_id=123,
+                     command="HELP")
+
+    entry = json.loads(structured_logging.JsonFormatter().format(record))
+
+    assert entry["msg"] == "PROCESSED message 123"
+    assert entry["level"] == "INFO"
+    assert entry["source"] == "test.py:12"
+    assert entry["message_id"] == 123
+    assert entry["command"] == "HELP"
+    assert entry["status"] is None
+    assert entry["latency_ms"] is None
+
+
+def test_formats_on_listener_thread(tmp_path):
+    path = tmp_path / "test.json.log"
+    handler = structured_logging._CreateQueueHandler(str(path),
+                                                     max_bytes=1 << 20,
+                                                     backup_count=1)
+    arg = _CountingArg()
+
+    handler.handle(_Record("hello %s", arg, message_id=1))
+    # Only enqueued so far.
+    assert arg.formatted == 0
+
+    handler.listener.start()
+    handler.listener.stop()
+    assert arg.formatted == 1
+    entry = json.loads(path.read_text())
+    assert entry["msg"] == "hello arg"
+    assert entry["message_id"] == 1
+
+
+def test_rotates_by_size(tmp_path):
+    path = tmp_path / "test.json.log"
+    handler = structured_logging._CreateQueueHandler(str(path),
+                                                     max_bytes=1000,
+                                                     backup_count=2)
+
+    handler.listener.start()
+    for i in range(100):
+        handler.handle(_Record("record %d", i))
+    handler.listener.stop()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "test.json.log", "test.json.log.1", "test.json.log.2"
+    ]
+    for p in tmp_path.iterdir():
+        assert p.stat().st_size <= 1000
+
+
+def test_drops_records_when_full(tmp_path):
+    metrics.Reset()
+    handler = structured_logging._CreateQueueHandler(str(tmp_path / "log"),
+                                                     max_bytes=1 << 20,
+                                                     backup_count=1)
+    handler.queue.maxsize = 2
+
+    for i in range(5):
+        handler.handle(_Record("record %d", i))
+
+    assert ("advice_bot_log_records_dropped_total 3"
+            in metrics.PrometheusText())
+
+
+def test_link_latest(tmp_path):
+    link_path = tmp_path / "program.json.log"
+    for pid in [1, 2]:
+        path = tmp_path / f"program.{pid}.json.log"
+        path.write_text(str(pid))
+        structured_logging._LinkLatest(str(path), str(link_path))
+
+    assert link_path.read_text() == "2"
@@ -1,3 +1,7 @@
+import time
+
+_IMPORT_START = time.perf_counter()
+
 from absl import app
 from absl import flags
 from absl import logging
@@ -6,7 +10,12 @@ import os
 import pathlib
 
 from advice_bot.advice_bot import AdviceBot
-from advice_bot import params
+from advice_bot import params, sharding
+from advice_bot.util import structured_logging
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
+
+FLAGS = flags.FLAGS
 
 
 def SetupLogging():
@@ -14,16 +23,38 @@ def SetupLogging():
     # Make dir if necessary.
     os.makedirs(log_dir, mode=0o700, exist_ok=True)
 
-    absl_handler = logging.get_absl_handler()
-    absl_handler.use_absl_log_file(program_name="advice_bot.py",
-                                   log_dir=log_dir)
-    logging.use_absl_handler()
+    # Dev and prod may run side by side.
+    program_name = f"advice_bot.{FLAGS.env}"
+    if sharding.Enabled():
+        program_name += f".shard{FLAGS.shard_id}"
+    structured_logging.Setup(log_dir, program_name=program_name)
+
+
+def _FormatMs(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
 
 
 def main(argv):
+    timings = {"imports": _IMPORT_SECONDS}
+    start = time.perf_counter()
     SetupLogging()
+    timings["logging"] = time.perf_counter() - start
+
+    start = time.perf_counter()
     secret_token = params.Params().discord_params.discord_secret_token
+    timings["params"] = time.perf_counter() - start
+
+    start = time.perf_counter()
     client = AdviceBot.CreateInstance()
+    timings["client"] = time.perf_counter() - start
+
+    params_steps = ", ".join(f"{step} {_FormatMs(seconds)}"
+                             for step, seconds in params.LoadTimings().items())
+    logging.info(
+        "Startup took %s before connecting: %s (params: %s)",
+        _FormatMs(sum(timings.values())),
+        ", ".join(f"{stage} {_FormatMs(seconds)}"
+                  for stage, seconds in timings.items()), params_steps)
     client.run(secret_token)
 
 
@@ -0,0 +1,125 @@
+"""Offline simulator for monthly giveaway payouts.
+
+Simulates many independent giveaway months against the prize table in effect
+for --month, and prints the distribution of the total monthly payout, priced
+with prize_value_m from the prizes table.
+
+Example, resampling participant counts from past months (see the first query
+in advice_bot/database/prizes.sql):
+
+    uv run src/simulate_giveaway.py --month=2026-02 \
+        --participants=180,210,260,240 --budget_m=150
+"""
+
+from absl import app
+from absl import flags
+import concurrent.futures
+import datetime
+import numpy as np
+import os
+import pathlib
+import re
+
+from advice_bot.commands import monthly_giveaway
+from advice_bot.commands.monthly_giveaway import Prize
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string(
+    "month", None,
+    "Giveaway month to simulate, as YYYY-MM. Selects the prize table. "
+    "Defaults to the current month.")
+flags.DEFINE_list(
+    "participants", None,
+    "Participant counts. Each simulated month draws one of these uniformly at "
+    "random.")
+flags.DEFINE_integer("months", 1000000, "Number of months to simulate.")
+flags.DEFINE_float(
+    "budget_m", None,
+    "Monthly budget in millions, to report the chance of exceeding it.")
+flags.DEFINE_integer("workers", os.cpu_count(), "Number of worker processes.")
+flags.DEFINE_integer("seed", None, "Random seed, for reproducible runs.")
+flags.mark_flag_as_required("participants")
+
+_SCHEMA_PATH = (pathlib.Path(__file__).parent / "advice_bot" / "database" /
+                "schema" / "schema.sql")
+_PRIZE_VALUE_REGEX = re.compile(r"\(\s*(\d+)\s*,\s*'(\w+)'\s*,\s*(\d+)\s*\)")
+
+
+def LoadPrizeValues(schema_sql: str) -> dict[Prize, int]:
+    """Parses prize_value_m for each prize from the prizes table's INSERT."""
+    _, _, statement = schema_sql.partition("INSERT INTO prizes")
+    statement, _, _ = statement.partition(";")
+    values = {}
+    for prize, prize_name, prize_value_m in _PRIZE_VALUE_REGEX.findall(
+            statement):
+        if Prize(int(prize)).name != prize_name:
+            raise ValueError(f"Prize {prize} is {Prize(int(prize)).name} in "
+                             f"code but {prize_name} in the schema.")
+        values[Prize(int(prize))] = int(prize_value_m)
+    missing = set(Prize) - set(values)
+    if missing:
+        raise ValueError(f"No prize_value_m for {sorted(missing)}.")
+    return values
+
+
+def SimulatePayouts(probabilities: np.ndarray, values_m: np.ndarray,
+                    participants: np.ndarray, months: int,
+                    seed: np.random.SeedSequence) -> np.ndarray:
+    """Returns the total payout of each of `months` simulated months.
+
+    probabilities and values_m are per leaf of the prize table. The rolls in a
+    month are independent, so the number of each prize won is multinomial in
+    the total number of rolls, which avoids drawing every roll.
+    """
+    rng = np.random.default_rng(seed)
+    num_rolls = rng.choice(participants, size=months) * monthly_giveaway._ROLLS
+    counts = rng.multinomial(num_rolls, probabilities)
+    return counts @ values_m
+
+
+def _MonthTimestampMicros(month: str | None) -> int:
+    if month is None:
+        date = datetime.datetime.now(tz=datetime.timezone.utc)
+    else:
+        date = datetime.datetime.strptime(
+            month, "%Y-%m").replace(tzinfo=datetime.timezone.utc)
+    return int(date.timestamp() * 1e6)
+
+
+def main(argv):
+    prize_table = monthly_giveaway._GetPrizeTable(
+        _MonthTimestampMicros(FLAGS.month))
+    prize_values = LoadPrizeValues(_SCHEMA_PATH.read_text())
+    leaves = prize_table.Flatten()
+    probabilities = np.array([p for p, _ in leaves])
+    probabilities /= probabilities.sum()
+    values_m = np.array([prize_values[prize] for _, prize in leaves],
+                        dtype=np.float64)
+    participants = np.array([int(n) for n in FLAGS.participants])
+
+    # Split the months evenly across workers, each with an independent stream.
+    workers = max(1, min(FLAGS.workers, FLAGS.months))
+    chunk, remainder = divmod(FLAGS.months, workers)
+    chunks = [chunk + (i < remainder) for i in range(workers)]
+    seeds = np.random.SeedSequence(FLAGS.seed).spawn(workers)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(SimulatePayouts, probabilities, values_m, participants,
+                        months, seed) for months, seed in zip(chunks, seeds)
+        ]
+        payouts = np.concatenate([f.result() for f in futures])
+
+    print(f"Simulated months: {len(payouts):,}")
+    print(f"Expected payout per roll: {probabilities @ values_m:.4f}m")
+    print(f"Mean monthly payout: {payouts.mean():,.1f}m")
+    print(f"p95 monthly payout: {np.percentile(payouts, 95):,.1f}m")
+    print(f"p99 monthly payout: {np.percentile(payouts, 99):,.1f}m")
+    print(f"Max monthly payout: {payouts.max():,.1f}m")
+    if FLAGS.budget_m is not None:
+        over_budget = np.mean(payouts > FLAGS.budget_m)
+        print(f"Chance of exceeding {FLAGS.budget_m:,.1f}m: "
+              f"{over_budget:.4%}")
+
+
+if __name__ == "__main__":
+    app.run(main)
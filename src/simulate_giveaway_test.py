@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from advice_bot.commands.monthly_giveaway import Prize
+import simulate_giveaway
+
+_SCHEMA = """
+INSERT INTO prizes
+  (prize, prize_name, prize_value_m)
+VALUES
+  (0, 'NO_PRIZE', 0),
+  (1, 'GOODYBAG', 5),
+  (2, 'GP_2M', 2),
+  (3, 'CUSTOM_RANK', 0),
+  (4, 'CUSTOM_RANK_PLUSPLUS', 0),
+  (5, 'GP_5M', 5),
+  (6, 'GP_10M', 10);
+"""
+
+
+def test_load_prize_values():
+    values = simulate_giveaway.LoadPrizeValues(_SCHEMA)
+
+    assert values[Prize.GP_10M] == 10
+    assert values[Prize.GOODYBAG] == 5
+    assert values[Prize.NO_PRIZE] == 0
+
+
+def test_load_prize_values_name_mismatch():
+    with pytest.raises(ValueError):
+        simulate_giveaway.LoadPrizeValues(_SCHEMA.replace("GP_2M", "GP_3M"))
+
+
+def test_simulate_payouts():
+    probabilities = np.array([0.5, 0.5])
+    values_m = np.array([0.0, 1.0])
+    participants = np.array([100])
+
+    payouts = simulate_giveaway.SimulatePayouts(probabilities, values_m,
+                                                participants, 10000,
+                                                np.random.SeedSequence(0))
+
+    assert payouts.shape == (10000,)
+    # 100 participants * 4 rolls, half of which pay 1m.
+    assert abs(payouts.mean() - 200) < 1
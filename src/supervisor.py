@@ -0,0 +1,153 @@
+"""Runs the bot as several gateway shards, one worker process per shard.
+
+Starts src/main.py once per shard, restarts workers that exit (backing off if
+they keep exiting), and records restarts for !admin status. Flags after -- are
+passed on to every worker, e.g.:
+
+    uv run src/supervisor.py --shard_count=4 -- --alsologtostderr --env=prod
+
+See advice_bot/sharding.py.
+"""
+
+from absl import app
+from absl import flags
+from absl import logging
+import asyncio
+import os
+import pathlib
+import signal
+import sys
+import time
+
+from advice_bot import sharding
+
+FLAGS = flags.FLAGS
+
+_MAIN = pathlib.Path(__file__).parent / "main.py"
+_MIN_BACKOFF_S = 1.0
+_MAX_BACKOFF_S = 60.0
+# A worker that ran at least this long before exiting is restarted right away.
+_HEALTHY_RUN_S = 60.0
+# How long workers get to shut down cleanly before being killed.
+_STOP_TIMEOUT_S = 30.0
+
+
+class _Shard():
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.pid: int | None = None
+        self.restarts = 0
+        self.last_exit_code: int | None = None
+
+
+class Supervisor():
+
+    def __init__(self,
+                 shard_count: int,
+                 worker_command: list[str],
+                 status_dir: str,
+                 min_backoff_s: float = _MIN_BACKOFF_S):
+        """worker_command is run with --shard_id and --shard_count added."""
+        self._shard_count = shard_count
+        self._worker_command = worker_command
+        self._status_dir = status_dir
+        self._min_backoff_s = min_backoff_s
+        self._shards = [_Shard(i) for i in range(shard_count)]
+        self._stopping = asyncio.Event()
+
+    async def Run(self):
+        """Runs the workers until Stop()."""
+        await asyncio.gather(*[self._RunShard(shard) for shard in self._shards])
+
+    def Stop(self):
+        """Makes Run() stop all workers and return."""
+        self._stopping.set()
+
+    def _WriteStatus(self):
+        sharding.WriteStatus(
+            self._status_dir, sharding.SUPERVISOR_STATUS_FILE, {
+                "pid": os.getpid(),
+                "shards": {
+                    str(shard.shard_id): {
+                        "pid": shard.pid,
+                        "restarts": shard.restarts,
+                        "last_exit_code": shard.last_exit_code,
+                    } for shard in self._shards
+                },
+            })
+
+    async def _RunShard(self, shard: _Shard):
+        backoff_s = self._min_backoff_s
+        while not self._stopping.is_set():
+            process = await asyncio.create_subprocess_exec(
+                *self._worker_command, f"--shard_id={shard.shard_id}",
+                f"--shard_count={self._shard_count}")
+            start = time.monotonic()
+            shard.pid = process.pid
+            self._WriteStatus()
+            logging.info(f"Started shard {shard.shard_id} (pid {process.pid})")
+
+            exited = asyncio.create_task(process.wait())
+            stopping = asyncio.create_task(self._stopping.wait())
+            await asyncio.wait([exited, stopping],
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not exited.done():
+                exited.cancel()
+                await self._Terminate(shard, process)
+                return
+            stopping.cancel()
+
+            shard.pid = None
+            shard.last_exit_code = exited.result()
+            shard.restarts += 1
+            self._WriteStatus()
+            if time.monotonic() - start >= _HEALTHY_RUN_S:
+                backoff_s = self._min_backoff_s
+            logging.warning(f"Shard {shard.shard_id} exited with code "
+                            f"{shard.last_exit_code}, restarting in "
+                            f"{backoff_s:.0f}s.")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), backoff_s)
+                return
+            except TimeoutError:
+                pass
+            backoff_s = min(backoff_s * 2, _MAX_BACKOFF_S)
+
+    async def _Terminate(self, shard: _Shard,
+                         process: asyncio.subprocess.Process):
+        logging.info(f"Stopping shard {shard.shard_id} (pid {process.pid})")
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), _STOP_TIMEOUT_S)
+        except TimeoutError:
+            logging.warning(f"Killing shard {shard.shard_id}, which didn't "
+                            "stop in time.")
+            process.kill()
+            await process.wait()
+        shard.pid = None
+        self._WriteStatus()
+
+
+async def _Main(worker_args: list[str]):
+    status_dir = sharding.StatusDir()
+    supervisor = Supervisor(
+        FLAGS.shard_count,
+        [sys.executable,
+         str(_MAIN), f"--shard_status_dir={status_dir}"] + worker_args,
+        status_dir)
+    loop = asyncio.get_running_loop()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(signum, supervisor.Stop)
+    await supervisor.Run()
+
+
+def main(argv):
+    if FLAGS.shard_count < 1:
+        raise app.UsageError("--shard_count must be positive.")
+    asyncio.run(_Main(argv[1:]))
+
+
+if __name__ == "__main__":
+    flags.mark_flag_as_required("shard_count")
+    app.run(main)
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import sys
+
+import supervisor
+
+
+def _Status(tmp_path) -> dict:
+    return json.loads((tmp_path / "supervisor.json").read_text())
+
+
+def test_restarts_workers_that_exit(tmp_path):
+
+    async def Run():
+        s = supervisor.Supervisor(
+            2, [sys.executable, "-c", "import sys; sys.exit(3)"],
+            str(tmp_path),
+            min_backoff_s=0.01)
+        task = asyncio.create_task(s.Run())
+        while min(shard.restarts for shard in s._shards) < 3:
+            await asyncio.sleep(0.01)
+        s.Stop()
+        await task
+
+    asyncio.run(Run())
+
+    status = _Status(tmp_path)["shards"]
+    assert sorted(status) == ["0", "1"]
+    assert status["0"]["restarts"] >= 3
+    assert status["0"]["last_exit_code"] == 3
+
+
+def test_stop_terminates_workers(tmp_path):
+
+    async def Run():
+        s = supervisor.Supervisor(
+            1, [sys.executable, "-c", "import time; time.sleep(60)"],
+            str(tmp_path))
+        task = asyncio.create_task(s.Run())
+        while s._shards[0].pid is None:
+            await asyncio.sleep(0.01)
+        s.Stop()
+        await asyncio.wait_for(task, 10)
+        return s._shards[0]
+
+    shard = asyncio.run(Run())
+
+    assert shard.restarts == 0
+    assert _Status(tmp_path)["shards"]["0"]["pid"] is None